@@ -0,0 +1,127 @@
+"""
+appointments.py — Jobs y appointments de un cliente, agrupados por estado.
+
+Un solo motor para /findAppointments (Scheduled / Dispatched / InProgress) y
+/findPastAppointments (Hold / Completed / Canceled):
+
+- Un escaneo por cliente: todos sus jobs y todos sus appointments (dos
+  listados paginados de ST, sin filtro de estado), unidos por jobId en un pase.
+- El resultado se cachea por customerId APPOINTMENTS_CACHE_TTL segundos, así
+  que un agente que pregunta por turnos próximos y pasados en la misma llamada
+  paga un solo escaneo. Requests concurrentes por el mismo cliente comparten
+  el fetch (single-flight).
+- Las mutaciones de jobs/appointments (createJob, cancel, reschedule, summary)
+  llaman a invalidate().
+
+Uso:
+    by_status = await appointments.by_job_status(customer_id, tenant_id, headers)
+    by_status["Scheduled"]  # -> [{"jobId", "appointmentId", "start", ...}, ...]
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytz
+
+import config
+import job_summary
+import st_gateway
+import ttl_cache
+
+EASTERN_TIME = pytz.timezone("America/New_York")
+
+# jobStatus -> status de sus appointments en ST.
+JOB_TO_APPOINTMENT_STATUS = {
+    "Scheduled": "Scheduled",
+    "Dispatched": "Dispatched",
+    "InProgress": "Working",
+    "Hold": "Hold",
+    "Completed": "Done",
+    "Canceled": "Canceled",
+}
+
+_cache = ttl_cache.TTLCache("customer_appointments", ttl=config.APPOINTMENTS_CACHE_TTL)
+
+
+def _to_eastern_iso(ts: str) -> str:
+    if not ts:
+        return ""
+    if ts.endswith("Z"):
+        ts = ts.replace("Z", "+00:00")
+    dt_utc = datetime.fromisoformat(ts)
+    return dt_utc.astimezone(EASTERN_TIME).isoformat()
+
+
+def _merge(jobs: list, appointments: list) -> dict:
+    """Agrupa los appointments por el jobStatus de su job, al formato que
+    recibe el agente. Un appointment cuenta solo si su status corresponde al
+    del job (p.ej. job InProgress -> appointment Working), como antes."""
+    jobs_by_id = {job.get("id"): job for job in jobs}
+    by_status = {status: [] for status in JOB_TO_APPOINTMENT_STATUS}
+    for a in appointments:
+        job = jobs_by_id.get(a.get("jobId"))
+        if job is None or JOB_TO_APPOINTMENT_STATUS.get(job.get("jobStatus")) != a.get("status"):
+            continue
+        by_status[job["jobStatus"]].append({
+            "jobId": job.get("id"),
+            "businessUnitId": job.get("businessUnitId"),
+            "jobTypeId": job.get("jobTypeId"),
+            "summary": job.get("summary", ""),
+            "employeeId": (job.get("jobGeneratedLeadSource") or {}).get("employeeId"),
+            "appointmentId": a.get("id"),
+            "start": _to_eastern_iso(a.get("start")),
+            "end": _to_eastern_iso(a.get("end")),
+        })
+    return by_status
+
+
+async def _scan(customer_id, tenant_id, headers) -> "dict | None":
+    semaphore = asyncio.Semaphore(max(1, config.ST_LIST_CONCURRENCY))
+    jobs, appointments = await asyncio.gather(
+        st_gateway.list_all(
+            f"https://api.servicetitan.io/jpm/v2/tenant/{tenant_id}/jobs",
+            route="jobs", headers=headers, params={"customerId": customer_id}, semaphore=semaphore),
+        st_gateway.list_all(
+            f"https://api.servicetitan.io/jpm/v2/tenant/{tenant_id}/appointments",
+            route="appointments", headers=headers, params={"customerId": customer_id}, semaphore=semaphore),
+    )
+    if jobs is None or appointments is None:
+        print(f"[appointments] ❌ ST no devolvió el listado completo para customerId={customer_id}")
+        return None
+    print(f"[appointments] customerId={customer_id}: {len(jobs)} job(s), {len(appointments)} appointment(s)")
+    for job in jobs:
+        # updateJobSummary parte de este summary sin volver a leer el job.
+        job_summary.remember(job.get("id"), job.get("summary"))
+    return _merge(jobs, appointments)
+
+
+async def by_job_status(customer_id, tenant_id, headers) -> dict:
+    """{jobStatus: [appointment, ...]} para los seis estados. Si ST falla se
+    devuelven listas vacías (sin cachear), igual que hacían los endpoints."""
+    by_status = await _cache.get_or_fetch(
+        int(customer_id),
+        lambda: _scan(customer_id, tenant_id, headers),
+        cache_if=lambda result: result is not None,
+    )
+    return by_status or {status: [] for status in JOB_TO_APPOINTMENT_STATUS}
+
+
+def cached_appointment(appointment_id) -> "dict | None":
+    """El appointment tal como quedó en algún escaneo cacheado, sin ir a ST
+    (rescheduleAppointment lo usa para saber qué horario libera). None si
+    ningún escaneo vigente lo tiene."""
+    for by_status in _cache.values():
+        for entries in (by_status or {}).values():
+            for entry in entries:
+                if str(entry.get("appointmentId")) == str(appointment_id):
+                    return entry
+    return None
+
+
+def invalidate(customer_id=None):
+    """Descarta el escaneo cacheado de un cliente, o de todos (mutaciones que
+    solo conocen el jobId / appointmentId)."""
+    if customer_id is None:
+        _cache.clear()
+    else:
+        _cache.invalidate(int(customer_id))
@@ -0,0 +1,180 @@
+"""
+availability_index.py — Índice de disponibilidad precalculado en memoria.
+
+Opcional (AVAILABILITY_INDEX_ENABLED). Una tarea de fondo recorre cada
+jobType del mapping de _get_job_types (más la ruta outbound) y guarda los slots
+libres de las próximas CAPACITY_SEARCH_DAYS, refrescando cada
+AVAILABILITY_INDEX_INTERVAL segundos. /checkAvailability,
+/checkAvailabilityOutbound y /rescheduleAppointmentTimeAvailability contestan
+desde acá sin tocar ST; si el índice no cubre el pedido (apagado, viejo, falló
+el último refresh, rango fuera de cobertura) lookup() devuelve None y se sigue
+con la consulta on-demand de siempre. Los bookings / reschedules / cancels solo
+invalidan lo que tocan (ver invalidate) y el refresh que fuerzan tiene tope de
+frecuencia.
+
+El índice no importa main: main le pasa las funciones que necesita en start()
+(cargar el mapping, pedir una ventana de capacidad, partir el rango).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import pytz
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EASTERN_TIME = pytz.timezone("America/New_York")
+
+# (jobTypeId, (bu, ...)) -> {"ts": monotonic, "from": str, "to": str, "slots": [...]}
+_index: dict = {}
+_task: "asyncio.Task | None" = None
+_wake: "asyncio.Event | None" = None
+# Versiones para que un refresh que arrancó antes de una mutación no pise el
+# índice con capacidad vieja: _generation sube cuando se recortan slots de
+# todas las entradas, _versions[jobType] cuando se tira la entrada de un jobType.
+_generation = 0
+_versions: dict = {}
+# jobTypes a reconstruir en el próximo refresh forzado (ALL = todos).
+ALL = object()
+_dirty: set = set()
+
+
+def lookup(job_type, business_units, windows) -> "list | None":
+    """Slots de la primera ventana con disponibilidad, igual que
+    check_availability_time. [] si todo el rango está cubierto y lleno.
+    None si el índice no puede contestar con certeza."""
+    entry = _index.get((job_type, tuple(sorted(business_units))))
+    if not entry or time.monotonic() - entry["ts"] > config.AVAILABILITY_INDEX_MAX_AGE:
+        return None
+    if not windows or windows[0][0] < entry["from"]:
+        return None
+
+    for starts, ends in windows:
+        if ends > entry["to"]:
+            # La ventana se sale de lo indexado: no sabemos si hay slots ahí.
+            return None
+        slots = [s for s in entry["slots"] if starts <= s["start"] <= ends]
+        if slots:
+            return slots
+    return []
+
+
+def invalidate(job_type=None, business_unit=None, start: "str | None" = None, end: "str | None" = None):
+    """Una mutación cambió la capacidad. Se toca solo lo afectado y se adelanta
+    un refresh (con tope de frecuencia, ver _run) de eso mismo:
+
+    - start/end (horario ocupado, mismo formato que las ventanas): se sacan los
+      slots que se solapan de todas las entradas; los técnicos se comparten
+      entre jobTypes, así que es lo conservador.
+    - job_type (+ business_unit): se tiran las entradas de ese jobType que
+      incluyen la BU; esas consultas van on-demand hasta el refresh.
+    - sin datos (cancelación, reschedule): solo se libera capacidad; el índice
+      sigue contestando (a lo sumo ofrece menos) y se refresca todo.
+    """
+    global _generation
+    if start is not None:
+        _generation += 1
+        end = end or start
+        for entry in _index.values():
+            entry["slots"] = [slot for slot in entry["slots"]
+                              if not (slot["start"] < end and start < slot.get("end", slot["start"]))]
+    if job_type is not None:
+        _versions[job_type] = _versions.get(job_type, 0) + 1
+        for key in [k for k in _index if k[0] == job_type and (business_unit is None or business_unit in k[1])]:
+            del _index[key]
+        _dirty.add(job_type)
+    else:
+        _dirty.add(ALL)
+    if _wake is not None:
+        _wake.set()
+
+
+async def refresh_once(load_targets, fetch_window, windows_for, job_types=None):
+    """Reconstruye el índice para los (jobType, BUs) de load_targets() (solo los
+    de `job_types` si se pasa). Una entrada solo se reemplaza si TODAS sus
+    ventanas respondieron 200."""
+    generation, versions = _generation, dict(_versions)
+    targets = await load_targets()
+    if job_types is not None:
+        targets = [(jt, bus) for jt, bus in targets or [] if jt in job_types]
+    if not targets:
+        return 0
+
+    today = datetime.now(EASTERN_TIME).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    windows = windows_for(today)
+    semaphore = asyncio.Semaphore(max(1, config.AVAILABILITY_INDEX_CONCURRENCY))
+
+    async def fetch(job_type, business_units, starts, ends):
+        async with semaphore:
+            return await fetch_window(job_type, business_units, starts, ends)
+
+    async def build(job_type, business_units):
+        results = await asyncio.gather(*[
+            fetch(job_type, business_units, starts, ends) for starts, ends in windows
+        ])
+        if any(r is None for r in results) or generation != _generation \
+                or versions.get(job_type, 0) != _versions.get(job_type, 0):
+            return False
+        _index[(job_type, tuple(sorted(business_units)))] = {
+            "ts": time.monotonic(),
+            "from": windows[0][0],
+            "to": windows[-1][1],
+            "slots": [slot for window_slots in results for slot in window_slots],
+        }
+        return True
+
+    built = await asyncio.gather(*[build(jt, bus) for jt, bus in targets])
+    return sum(built)
+
+
+async def _run(load_targets, fetch_window, windows_for):
+    job_types = None   # None = refresh completo
+    while True:
+        started = time.monotonic()
+        try:
+            built = await refresh_once(load_targets, fetch_window, windows_for, job_types)
+            logger.info(f"[availabilityIndex] {built} jobType(s) indexados en {time.monotonic() - started:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[availabilityIndex] Error refrescando el índice: {e}")
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=config.AVAILABILITY_INDEX_INTERVAL)
+        except asyncio.TimeoutError:
+            _dirty.clear()
+            job_types = None
+            continue
+        # Refresh forzado por mutaciones: como mucho uno cada
+        # AVAILABILITY_INDEX_MIN_REFRESH s (una ráfaga de bookings se junta en
+        # uno solo) y solo de los jobTypes invalidados.
+        await asyncio.sleep(max(0.0, started + config.AVAILABILITY_INDEX_MIN_REFRESH - time.monotonic()))
+        _wake.clear()
+        job_types = None if ALL in _dirty else set(_dirty)
+        _dirty.clear()
+
+
+def start(load_targets, fetch_window, windows_for):
+    """Arranca el refresco de fondo (no-op si está deshabilitado por config)."""
+    global _task, _wake
+    if not config.AVAILABILITY_INDEX_ENABLED or _task is not None:
+        return
+    _wake = asyncio.Event()
+    _task = asyncio.create_task(_run(load_targets, fetch_window, windows_for))
+
+
+async def stop():
+    global _task, _wake
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _wake = None
+    _index.clear()
+    _dirty.clear()
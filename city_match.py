@@ -0,0 +1,167 @@
+"""
+city_match.py — Match difuso de ciudades dictadas contra CITIES y CITY_ZIPS.
+
+checkWorkArea y suggestZip comparaban la ciudad solo con `.strip().lower()`:
+las variantes de la transcripción ("Newbury Port", "Methune", "Marlboro",
+"Haverill") no entraban a la lista rápida y caían al geocode por red, o a
+"unknown" y el agente tenía que preguntar el ZIP (un turno más de la llamada).
+
+El índice se arma una vez sobre los nombres de config.CITIES y de las claves
+de config.CITY_ZIPS (se reconstruye solo si cambian):
+
+- forma compacta (sin espacios ni puntuación): "newbury port" = "newburyport";
+- clave fonética (consonantes simplificadas: "ough"→"o", "ph"→"f", sin
+  vocales ni letras dobles): "marlboro" = "marlborough", "methune" = "methuen";
+- trigramas con índice invertido: solo se puntúan los nombres que comparten
+  algún trigrama o la clave fonética, así que un lookup son microsegundos.
+
+score: 1.0 exacto / compacto; si no, el coeficiente de Dice de trigramas,
+subido si coincide la clave fonética. Solo se acepta el mejor candidato si
+llega a CITY_MATCH_MIN_SCORE y le saca CITY_MATCH_MARGIN al segundo; si es
+ambiguo no se adivina.
+
+Uso:
+    city_match.match_city("Methune")            # -> {"city": "methuen", "score": 0.9, "method": "phonetic"}
+    city_match.match_city_zip("marlboro", "ma")  # -> {"city": "marlborough", "key": "marlborough|ma", ...}
+"""
+
+import re
+from collections import Counter
+
+import config
+
+_VOWELS = set("aeiouyhw")
+_PHONETIC_RULES = (("ough", "o"), ("augh", "a"), ("ph", "f"), ("ck", "k"), ("gh", ""),
+                   ("q", "k"), ("x", "ks"), ("z", "s"))
+
+
+def compact(name: str) -> str:
+    """Minúsculas, solo letras y dígitos: "Newbury Port" → "newburyport"."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+
+def phonetic_key(name: str) -> str:
+    """Esqueleto de consonantes para variantes de transcripción.
+    "marlboro" / "marlborough" → "mrlbr"; "methune" / "methuen" → "mtn"."""
+    word = compact(name)
+    if not word:
+        return ""
+    for old, new in _PHONETIC_RULES:
+        word = word.replace(old, new)
+    word = word.replace("th", "t")
+    key = word[0]
+    for ch in word[1:]:
+        if ch not in _VOWELS and ch != key[-1]:
+            key += ch
+    return key
+
+
+def _trigrams(word: str) -> Counter:
+    padded = f"  {word} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CityIndex:
+    """Índice de nombres canónicos: compacto, fonético y trigramas invertidos."""
+
+    __slots__ = ("names", "by_compact", "by_phonetic", "by_trigram", "sizes")
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self.by_compact: dict = {}
+        self.by_phonetic: dict = {}
+        self.by_trigram: dict = {}
+        self.sizes: list = []
+        for i, name in enumerate(self.names):
+            word = compact(name)
+            self.by_compact.setdefault(word, []).append(i)
+            self.by_phonetic.setdefault(phonetic_key(word), []).append(i)
+            grams = _trigrams(word)
+            self.sizes.append(sum(grams.values()))
+            for gram, count in grams.items():
+                self.by_trigram.setdefault(gram, []).append((i, count))
+
+    def __len__(self):
+        return len(self.names)
+
+    def scores(self, query: str) -> list:
+        """[(score, name, method)] de los candidatos, mejor primero."""
+        word = compact(query)
+        if not word:
+            return []
+        exact = self.by_compact.get(word)
+        if exact:
+            return [(1.0, self.names[i], "exact") for i in exact]
+
+        grams = _trigrams(word)
+        size = sum(grams.values())
+        shared: Counter = Counter()
+        for gram, count in grams.items():
+            for i, indexed in self.by_trigram.get(gram, ()):
+                shared[i] += min(count, indexed)
+        phonetic = set(self.by_phonetic.get(phonetic_key(word), ()))
+
+        results = []
+        for i in shared.keys() | phonetic:
+            dice = 2 * shared[i] / (size + self.sizes[i])
+            if i in phonetic:
+                results.append((round(0.6 + 0.4 * dice, 3), self.names[i], "phonetic"))
+            else:
+                results.append((round(dice, 3), self.names[i], "trigram"))
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return results
+
+    def best(self, query: str, allowed=None) -> "dict | None":
+        """El candidato ganador si es confiable y no ambiguo; None si no."""
+        candidates = [r for r in self.scores(query) if allowed is None or r[1] in allowed]
+        if not candidates:
+            return None
+        score, name, method = candidates[0]
+        runner_up = candidates[1][0] if len(candidates) > 1 else 0.0
+        if score < config.CITY_MATCH_MIN_SCORE or score - runner_up < config.CITY_MATCH_MARGIN:
+            return None
+        return {"city": name, "score": score, "method": method}
+
+
+_indexes: "dict | None" = None
+_fingerprint = None
+
+
+def _current() -> dict:
+    """Índices de CITIES y de las ciudades de CITY_ZIPS; se rearman si cambian."""
+    global _indexes, _fingerprint
+    fingerprint = (id(config.CITIES), len(config.CITIES), id(config.CITY_ZIPS), len(config.CITY_ZIPS))
+    if _indexes is None or fingerprint != _fingerprint:
+        zip_states: dict = {}
+        for key in config.CITY_ZIPS:
+            city, _, state = key.rpartition("|")
+            zip_states.setdefault(state, set()).add(city)
+        _indexes = {
+            "cities": CityIndex(config.CITIES),
+            "zips": CityIndex(city for cities in zip_states.values() for city in cities),
+            "zip_states": {state: frozenset(cities) for state, cities in zip_states.items()},
+        }
+        _fingerprint = fingerprint
+    return _indexes
+
+
+def match_city(city) -> "dict | None":
+    """Ciudad de config.CITIES que corresponde a lo dictado, o None."""
+    if not isinstance(city, str):
+        return None
+    return _current()["cities"].best(city)
+
+
+def match_city_zip(city, state) -> "dict | None":
+    """Ciudad de CITY_ZIPS en ese estado ("ma" / "nh") que corresponde a lo
+    dictado, con su clave "ciudad|st"; None si no hay una confiable."""
+    if not isinstance(city, str) or not state:
+        return None
+    indexes = _current()
+    allowed = indexes["zip_states"].get(state)
+    if not allowed:
+        return None
+    match = indexes["zips"].best(city, allowed)
+    if match is not None:
+        match["key"] = f"{match['city']}|{state}"
+    return match
@@ -30,6 +30,21 @@ def _env_int(name: str, default: int) -> int:
         return default
 
 
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    try:
+        return float(raw) if raw is not None else default
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
 def _env_set(name: str, default: set) -> set:
     """Lee un set desde una env var separada por comas (lowercase, sin espacios)."""
     raw = os.getenv(name)
@@ -184,6 +199,13 @@ STATE_ABBR: dict = {
 CALL_SESSION_TTL: int = _env_int("CALL_SESSION_TTL", 7200)        # 2 h
 JOB_TYPES_TTL: int = _env_int("JOB_TYPES_TTL", 1800)              # 30 min
 TOKEN_REFRESH_MARGIN: int = _env_int("TOKEN_REFRESH_MARGIN", 60)  # s antes de exp
+# La tarea de fondo renueva el token este tiempo antes de que expire (debe ser
+# mayor que TOKEN_REFRESH_MARGIN para que ningún request tenga que esperar auth).
+TOKEN_PROACTIVE_REFRESH: int = _env_int("TOKEN_PROACTIVE_REFRESH", 180)  # s antes de exp
+TOKEN_REFRESH_RETRY: float = _env_float("TOKEN_REFRESH_RETRY", 5.0)      # s, primer reintento
+# Tope del backoff exponencial entre reintentos fallidos: el intervalo normal
+# de renovación (token de 15 min renovado TOKEN_PROACTIVE_REFRESH antes).
+TOKEN_REFRESH_MAX_BACKOFF: float = _env_float("TOKEN_REFRESH_MAX_BACKOFF", 720.0)  # s
 
 # -----------------------------------------------------------------------------
 # Idempotencia de side effects (createJob, sendOfficeMessage, etc.)
@@ -191,3 +213,192 @@ TOKEN_REFRESH_MARGIN: int = _env_int("TOKEN_REFRESH_MARGIN", 60)  # s antes de e
 # Evita duplicar una accion real (booking, mail, cancelacion) si Retell reintenta
 # el mismo tool call (mismo call_id + mismos args) por un timeout o glitch de red.
 IDEMPOTENCY_TTL: int = _env_int("IDEMPOTENCY_TTL_SECONDS", 900)  # 15 min
+
+# -----------------------------------------------------------------------------
+# Pool de conexiones a ServiceTitan (ver st_client.py)
+# -----------------------------------------------------------------------------
+# Un solo cliente por proceso con keep-alive: evita el handshake TCP+TLS en
+# cada tool call. Los timeouts por request siguen definiéndose en cada llamada.
+ST_MAX_CONNECTIONS: int = _env_int("ST_MAX_CONNECTIONS", 50)
+ST_MAX_KEEPALIVE_CONNECTIONS: int = _env_int("ST_MAX_KEEPALIVE_CONNECTIONS", 20)
+ST_KEEPALIVE_EXPIRY: float = _env_float("ST_KEEPALIVE_EXPIRY", 60.0)  # s
+ST_HTTP2: bool = _env_bool("ST_HTTP2", True)
+ST_DEFAULT_TIMEOUT: float = _env_float("ST_DEFAULT_TIMEOUT", 15.0)   # s
+
+# -----------------------------------------------------------------------------
+# Gateway a ServiceTitan: reintentos, 429 y circuit breaker (ver st_gateway.py)
+# -----------------------------------------------------------------------------
+ST_BACKOFF_BASE: float = _env_float("ST_BACKOFF_BASE", 0.25)          # s
+ST_BACKOFF_MAX: float = _env_float("ST_BACKOFF_MAX", 2.0)             # s
+# Retry-After más largo que esto no se espera: se falla rápido (el caller está en línea).
+ST_RETRY_AFTER_MAX: float = _env_float("ST_RETRY_AFTER_MAX", 3.0)     # s
+# Presupuesto de reintentos por ruta: ~20% de reintentos sobre el tráfico normal.
+ST_RETRY_BUDGET_RATIO: float = _env_float("ST_RETRY_BUDGET_RATIO", 0.2)
+ST_RETRY_BUDGET_MIN: float = _env_float("ST_RETRY_BUDGET_MIN", 5.0)
+ST_BREAKER_FAILURES: int = _env_int("ST_BREAKER_FAILURES", 5)
+ST_BREAKER_RESET: float = _env_float("ST_BREAKER_RESET", 20.0)        # s
+ST_STALE_MAX_ENTRIES: int = _env_int("ST_STALE_MAX_ENTRIES", 256)
+# Hedging de lecturas sensibles a latencia (capacity, customers, locations, jobs).
+ST_HEDGE_ENABLED: bool = _env_bool("ST_HEDGE_ENABLED", False)
+ST_HEDGE_WINDOW: int = _env_int("ST_HEDGE_WINDOW", 200)              # latencias por ruta para el p95
+ST_HEDGE_MIN_SAMPLES: int = _env_int("ST_HEDGE_MIN_SAMPLES", 20)     # sin p95 aprendido no se hedgea
+ST_HEDGE_MIN_DELAY: float = _env_float("ST_HEDGE_MIN_DELAY", 0.3)    # s, piso del umbral
+# Presupuesto global: ~5% de requests extra como máximo, con una ráfaga chica.
+ST_HEDGE_BUDGET_RATIO: float = _env_float("ST_HEDGE_BUDGET_RATIO", 0.05)
+ST_HEDGE_BUDGET_BURST: float = _env_float("ST_HEDGE_BUDGET_BURST", 3.0)
+
+# -----------------------------------------------------------------------------
+# Búsqueda de capacidad (check_availability_time)
+# -----------------------------------------------------------------------------
+# Rango total buscado a partir de la hora pedida, partido en ventanas sin
+# solapamiento. FANOUT = cuántas ventanas se piden a ST en paralelo a la vez.
+CAPACITY_SEARCH_DAYS: int = _env_int("CAPACITY_SEARCH_DAYS", 42)
+CAPACITY_WINDOW_DAYS: int = _env_int("CAPACITY_WINDOW_DAYS", 7)
+CAPACITY_SEARCH_FANOUT: int = _env_int("CAPACITY_SEARCH_FANOUT", 3)
+# Cache de /capacity por (jobType, BUs, ventana). Corto: la capacidad cambia
+# con cada booking; las mutaciones propias lo invalidan antes de que expire.
+CAPACITY_CACHE_TTL: int = _env_int("CAPACITY_CACHE_TTL", 45)  # s
+
+# -----------------------------------------------------------------------------
+# Índice de disponibilidad en memoria (ver availability_index.py)
+# -----------------------------------------------------------------------------
+# Apagado por defecto: cada refresh pide CAPACITY_SEARCH_DAYS/CAPACITY_WINDOW_DAYS
+# ventanas por jobType, hay que dimensionarlo contra el rate limit de ST.
+AVAILABILITY_INDEX_ENABLED: bool = _env_bool("AVAILABILITY_INDEX_ENABLED", False)
+AVAILABILITY_INDEX_INTERVAL: int = _env_int("AVAILABILITY_INDEX_INTERVAL", 60)       # s
+# Pasado este tiempo sin refresh exitoso, el índice no contesta (se va a ST).
+AVAILABILITY_INDEX_MAX_AGE: int = _env_int("AVAILABILITY_INDEX_MAX_AGE", 150)        # s
+AVAILABILITY_INDEX_CONCURRENCY: int = _env_int("AVAILABILITY_INDEX_CONCURRENCY", 4)
+# Tope de frecuencia de los refresh forzados por bookings / cancels (s).
+AVAILABILITY_INDEX_MIN_REFRESH: float = _env_float("AVAILABILITY_INDEX_MIN_REFRESH", 15.0)
+
+# -----------------------------------------------------------------------------
+# Ledger de slots por llamada (checkAvailability -> createJob)
+# -----------------------------------------------------------------------------
+# Cuánto confía createJob en la BU dueña de un slot anotada en checkAvailability
+# antes de volver a preguntarle a ST.
+SLOT_LEDGER_TTL: int = _env_int("SLOT_LEDGER_TTL", 900)  # s
+
+# -----------------------------------------------------------------------------
+# Cache de clientes por teléfono (/findCustomer, get_customer_by_phone)
+# -----------------------------------------------------------------------------
+# "No encontrado" se cachea menos: el cliente puede crearse por otro canal.
+CUSTOMER_CACHE_TTL: int = _env_int("CUSTOMER_CACHE_TTL", 300)            # s
+CUSTOMER_NEGATIVE_CACHE_TTL: int = _env_int("CUSTOMER_NEGATIVE_CACHE_TTL", 30)  # s
+
+# -----------------------------------------------------------------------------
+# Cache de ubicaciones por cliente (/getCustomerLocations)
+# -----------------------------------------------------------------------------
+# createCustomer / createLocation escriben en el cache, así que el TTL solo
+# cubre cambios hechos fuera de este backend (oficina editando en ST).
+LOCATIONS_CACHE_TTL: int = _env_int("LOCATIONS_CACHE_TTL", 600)  # s
+
+# -----------------------------------------------------------------------------
+# Listados paginados de ST (jobs / appointments de un cliente)
+# -----------------------------------------------------------------------------
+ST_PAGE_SIZE: int = _env_int("ST_PAGE_SIZE", 200)
+# Máximo de requests de listado en vuelo a la vez por tool call (evita 429s
+# con clientes comerciales de historial largo).
+ST_LIST_CONCURRENCY: int = _env_int("ST_LIST_CONCURRENCY", 4)
+# Jobs + appointments de un cliente (appointments.py). findAppointments y
+# findPastAppointments comparten el mismo escaneo dentro de este TTL.
+APPOINTMENTS_CACHE_TTL: int = _env_int("APPOINTMENTS_CACHE_TTL", 60)  # s
+
+# -----------------------------------------------------------------------------
+# Roster de técnicos (ver technicians.py)
+# -----------------------------------------------------------------------------
+# Se baja la primera vez que se usa; pasado este tiempo, la próxima lectura va a ST.
+TECHNICIAN_ROSTER_MAX_AGE: int = _env_int("TECHNICIAN_ROSTER_MAX_AGE", 1800)  # s
+
+# -----------------------------------------------------------------------------
+# Prefetch por caller ID (primer tool call de cada llamada)
+# -----------------------------------------------------------------------------
+# Con el from_number del objeto `call` de Retell se precargan cliente,
+# ubicaciones y appointments en los caches antes de que el agente los pida.
+CALLER_PREFETCH_ENABLED: bool = _env_bool("CALLER_PREFETCH_ENABLED", True)
+# Un teléfono compartido puede devolver varios clientes: precargar solo los primeros.
+CALLER_PREFETCH_MAX_CUSTOMERS: int = _env_int("CALLER_PREFETCH_MAX_CUSTOMERS", 2)
+
+# -----------------------------------------------------------------------------
+# Contactos de createCustomer (teléfono / email)
+# -----------------------------------------------------------------------------
+# Un contacto que falló por un error transitorio se reintenta de fondo, sin
+# demorar la respuesta del tool call.
+CONTACT_RETRY_ATTEMPTS: int = _env_int("CONTACT_RETRY_ATTEMPTS", 3)
+CONTACT_RETRY_DELAY: float = _env_float("CONTACT_RETRY_DELAY", 5.0)  # s, se duplica en cada intento
+
+# -----------------------------------------------------------------------------
+# updateJobSummary (ver job_summary.py)
+# -----------------------------------------------------------------------------
+# Notas que llegan para el mismo job dentro de esta ventana salen en un solo PATCH.
+SUMMARY_DEBOUNCE: float = _env_float("SUMMARY_DEBOUNCE", 0.5)  # s
+# Cuánto se confía en un summary ya conocido (createJob, findAppointments o
+# nuestro último PATCH) antes de volver a leerlo de ST. Corto a propósito: una
+# edición de la oficina en ST más vieja que esto nunca se pisa.
+SUMMARY_BASE_TTL: int = _env_int("SUMMARY_BASE_TTL", 30)       # s
+
+# -----------------------------------------------------------------------------
+# rescheduleAppointment: compensación si el reschedule falla tras el unassign
+# -----------------------------------------------------------------------------
+REASSIGN_RETRY_ATTEMPTS: int = _env_int("REASSIGN_RETRY_ATTEMPTS", 3)
+REASSIGN_RETRY_DELAY: float = _env_float("REASSIGN_RETRY_DELAY", 2.0)  # s, se duplica en cada intento
+
+# -----------------------------------------------------------------------------
+# Deadline por tool call (ver deadline.py)
+# -----------------------------------------------------------------------------
+# Retell corta la espera de un tool a los N segundos configurados en el agente.
+# Si manda el header se usa ese valor; si no, el presupuesto por tool (path sin "/").
+TOOL_DEADLINE_HEADER: str = os.getenv("TOOL_DEADLINE_HEADER", "X-Tool-Timeout-Ms")
+TOOL_DEADLINE_DEFAULT: float = _env_float("TOOL_DEADLINE_DEFAULT", 10.0)   # s
+TOOL_DEADLINES: dict = _env_json("TOOL_DEADLINES", {
+    "checkAvailability": 12.0,
+    "checkAvailabilityOutbound": 12.0,
+    "rescheduleAppointmentTimeAvailability": 12.0,
+    "createCustomer": 15.0,
+    "createJob": 15.0,
+    "sendOfficeMessage": 15.0,
+})
+# Margen para armar y mandar la respuesta antes de que Retell deje de esperar.
+TOOL_DEADLINE_RESERVE: float = _env_float("TOOL_DEADLINE_RESERVE", 0.5)    # s
+SMTP_TIMEOUT: float = _env_float("SMTP_TIMEOUT", 20.0)                     # s, sin deadline
+
+# -----------------------------------------------------------------------------
+# Geocoding de checkWorkArea (ver geocode.py)
+# -----------------------------------------------------------------------------
+GEOCODE_TIMEOUT: float = _env_float("GEOCODE_TIMEOUT", 8.0)                # s
+GEOCODE_MAX_CONNECTIONS: int = _env_int("GEOCODE_MAX_CONNECTIONS", 4)
+# Cache sqlite persistente ("" = solo en memoria, se pierde al reiniciar).
+GEOCODE_CACHE_PATH: str = os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+GEOCODE_CACHE_TTL: int = _env_int("GEOCODE_CACHE_TTL", 30 * 24 * 3600)     # s, las direcciones no se mueven
+GEOCODE_NEGATIVE_TTL: int = _env_int("GEOCODE_NEGATIVE_TTL", 24 * 3600)    # s, "no existe" se reintenta antes
+GEOCODE_CACHE_MAX_ENTRIES: int = _env_int("GEOCODE_CACHE_MAX_ENTRIES", 20000)
+
+# -----------------------------------------------------------------------------
+# Gazetteer local de ZIPs / pueblos MA-NH para checkWorkArea (ver gazetteer.py)
+# -----------------------------------------------------------------------------
+GAZETTEER_PATH: str = os.getenv("GAZETTEER_PATH", "")   # "" = data/ma_nh_zips.csv del repo
+# Cerca del borde del radio el centroide puede equivocarse: refinar con geocode.
+GAZETTEER_GEOCODE_REFINE: bool = _env_bool("GAZETTEER_GEOCODE_REFINE", True)
+GAZETTEER_REFINE_MARGIN: float = _env_float("GAZETTEER_REFINE_MARGIN", 3.0)   # mi
+
+# -----------------------------------------------------------------------------
+# Pre-screening de listas outbound (ver prescreen.py)
+# -----------------------------------------------------------------------------
+PRESCREEN_MAX_CONTACTS: int = _env_int("PRESCREEN_MAX_CONTACTS", 10000)
+PRESCREEN_CONCURRENCY: int = _env_int("PRESCREEN_CONCURRENCY", 4)        # búsquedas de cliente en vuelo
+# Tope global de la ruta "customers_bulk" de st_gateway (todas las listas juntas).
+ST_BULK_CONCURRENCY: int = _env_int("ST_BULK_CONCURRENCY", 4)
+# Secreto compartido del header X-Prescreen-Token; vacío = endpoint deshabilitado.
+PRESCREEN_TOKEN: str = os.getenv("PRESCREEN_TOKEN", "")
+PRESCREEN_AVAILABILITY_SLOTS: int = _env_int("PRESCREEN_AVAILABILITY_SLOTS", 5)
+
+# -----------------------------------------------------------------------------
+# Match difuso de ciudades dictadas contra CITIES / CITY_ZIPS (ver city_match.py)
+# -----------------------------------------------------------------------------
+CITY_MATCH_MIN_SCORE: float = _env_float("CITY_MATCH_MIN_SCORE", 0.8)
+CITY_MATCH_MARGIN: float = _env_float("CITY_MATCH_MARGIN", 0.1)   # ventaja mínima sobre el segundo candidato
+
+# -----------------------------------------------------------------------------
+# Memo LRU de normalize.py (valores dictados ya normalizados, por campo)
+# -----------------------------------------------------------------------------
+NORMALIZE_CACHE_SIZE: int = _env_int("NORMALIZE_CACHE_SIZE", 4096)
@@ -8,12 +8,7 @@ except ModuleNotFoundError:
     class _MissingRequestError(Exception):
         pass
 
-    class _MissingAsyncClient:
-        def __init__(self, *args, **kwargs):
-            raise ModuleNotFoundError("httpx is required to query ServiceTitan")
-
     class _MissingHttpxModule:
-        AsyncClient = _MissingAsyncClient
         RequestError = _MissingRequestError
 
     httpx = _MissingHttpxModule()
@@ -72,8 +67,10 @@ async def _st_headers() -> dict:
 async def _job_has_status(job_id: int, expected_statuses: set[str]) -> bool:
     main_module = _get_main_module()
     url = f"https://api.servicetitan.io/jpm/v2/tenant/{main_module.TENANT_ID}/jobs?ids={job_id}"
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        response = await client.get(url, headers=await _st_headers())
+    # Mismo gateway (pool compartido, reintentos, breaker) que usan los endpoints de main.
+    response = await main_module.st_gateway.get(
+        url, route="jobs", headers=await _st_headers(), timeout=15.0
+    )
 
     if response.status_code != 200:
         return False
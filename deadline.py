@@ -0,0 +1,98 @@
+"""
+deadline.py — Deadline por tool call, propagado a cada llamada upstream.
+
+Retell deja de esperar la respuesta de un tool después de su timeout; lo que
+sigamos haciendo después es trabajo perdido (y el caller ya escuchó un error).
+Cada tool call arranca con un deadline (header X-Tool-Timeout-Ms si viene, si
+no el presupuesto de TOOL_DEADLINES / TOOL_DEADLINE_DEFAULT) guardado en un
+contextvar, así llega solo a todo lo que corre dentro del request:
+
+- st_gateway recorta el timeout de cada intento al tiempo que queda, no
+  reintenta si el backoff no entra, y corta con DeadlineExceeded.
+- geocode y SMTP usan timeout(default) igual.
+- Las tareas de fondo que deben sobrevivir al request (compensaciones,
+  reintentos, renovación de token) corren con unbounded().
+
+DeadlineExceeded hereda de httpx.TimeoutException (y por lo tanto de
+httpx.RequestError): los endpoints que ya manejaban "ST no disponible" lo
+cubren sin cambios.
+
+Uso:
+    deadline.start(12.0)
+    resp = await client.get(url, timeout=deadline.timeout(15.0))
+"""
+
+import time
+from contextvars import ContextVar
+
+import httpx
+
+import config
+
+# monotonic hasta el que el caller sigue esperando; None = sin deadline.
+_deadline: ContextVar = ContextVar("tool_deadline", default=None)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Se agotó el presupuesto del tool call: no tiene sentido seguir."""
+
+    def __init__(self, message: str = "tool call deadline exceeded", request=None):
+        super().__init__(message, request=request)
+
+
+def start(seconds: "float | None"):
+    """Fija el deadline del contexto actual (None lo saca). Devuelve el token
+    del contextvar por si el caller quiere restaurarlo."""
+    return _deadline.set(None if seconds is None else time.monotonic() + max(0.0, seconds))
+
+
+def budget_for(tool: str, header_ms: "str | None" = None) -> float:
+    """Segundos de presupuesto para un tool: el header de Retell si es válido,
+    si no el de config; menos la reserva para armar y mandar la respuesta."""
+    seconds = None
+    if header_ms:
+        try:
+            seconds = float(header_ms) / 1000.0
+        except ValueError:
+            seconds = None
+    if seconds is None or seconds <= 0:
+        seconds = float(config.TOOL_DEADLINES.get(tool, config.TOOL_DEADLINE_DEFAULT))
+    return max(0.0, seconds - config.TOOL_DEADLINE_RESERVE)
+
+
+def remaining() -> "float | None":
+    """Segundos que quedan, o None si no hay deadline en este contexto."""
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(0.0, at - time.monotonic())
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def allows(seconds: float) -> bool:
+    """True si todavía entra una espera de `seconds` (p.ej. un backoff)."""
+    left = remaining()
+    return left is None or left > seconds
+
+
+def timeout(default: float) -> float:
+    """El timeout a usar para una llamada upstream: el default recortado a lo
+    que queda. DeadlineExceeded si ya no queda nada."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+async def unbounded(awaitable):
+    """Corre `awaitable` sin deadline. Pensado para envolver la corrutina de
+    una tarea de fondo: la tarea tiene su propia copia del contexto, así que
+    esto no afecta al request que la lanzó."""
+    _deadline.set(None)
+    return await awaitable
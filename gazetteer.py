@@ -0,0 +1,227 @@
+"""
+gazetteer.py — Gazetteer local de ZIPs y pueblos de MA/NH para checkWorkArea.
+
+Cuando la ciudad no está en config.CITIES, checkWorkArea dependía de
+geocode.xyz: lento, caído seguido, y cuando falla se responde "en área" sin
+verificar. Con los centroides de cada ZIP y de cada pueblo de MA/NH en memoria
+la pertenencia al área sale en proceso, en microsegundos y siempre igual; el
+geocode por dirección queda como refinamiento opcional cerca del borde del
+radio (ver main.check_work_area).
+
+Datos: data/ma_nh_zips.csv (ZIPs activos de MA y NH con su centroide, ciudad
+y nombres alternativos), extraído del dataset del paquete `zipcodes` 1.2.0
+(licencia MIT). Se carga una vez en arrays planos (array('d')) indexados por
+dict: ~1000 ZIPs ocupan unos pocos KB.
+
+Área de servicio precalculada (ServiceArea): a partir del centro
+(SALEM_PO_BOX) y del radio (SERVICE_RADIUS_MILES) se arman frozensets de ZIPs
+y pueblos dentro del área, más los que quedan a GAZETTEER_REFINE_MARGIN millas
+del borde ("boundary": conviene chequear la dirección exacta). Se reconstruye
+sola si cambia el centro, el radio o el margen. checkWorkArea, suggestZip y el
+screening de listas outbound contestan con un lookup en un set.
+
+Uso:
+    gazetteer.load()                                   # en el lifespan
+    place = gazetteer.locate("01970", "Salem", "MA")
+    # -> {"lat", "lon", "miles", "status": "in" | "out" | "boundary",
+    #     "source": "zip" | "town", "place": "01970 Salem MA"}
+    gazetteer.zip_status("03079")                      # -> "in"
+"""
+
+import csv
+import logging
+import math
+import os
+import time
+from array import array
+
+import config
+import normalize
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ma_nh_zips.csv")
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de gran círculo en millas (mismo cálculo que usaba checkWorkArea)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return config.EARTH_RADIUS_MILES * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _state_key(state: str) -> str:
+    state = (state or "").strip().lower()
+    return config.STATE_ABBR.get(state, state)
+
+
+def town_key(city: str, state: str) -> str:
+    city = " ".join((city or "").strip().lower().replace(".", " ").split())
+    return f"{city}|{_state_key(state)}"
+
+
+class Gazetteer:
+    """ZIPs y pueblos en arrays paralelos; los dicts solo guardan índices."""
+
+    __slots__ = ("zip_index", "zip_state", "zip_city", "lat", "lon",
+                 "town_index", "town_name", "town_zips", "town_lat", "town_lon")
+
+    def __init__(self):
+        self.zip_index: dict = {}     # "01970" -> i
+        self.zip_state: list = []
+        self.zip_city: list = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.town_index: dict = {}    # "salem|ma" -> j
+        self.town_name: list = []
+        self.town_zips: list = []     # ZIPs de entrega (STANDARD) del pueblo
+        self.town_lat = array("d")
+        self.town_lon = array("d")
+
+    def __len__(self):
+        return len(self.zip_index)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "Gazetteer":
+        gz = cls()
+        # Pueblo -> centroides de sus ZIPs de entrega (STANDARD); los PO BOX /
+        # UNIQUE solo si el pueblo no tiene otros.
+        members: dict = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                lat, lon = float(row["lat"]), float(row["lon"])
+                state = row["state"].lower()
+                gz.zip_index[row["zip"]] = len(gz.zip_state)
+                gz.zip_state.append(state)
+                gz.zip_city.append(row["city"])
+                gz.lat.append(lat)
+                gz.lon.append(lon)
+                standard = row["type"] == "STANDARD"
+                names = [row["city"]] + [n for n in row["other_cities"].split("|") if n]
+                for name in names:
+                    members.setdefault(town_key(name, state), []).append((standard, lat, lon, name, row["zip"]))
+
+        for key, points in members.items():
+            chosen = [p for p in points if p[0]] or points
+            gz.town_index[key] = len(gz.town_name)
+            gz.town_name.append(f"{chosen[0][3]} {key.rsplit('|', 1)[1].upper()}")
+            gz.town_zips.append(tuple(p[4] for p in points if p[0]))
+            gz.town_lat.append(sum(p[1] for p in chosen) / len(chosen))
+            gz.town_lon.append(sum(p[2] for p in chosen) / len(chosen))
+        return gz
+
+
+class ServiceArea:
+    """Pertenencia al área precalculada para un centro / radio / margen."""
+
+    __slots__ = ("fingerprint", "zips", "towns", "boundary_zips", "boundary_towns", "miles", "town_miles")
+
+    def __init__(self, gz: Gazetteer, center: tuple, radius: float, margin: float):
+        self.fingerprint = (id(gz), tuple(center), radius, margin)
+        self.miles = array("d", (haversine_miles(*center, lat, lon) for lat, lon in zip(gz.lat, gz.lon)))
+        self.town_miles = array("d", (haversine_miles(*center, lat, lon)
+                                      for lat, lon in zip(gz.town_lat, gz.town_lon)))
+
+        def split(index: dict, miles: array):
+            inside, boundary = [], []
+            for key, i in index.items():
+                if abs(miles[i] - radius) <= margin:
+                    boundary.append(key)
+                elif miles[i] <= radius:
+                    inside.append(key)
+            return frozenset(inside), frozenset(boundary)
+
+        self.zips, self.boundary_zips = split(gz.zip_index, self.miles)
+        self.towns, self.boundary_towns = split(gz.town_index, self.town_miles)
+
+    def zip_status(self, zip_code: str) -> str:
+        if zip_code in self.zips:
+            return "in"
+        return "boundary" if zip_code in self.boundary_zips else "out"
+
+    def town_status(self, key: str) -> str:
+        if key in self.towns:
+            return "in"
+        return "boundary" if key in self.boundary_towns else "out"
+
+
+_gazetteer: "Gazetteer | None" = None
+_area: "ServiceArea | None" = None
+
+
+def load(path: "str | None" = None) -> Gazetteer:
+    """Carga (o recarga) el gazetteer y precalcula el área. Si falta el archivo
+    queda vacío y checkWorkArea sigue con el geocode por red como antes."""
+    global _gazetteer
+    started = time.perf_counter()
+    try:
+        _gazetteer = Gazetteer.from_csv(path or config.GAZETTEER_PATH or DATA_PATH)
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f"[gazetteer] No se pudo cargar el gazetteer: {e}")
+        _gazetteer = Gazetteer()
+        return _gazetteer
+    current = area()
+    logger.info(f"[gazetteer] {len(_gazetteer)} ZIPs / {len(_gazetteer.town_index)} pueblos cargados en "
+                f"{(time.perf_counter() - started) * 1000:.0f} ms; en área: {len(current.zips)} ZIPs "
+                f"(+{len(current.boundary_zips)} en el borde)")
+    return _gazetteer
+
+
+def _loaded() -> Gazetteer:
+    if _gazetteer is None:
+        load()
+    return _gazetteer
+
+
+def area() -> ServiceArea:
+    """El área vigente; se recalcula si cambió el centro, el radio o el margen."""
+    global _area
+    gz = _loaded()
+    fingerprint = (id(gz), tuple(config.SALEM_PO_BOX), config.SERVICE_RADIUS_MILES, config.GAZETTEER_REFINE_MARGIN)
+    if _area is None or _area.fingerprint != fingerprint:
+        _area = ServiceArea(gz, config.SALEM_PO_BOX, config.SERVICE_RADIUS_MILES, config.GAZETTEER_REFINE_MARGIN)
+    return _area
+
+
+def zip_status(zip_code) -> "str | None":
+    """"in" / "boundary" / "out" para un ZIP de MA/NH; None si no está en el
+    gazetteer (otro estado, ZIP inválido). Pensado para screening de listas."""
+    zip_code = normalize.normalize_zip(zip_code) if zip_code else None
+    if not isinstance(zip_code, str) or zip_code not in _loaded().zip_index:
+        return None
+    return area().zip_status(zip_code)
+
+
+def locate(zip_code, city, state) -> "dict | None":
+    """Centroide y estado de área del ZIP (si existe y es del estado dicho) o
+    del pueblo. None si ninguno de los dos está en el gazetteer."""
+    gz = _loaded()
+    current = area()
+    state_key = _state_key(state)
+    zip_code = normalize.normalize_zip(zip_code) if zip_code else None
+    i = gz.zip_index.get(zip_code) if isinstance(zip_code, str) else None
+    if i is not None and gz.zip_state[i] == state_key:
+        return {"lat": gz.lat[i], "lon": gz.lon[i], "miles": current.miles[i],
+                "status": current.zip_status(zip_code), "source": "zip",
+                "place": f"{zip_code} {gz.zip_city[i]} {state_key.upper()}"}
+    key = town_key(city, state)
+    j = gz.town_index.get(key)
+    if j is not None:
+        return {"lat": gz.town_lat[j], "lon": gz.town_lon[j], "miles": current.town_miles[j],
+                "status": current.town_status(key), "source": "town", "place": gz.town_name[j]}
+    return None
+
+
+def has_town(city, state) -> bool:
+    """True si el nombre es un pueblo real de MA/NH (no una variante dictada)."""
+    return town_key(city, state) in _loaded().town_index
+
+
+def town_zips(city, state) -> tuple:
+    """ZIPs de entrega del pueblo que no están fuera del área (para suggestZip)."""
+    gz = _loaded()
+    j = gz.town_index.get(town_key(city, state))
+    if j is None:
+        return ()
+    current = area()
+    return tuple(z for z in gz.town_zips[j] if current.zip_status(z) != "out")
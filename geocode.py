@@ -0,0 +1,259 @@
+"""
+geocode.py — Cliente async de geocode.xyz con cache persistente en disco.
+
+checkWorkArea geocodificaba con `requests.get` dentro de asyncio.to_thread: un
+thread del executor por llamada, conexión nueva cada vez y nada cacheado, así
+que los mismos domicilios (clientes que vuelven a llamar, campañas outbound) se
+geocodificaban una y otra vez.
+
+- Un httpx.AsyncClient propio (pool keep-alive hacia geocode.xyz, sin seguir
+  redirects para no filtrar MAPS_AUTH a otro host), cerrado en el lifespan.
+- Cache sqlite (GEOCODE_CACHE_PATH) con clave street|city|state normalizada:
+  TTL por entrada, TTL más corto para "no existe" (negativos) y desalojo LRU
+  por encima de GEOCODE_CACHE_MAX_ENTRIES. Sobrevive a reinicios y se comparte
+  entre workers del mismo host. Un hit no escribe en disco: el last_used se
+  acumula en memoria y se escribe con el próximo store (o al cerrar), y la
+  cantidad de filas se cuenta una vez al abrir.
+- Las fallas transitorias (red, 5xx, body no-JSON, deadline) no se cachean:
+  se levanta GeocodeUnavailable y el endpoint decide (fail-open en MA/NH).
+
+Uso:
+    result = await geocode.lookup(street, city, state)
+    # -> {"lat": 42.5, "lon": -70.9, "postal": "01970"} | None si no existe
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import quote
+
+import httpx
+
+import config
+import deadline
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_URL = "https://geocode.xyz/{address}"
+
+_client: "httpx.AsyncClient | None" = None
+_db: "sqlite3.Connection | None" = None
+_rows = 0                      # filas del cache, contadas al abrir y llevadas en memoria
+_touched: dict = {}            # key -> last_used de hits todavía no escritos
+
+stats = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0, "evictions": 0}
+
+_STATES = {"massachusetts": "ma", "new hampshire": "nh"}
+_STREET_WORDS = {
+    "street": "st", "avenue": "ave", "road": "rd", "drive": "dr", "lane": "ln",
+    "boulevard": "blvd", "court": "ct", "place": "pl", "terrace": "ter",
+    "circle": "cir", "highway": "hwy", "parkway": "pkwy", "north": "n",
+    "south": "s", "east": "e", "west": "w",
+}
+
+
+class GeocodeUnavailable(Exception):
+    """geocode.xyz no contestó algo usable. status_code si hubo respuesta HTTP."""
+
+    def __init__(self, message: str, status_code: "int | None" = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _clean(text: str) -> str:
+    words = re.sub(r"[^\w\s]", " ", (text or "").lower()).split()
+    return " ".join(words)
+
+
+def cache_key(street: str, city: str, state: str) -> str:
+    """"12 Main Street, Apt. 4" y "12 main st apt 4" caen en la misma entrada."""
+    street = " ".join(_STREET_WORDS.get(w, w) for w in _clean(street).split())
+    state = _clean(state)
+    return f"{street}|{_clean(city)}|{_STATES.get(state, state)}"
+
+
+# =============================================================================
+# CACHE EN DISCO
+# =============================================================================
+
+def _conn() -> sqlite3.Connection:
+    global _db, _rows
+    if _db is None:
+        _db = sqlite3.connect(config.GEOCODE_CACHE_PATH or ":memory:", check_same_thread=False)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY, lat REAL, lon REAL, postal TEXT,"
+            " found INTEGER NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        _db.execute("CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode (last_used)")
+        _db.commit()
+        # Un solo COUNT al abrir; después se lleva en memoria (ver _store).
+        _rows = _db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        _touched.clear()
+    return _db
+
+
+def _flush_touched(db: sqlite3.Connection):
+    """Escribe los last_used de los hits pendientes (sin commit)."""
+    if _touched:
+        db.executemany("UPDATE geocode SET last_used = ? WHERE key = ?",
+                       [(used, key) for key, used in _touched.items()])
+        _touched.clear()
+
+
+def _cached(key: str):
+    """(True, resultado|None) si hay entrada vigente, (False, None) si no.
+    Un hit es solo un SELECT por clave primaria: el last_used queda en
+    _touched y se escribe junto con el próximo _store, sin commit por hit."""
+    global _rows
+    db = _conn()
+    row = db.execute(
+        "SELECT lat, lon, postal, found, expires_at FROM geocode WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return False, None
+    lat, lon, postal, found, expires_at = row
+    now = time.time()
+    if now >= expires_at:
+        db.execute("DELETE FROM geocode WHERE key = ?", (key,))
+        db.commit()
+        _touched.pop(key, None)
+        _rows = max(0, _rows - 1)
+        return False, None
+    _touched[key] = now
+    return True, ({"lat": lat, "lon": lon, "postal": postal} if found else None)
+
+
+def _store(key: str, result: "dict | None"):
+    global _rows
+    db = _conn()
+    now = time.time()
+    ttl = config.GEOCODE_CACHE_TTL if result else config.GEOCODE_NEGATIVE_TTL
+    if ttl <= 0:
+        return
+    result = result or {}
+    # Los hits pendientes van antes de decidir el desalojo, así el LRU los ve.
+    _flush_touched(db)
+    exists = db.execute("SELECT 1 FROM geocode WHERE key = ?", (key,)).fetchone() is not None
+    db.execute(
+        "INSERT OR REPLACE INTO geocode (key, lat, lon, postal, found, expires_at, last_used)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, result.get("lat"), result.get("lon"), result.get("postal"), 1 if result else 0, now + ttl, now),
+    )
+    if not exists:
+        _rows += 1
+    overflow = _rows - max(1, config.GEOCODE_CACHE_MAX_ENTRIES)
+    if overflow > 0:
+        # Otro worker del mismo host pudo haber insertado o borrado: el
+        # DELETE devuelve cuántas filas salieron de verdad.
+        evicted = db.execute(
+            "DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY last_used LIMIT ?)", (overflow,)
+        ).rowcount
+        _rows -= evicted
+        stats["evictions"] += evicted
+    db.commit()
+
+
+def clear():
+    """Vacía el cache (tests / diagnóstico)."""
+    global _rows
+    db = _conn()
+    db.execute("DELETE FROM geocode")
+    db.commit()
+    _touched.clear()
+    _rows = 0
+    for k in stats:
+        stats[k] = 0
+
+
+def size() -> int:
+    if _db is None:
+        return 0  # sin abrir todavía: no crear el archivo solo para contar
+    return _db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+
+# =============================================================================
+# CLIENTE
+# =============================================================================
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=config.GEOCODE_TIMEOUT,
+            limits=httpx.Limits(max_connections=config.GEOCODE_MAX_CONNECTIONS,
+                                max_keepalive_connections=config.GEOCODE_MAX_CONNECTIONS),
+            follow_redirects=False,
+        )
+    return _client
+
+
+async def shutdown():
+    """Cierra el pool y el cache. Llamado desde el lifespan de la app."""
+    global _client, _db
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+    db, _db = _db, None
+    if db is not None:
+        _flush_touched(db)
+        db.commit()
+        db.close()
+
+
+def _parse(body: dict) -> "dict | None":
+    """Coordenadas de la respuesta de geocode.xyz, o None si no ubicó la dirección."""
+    if body.get("error") or body.get("longt") == "0.00000" or body.get("latt") == "0.00000":
+        return None
+    try:
+        lat = float(body.get("latt"))
+        lon = float(body.get("longt"))
+    except (TypeError, ValueError):
+        return None
+    postal = (body.get("standard", {}) or {}).get("postal")
+    return {"lat": lat, "lon": lon, "postal": postal.split("-")[0] if postal else None}
+
+
+async def _fetch(street: str, city: str, state: str) -> "dict | None":
+    # La dirección es input de usuario: va URL-encodeada en el path y el auth por params.
+    address = quote(f"{street}, {city}, {state}", safe="")
+    try:
+        resp = await get_client().get(
+            GEOCODE_URL.format(address=address),
+            params={"json": "1", "auth": os.getenv("MAPS_AUTH")},
+            timeout=deadline.timeout(config.GEOCODE_TIMEOUT),
+        )
+    except httpx.RequestError as e:
+        raise GeocodeUnavailable(f"{type(e).__name__}: {e}") from e
+    if resp.status_code != 200:
+        raise GeocodeUnavailable(f"geocode.xyz respondió {resp.status_code}", status_code=resp.status_code)
+    try:
+        body = resp.json()
+    except ValueError as e:
+        raise GeocodeUnavailable("geocode.xyz devolvió un body no-JSON") from e
+    if not isinstance(body, dict):
+        raise GeocodeUnavailable("geocode.xyz devolvió un body inesperado")
+    return _parse(body)
+
+
+async def lookup(street: str, city: str, state: str) -> "dict | None":
+    """{"lat", "lon", "postal"} de la dirección, o None si geocode.xyz no la
+    ubica (resultado negativo, también cacheado). GeocodeUnavailable si el
+    servicio falló: eso no se cachea."""
+    key = cache_key(street, city, state)
+    found, result = _cached(key)
+    if found:
+        stats["hits" if result else "negative_hits"] += 1
+        return result
+
+    stats["misses"] += 1
+    try:
+        result = await _fetch(street, city, state)
+    except GeocodeUnavailable:
+        stats["errors"] += 1
+        raise
+    _store(key, result)
+    return result
@@ -0,0 +1,136 @@
+"""
+job_summary.py — Buffer de notas por job para /updateJobSummary.
+
+Antes cada nota hacía GET del job + PATCH del summary completo: varias notas
+seguidas releían el job y se pisaban entre sí (la última ganaba). Ahora:
+
+- Las notas de un mismo job se acumulan y salen en UN PATCH, SUMMARY_DEBOUNCE
+  segundos después de la primera. Cada request espera el resultado de ese
+  PATCH, así que el agente sigue recibiendo la confirmación real.
+- Un lock por job serializa los PATCH: una nota que llega durante un flush va
+  al siguiente, sobre el summary recién escrito (sin lost updates).
+- El summary base sale de lo que ya sabemos del job (createJob, el escaneo de
+  appointments, nuestro último PATCH) si es reciente (SUMMARY_BASE_TTL, del
+  orden de una ráfaga de notas); si no, se relee de ST para no pisar una
+  edición de la oficina.
+- El timer del debounce corre sin deadline (deadline.unbounded): el PATCH es
+  compartido por las notas de varios requests y no puede cortarse con el
+  presupuesto del primero.
+- Al cerrar la llamada (/clearCallData) main llama a flush_jobs con los jobs
+  que tocó, para no esperar el debounce.
+
+Como availability_index, no importa main: main pasa las funciones que leen y
+escriben el summary en ST.
+"""
+
+import asyncio
+import weakref
+
+import config
+import deadline
+import ttl_cache
+
+# jobId -> summary actual conocido
+_known = ttl_cache.TTLCache("job_summaries", ttl=config.SUMMARY_BASE_TTL)
+# jobId -> _Pending
+_pending: dict = {}
+# jobId -> Lock; se libera sola cuando ningún flush la usa.
+_locks: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+
+
+class _Pending:
+    def __init__(self):
+        self.notes: list = []
+        self.waiters: list = []
+        self.timer: "asyncio.Task | None" = None
+
+
+def remember(job_id, summary):
+    """Registra el summary actual de un job (p.ej. leído en otro endpoint)."""
+    if job_id is not None and summary is not None:
+        _known.set(int(job_id), summary)
+
+
+def _compose(current: str, notes: list) -> str:
+    summary = current or ""
+    for note in notes:
+        summary = f"{summary}\n\n{note}".strip() if summary else note
+    return summary
+
+
+async def append(job_id, note: str, load, save) -> dict:
+    """Encola `note` para el job y espera el flush que la incluye.
+
+    load(job_id) -> (summary, error_dict | None)
+    save(job_id, summary) -> error_dict | None
+    Devuelve {"status": ...} o el error_dict del paso que falló.
+    """
+    job_id = int(job_id)
+    pending = _pending.setdefault(job_id, _Pending())
+    future = asyncio.get_running_loop().create_future()
+    pending.notes.append(note)
+    pending.waiters.append(future)
+    if pending.timer is None:
+        pending.timer = asyncio.create_task(deadline.unbounded(_flush_later(job_id, load, save)))
+    return await asyncio.shield(future)
+
+
+async def _flush_later(job_id, load, save):
+    await asyncio.sleep(config.SUMMARY_DEBOUNCE)
+    await flush(job_id, load, save)
+
+
+async def flush(job_id, load, save):
+    """Escribe ya las notas pendientes del job (no-op si no hay)."""
+    lock = _locks.get(job_id)
+    if lock is None:
+        lock = _locks[job_id] = asyncio.Lock()
+    async with lock:
+        pending = _pending.pop(job_id, None)
+        if pending is None or not pending.notes:
+            return
+        if pending.timer is not None and pending.timer is not asyncio.current_task():
+            pending.timer.cancel()
+        # Las notas ya salieron de _pending: pase lo que pase (incluso si se
+        # cancela el flush, p.ej. flush_all al apagar) hay que contestarle a
+        # cada request que está esperando en append().
+        result = {"error": "Failed to update job summary.", "details": "flush cancelled"}
+        try:
+            result = await _write(job_id, pending.notes, load, save)
+        except asyncio.CancelledError:
+            # No sabemos si el PATCH llegó a ST: la próxima nota relee el job.
+            _known.invalidate(job_id)
+            raise
+        except Exception as e:
+            result = {"error": "Failed to update job summary.", "details": str(e)}
+        finally:
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_result(result)
+
+
+async def _write(job_id, notes, load, save) -> dict:
+    current = _known.get(job_id)
+    if current is None:
+        current, error = await load(job_id)
+        if error is not None:
+            return error
+    updated = _compose(current, notes)
+    error = await save(job_id, updated)
+    if error is not None:
+        # No sabemos qué quedó en ST: la próxima nota relee el job.
+        _known.invalidate(job_id)
+        return error
+    _known.set(job_id, updated)
+    print(f"[jobSummary] jobId={job_id}: {len(notes)} nota(s) en un solo PATCH ✅")
+    return {"status": "Job summary updated"}
+
+
+async def flush_jobs(job_ids, load, save):
+    """Escribe ya las notas pendientes de esos jobs (fin de llamada)."""
+    await asyncio.gather(*[flush(int(job_id), load, save) for job_id in job_ids])
+
+
+async def flush_all(load, save):
+    """Vacía todos los buffers (apagado del proceso)."""
+    await flush_jobs(list(_pending), load, save)
@@ -1,17 +1,31 @@
 from datetime import datetime, timedelta, timezone
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, Request, HTTPException
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 import httpx
 import asyncio
 import hashlib
+import hmac
 import smtplib
 import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import utils as utils
 import config
+import appointments
+import availability_index
+import city_match
+import deadline
+import gazetteer
+import geocode
+import job_summary
+import prescreen
+import technicians
+import st_client
+import st_gateway
+import ttl_cache
 from dashboard_sync import callback_sheet
 from dashboard_sync.webhook import router as dashboard_sync_router
 import normalize
@@ -20,11 +34,8 @@ from dotenv import load_dotenv
 import os
 import json
 import pytz
-import math
 import re
 import sys
-import requests
-from urllib.parse import quote
 from html import escape
 
 logging.basicConfig(level=logging.INFO)
@@ -57,31 +68,89 @@ DIRECT_LINES = config.DIRECT_LINES
 # JOB-TYPES CACHE (evita un round-trip a ST en cada checkAvailability)
 # =============================================================================
 
+# Mapping jobTypeId -> businessUnitIds con stale-while-revalidate: vencido el
+# TTL se sigue sirviendo el mapping en memoria mientras UN refresh corre de
+# fondo; si ST falla se conserva el último mapping bueno.
 _job_types_cache: dict = {"data": None, "ts": 0.0}
 _JOB_TYPES_TTL = config.JOB_TYPES_TTL
+_job_types_refresh: "asyncio.Task | None" = None
+_job_types_stats: dict = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
 
 
 async def _get_job_types(headers: dict) -> dict:
-    """Devuelve {jobTypeId: [businessUnitId, ...]}. Cachea 30 min."""
-    now = time.time()
-    if _job_types_cache["data"] and now - _job_types_cache["ts"] < _JOB_TYPES_TTL:
-        print("[jobTypes] Cache hit ✅")
+    """Devuelve {jobTypeId: [businessUnitId, ...]}. Cachea JOB_TYPES_TTL (30 min)."""
+    if _job_types_cache["data"]:
+        if time.time() - _job_types_cache["ts"] < _JOB_TYPES_TTL:
+            _job_types_stats["hits"] += 1
+            print("[jobTypes] Cache hit ✅")
+        else:
+            _job_types_stats["stale_hits"] += 1
+            print("[jobTypes] Cache vencido: sirviendo mapping en memoria y refrescando de fondo")
+            _start_job_types_refresh(headers)
         return _job_types_cache["data"]
 
+    _job_types_stats["misses"] += 1
+    return await asyncio.shield(_start_job_types_refresh(headers))
+
+
+def _start_job_types_refresh(headers: dict) -> asyncio.Task:
+    """Devuelve el refresh en vuelo o arranca uno (single-flight)."""
+    global _job_types_refresh
+    task = _job_types_refresh
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = _job_types_refresh = asyncio.create_task(deadline.unbounded(_refresh_job_types(headers)))
+    return task
+
+
+async def _refresh_job_types(headers: dict) -> dict:
+    """Pide el mapping a ST. Ante error devuelve el último mapping bueno ({} si
+    nunca hubo uno) sin pisarlo."""
+    _job_types_stats["refreshes"] += 1
     url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/job-types/"
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.get(url, headers=headers)
+    try:
+        resp = await st_gateway.get(url, route="job_types", headers=headers, timeout=15.0)
+    except httpx.RequestError as e:
+        _job_types_stats["refresh_errors"] += 1
+        print(f"[jobTypes] ❌ Error de red: {e}")
+        return _job_types_cache["data"] or {}
 
     if resp.status_code != 200:
+        _job_types_stats["refresh_errors"] += 1
         print(f"[jobTypes] ❌ Error {resp.status_code}: {resp.text[:200]}")
-        return {}
+        return _job_types_cache["data"] or {}
 
     mapping = {jt["id"]: jt["businessUnitIds"] for jt in resp.json().get("data", [])}
+    if not mapping:
+        # Una respuesta vacía no reemplaza un mapping bueno.
+        _job_types_stats["refresh_errors"] += 1
+        print("[jobTypes] ⚠️ ST devolvió 0 job types, se mantiene el mapping anterior")
+        return _job_types_cache["data"] or {}
     _job_types_cache["data"] = mapping
-    _job_types_cache["ts"] = now
+    _job_types_cache["ts"] = time.time()
     print(f"[jobTypes] Fetched and cached {len(mapping)} job types ✅")
     return mapping
 
+
+async def _warm_job_types() -> dict:
+    """Precarga el mapping al arrancar para que el primer checkAvailability no lo pague."""
+    try:
+        access_token = await get_access_token()
+        return await _refresh_job_types({
+            "Authorization": access_token,
+            "ST-App-Key": APP_ID,
+            "Content-Type": "application/json",
+        })
+    except Exception as e:
+        print(f"[jobTypes] ❌ No se pudo precargar el mapping: {e}")
+        return _job_types_cache["data"] or {}
+
+
+def _start_job_types_warmup():
+    global _job_types_refresh
+    if _has_st_credentials() and not _job_types_cache["data"]:
+        # Queda como el refresh en vuelo: un miss concurrente lo espera en vez de duplicarlo.
+        _job_types_refresh = asyncio.create_task(_warm_job_types())
+
 # =============================================================================
 # CALL SESSION STORE (in-memory, TTL 2 hours)
 # =============================================================================
@@ -119,6 +188,106 @@ def _cleanup_sessions():
     for k in expired:
         del call_sessions[k]
 
+# =============================================================================
+# PREFETCH POR CALLER ID
+# =============================================================================
+# En el primer tool call de una llamada que usa datos del caller (getCallData,
+# findCustomer, ubicaciones, appointments) ya viene el from_number en el objeto
+# `call` de Retell. Se dispara de fondo la misma secuencia que hace el agente
+# (cliente por teléfono -> ubicaciones + appointments) para que esos tool calls
+# encuentren los caches llenos, o se sumen al fetch que ya está en vuelo.
+
+_background_tasks: set = set()  # referencias fuertes a las tareas fire-and-forget
+
+
+def _spawn_background(coro) -> asyncio.Task:
+    # Sobrevive al request que la lanzó: no hereda su deadline.
+    task = asyncio.create_task(deadline.unbounded(coro))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _caller_number(call: dict) -> "str | None":
+    """Teléfono del cliente: from_number en inbound, to_number en outbound."""
+    if call.get("direction") == "outbound":
+        return call.get("to_number")
+    return call.get("from_number")
+
+
+async def _prefetch_caller(call_id: str, phone: str):
+    try:
+        status_code, customers = await _find_customers_by_phone(phone)
+        if status_code != 200 or not customers:
+            print(f"[prefetch] callId={call_id}: sin cliente para {_phone_key(phone)}")
+            return
+        access_token = await get_access_token()
+        headers = {
+            "Authorization": access_token,
+            "ST-App-Key": APP_ID,
+            "Content-Type": "application/json",
+        }
+        customer_ids = [c.get("id") for c in customers[:config.CALLER_PREFETCH_MAX_CUSTOMERS] if c.get("id")]
+        await asyncio.gather(*[
+            fetch
+            for customer_id in customer_ids
+            for fetch in (_customer_locations(customer_id),
+                          appointments.by_job_status(customer_id, TENANT_ID, headers))
+        ])
+        print(f"[prefetch] callId={call_id}: cliente(s) {customer_ids} precargados ✅")
+    except Exception as e:
+        # Best effort: si falla, el agente hace los mismos requests on-demand.
+        print(f"[prefetch] callId={call_id}: ❌ {type(e).__name__}: {e}")
+
+
+async def _start_tool_deadline(request: Request):
+    """Dependencia global: fija el deadline del tool call (header de Retell o
+    presupuesto por tool de config) para todo lo que corra dentro del request."""
+    if request.method != "POST":
+        return
+    try:
+        body = await request.json()
+    except Exception:
+        return
+    if not isinstance(body, dict) or "args" not in body:
+        return
+    tool = request.url.path.strip("/")
+    deadline.start(deadline.budget_for(tool, request.headers.get(config.TOOL_DEADLINE_HEADER)))
+
+
+# call_ids que ya dispararon el prefetch. Aparte de call_sessions: esa es la
+# sesión que ve el agente (/getCallData, /clearCallData) y no debe aparecer
+# solo porque hubo un tool call, ni volver a precargar después de un clear.
+_prefetched_calls = ttl_cache.TTLCache("prefetched_calls", ttl=config.CALL_SESSION_TTL, max_entries=4096)
+
+
+async def _prefetch_on_first_tool_call(request: Request):
+    """Dependencia de los tools que usan datos del caller: la primera vez que
+    se ve un call_id, arranca el prefetch de fondo (no bloquea el tool call)."""
+    if not config.CALLER_PREFETCH_ENABLED or request.method != "POST":
+        return
+    try:
+        body = await request.json()
+    except Exception:
+        return
+    # Solo tool calls de Retell ({"args", "call"}); no los webhooks de dashboard_sync.
+    if not isinstance(body, dict) or "args" not in body:
+        return
+    call = body.get("call")
+    if not isinstance(call, dict) or not call.get("call_id"):
+        return
+
+    call_id = call["call_id"]
+    if _prefetched_calls.get(call_id):
+        return
+    _prefetched_calls.set(call_id, True)
+
+    phone = _caller_number(call)
+    if not phone or len(_phone_key(phone)) != 10:
+        return
+    _spawn_background(_prefetch_caller(call_id, phone))
+
+
 # =============================================================================
 # IDEMPOTENCY (evita duplicar side effects si Retell reintenta un tool call)
 # =============================================================================
@@ -177,7 +346,28 @@ async def _run_idempotent(request: Request, operation: str, args_obj, action):
             idempotency_cache[key] = {"_ts": time.time(), "response": response}
         return response
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de conexiones compartido para ServiceTitan: se abre una vez al
+    # arrancar y se cierra al apagar (ver st_client.py).
+    await st_client.startup()
+    # Token OAuth renovado de fondo antes de expirar + mapping de job types precargado.
+    _start_token_refresher()
+    _start_job_types_warmup()
+    gazetteer.load()
+    # Índice de disponibilidad en memoria (no-op si AVAILABILITY_INDEX_ENABLED=0).
+    availability_index.start(_availability_index_targets, _availability_index_fetch, _capacity_windows)
+    try:
+        yield
+    finally:
+        await availability_index.stop()
+        await job_summary.flush_all(_load_job_summary, _save_job_summary)
+        await _stop_token_refresher()
+        await st_client.shutdown()
+        await geocode.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(_start_tool_deadline)])
 app.include_router(dashboard_sync_router)
 
 @app.exception_handler(RequestValidationError)
@@ -208,6 +398,18 @@ async def pydantic_validation_exception_handler(request: Request, exc: Validatio
         content={"error": f"Invalid or missing arguments: {invalid}"}
     )
 
+# Todo el trafico a ServiceTitan pasa por st_gateway. Si ST no responde (red,
+# timeout o circuito abierto) en un endpoint que no lo maneja localmente, se
+# devuelve un error legible para Harmony en vez de un 500 crudo. Status 200
+# como el resto de los {"error": ...} de las tools, para que el agente lo lea.
+@app.exception_handler(httpx.RequestError)
+async def servicetitan_unavailable_handler(request: Request, exc: httpx.RequestError):
+    logger.error(f"[ServiceTitan] No disponible en {request.url.path}: {type(exc).__name__}: {exc}")
+    return JSONResponse(
+        status_code=200,
+        content={"error": "ServiceTitan is temporarily unavailable. Please try again in a moment."}
+    )
+
 CITIES = config.CITIES
 
 VALID_STATES = config.VALID_STATES
@@ -217,41 +419,120 @@ VALID_STATES = config.VALID_STATES
 
 # Token OAuth de ServiceTitan cacheado en memoria con su expiración.
 # Evita pedir un token nuevo en CADA request (latencia extra + riesgo de
-# rate-limit en el endpoint de auth). El lock previene race conditions cuando
-# varias llamadas concurrentes lo refrescan a la vez.
+# rate-limit en el endpoint de auth).
+#
+# - Lectura sin lock: si el token está vigente se devuelve directo.
+# - Una tarea de fondo (lifespan) lo renueva TOKEN_PROACTIVE_REFRESH segundos
+#   antes de que expire, así ningún tool call paga el round trip de auth.
+# - Si igual hace falta renovar en línea (arranque, falla del refresher), un solo
+#   fetch en vuelo (single-flight) atiende a todos los requests concurrentes.
 _token_cache: dict = {"token": None, "exp": 0.0}
-_token_lock = asyncio.Lock()
+_token_fetch: "asyncio.Task | None" = None
+_token_refresher: "asyncio.Task | None" = None
 
 
 async def get_access_token():
-    async with _token_lock:
-        # Reusar token vigente (margen de 60s antes de expirar)
-        if _token_cache["token"] and time.time() < _token_cache["exp"] - config.TOKEN_REFRESH_MARGIN:
+    token = _token_cache["token"]
+    remaining = _token_cache["exp"] - time.time()
+    # Reusar token vigente (margen de TOKEN_REFRESH_MARGIN antes de expirar)
+    if token and remaining > config.TOKEN_REFRESH_MARGIN:
+        return token
+    if token and remaining > 5:
+        # Dentro del margen pero todavía válido: se usa y se renueva de fondo.
+        _start_token_fetch()
+        return token
+    return await asyncio.shield(_start_token_fetch())
+
+
+def _start_token_fetch() -> asyncio.Task:
+    """Devuelve el fetch de token en vuelo o arranca uno (single-flight)."""
+    global _token_fetch
+    task = _token_fetch
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = _token_fetch = asyncio.create_task(deadline.unbounded(_fetch_access_token()))
+        # Si nadie lo espera (renovación de fondo), no dejar la excepción sin leer.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+
+async def _fetch_access_token():
+    try:
+        print("Fetching access token...")
+        response = await st_gateway.post(
+            AUTH_URL,
+            route="auth",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={"grant_type": "client_credentials",
+                  "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET},
+            timeout=15.0,
+        )
+        if response.status_code == 200:
+            token_data = response.json()
+            _token_cache["token"] = token_data.get("access_token")
+            _token_cache["exp"] = time.time() + token_data.get("expires_in", 900)
+            print("Access token fetched successfully. ✅")
             return _token_cache["token"]
+        else:
+            # No loguear response.text del endpoint de auth (puede traer detalles sensibles)
+            print(f"Error fetching token: status {response.status_code}")
+            raise HTTPException(status_code=response.status_code,
+                                detail="Authentication with ServiceTitan failed.")
+    except httpx.RequestError as e:
+        print(f"Exception while fetching token: {str(e)}")
+        raise HTTPException(
+            status_code=503, detail="Could not reach ServiceTitan authentication service.")
+
+
+async def _refresh_token_forever():
+    """Mantiene el token renovado antes de que expire (los requests siguen
+    usando el vigente). Si falla, reintenta con backoff exponencial desde
+    TOKEN_REFRESH_RETRY hasta TOKEN_REFRESH_MAX_BACKOFF: con credenciales
+    revocadas no se martilla el endpoint de auth. Se loguea una vez por escalón."""
+    failures = 0
+    delay = 0.0
+    while True:
+        if _token_cache["token"] and not failures:
+            wait = _token_cache["exp"] - config.TOKEN_PROACTIVE_REFRESH - time.time()
+            await asyncio.sleep(max(wait, config.TOKEN_REFRESH_RETRY))
         try:
-            print("Fetching access token...")
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(
-                    AUTH_URL,
-                    headers={"Content-Type": "application/x-www-form-urlencoded"},
-                    data={"grant_type": "client_credentials",
-                          "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET},
-                )
-            if response.status_code == 200:
-                token_data = response.json()
-                _token_cache["token"] = token_data.get("access_token")
-                _token_cache["exp"] = time.time() + token_data.get("expires_in", 900)
-                print("Access token fetched successfully. ✅")
-                return _token_cache["token"]
-            else:
-                # No loguear response.text del endpoint de auth (puede traer detalles sensibles)
-                print(f"Error fetching token: status {response.status_code}")
-                raise HTTPException(status_code=response.status_code,
-                                    detail="Authentication with ServiceTitan failed.")
-        except httpx.RequestError as e:
-            print(f"Exception while fetching token: {str(e)}")
-            raise HTTPException(
-                status_code=503, detail="Could not reach ServiceTitan authentication service.")
+            await asyncio.shield(_start_token_fetch())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            previous = delay
+            delay = min(config.TOKEN_REFRESH_RETRY * 2 ** (failures - 1), config.TOKEN_REFRESH_MAX_BACKOFF)
+            if delay != previous:
+                print(f"[tokenRefresher] ❌ No se pudo renovar el token ({failures} intento(s)): {e}. "
+                      f"Reintentando cada {delay:.0f}s")
+            await asyncio.sleep(delay)
+            continue
+        if failures:
+            print(f"[tokenRefresher] ✅ Token renovado tras {failures} intento(s) fallido(s)")
+        failures = 0
+        delay = 0.0
+
+
+def _has_st_credentials() -> bool:
+    return bool(AUTH_URL and CLIENT_ID and CLIENT_SECRET)
+
+
+def _start_token_refresher():
+    global _token_refresher
+    # Sin credenciales (dev/tests) no hay nada que renovar.
+    if _token_refresher is None and _has_st_credentials():
+        _token_refresher = asyncio.create_task(_refresh_token_forever())
+
+
+async def _stop_token_refresher():
+    global _token_refresher
+    task, _token_refresher = _token_refresher, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
 
 def _parse_agent_datetime(dt_str: str) -> datetime:
@@ -290,27 +571,116 @@ def utc_to_eastern(dt_str: str) -> str:
     return dt_eastern.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-async def get_customer_by_phone(phone):
-    print("Getting customer by phone...")
-    try:
-        url_customers = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/customers?phone={phone}"
+# Clientes por teléfono normalizado. Es el primer tool call de casi toda
+# llamada inbound y el agente lo repite varias veces en la misma conversación.
+_customers_cache = ttl_cache.TTLCache(
+    "customers_by_phone",
+    ttl=config.CUSTOMER_CACHE_TTL,
+    negative_ttl=config.CUSTOMER_NEGATIVE_CACHE_TTL,
+)
+
+
+# 10 dígitos (sin +1) para que "+1 (603) 555-1234" y "6035551234" compartan entrada.
+_phone_key = normalize.phone_key
+
+
+async def _fetch_customers_by_phone(key: str, route: str):
+    """(status_code, lista de clientes) directo de ST, sin cache."""
+    url_customers = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/customers?phone={key}"
+    access_token = await get_access_token()
+    headers = {
+        "Authorization": access_token,
+        "ST-App-Key": APP_ID,
+        "Content-Type": "application/json",
+    }
+    response = await st_gateway.get(url_customers, route=route, headers=headers, timeout=15.0)
+    if response.status_code != 200:
+        print(f"Error: Unexpected response {response.status_code} - {response.text}")
+        return response.status_code, None
+    return 200, response.json().get("data") or []
+
+
+async def _find_customers_by_phone(phone):
+    """(status_code, lista de clientes de ST) para ese teléfono. Solo las
+    respuestas 200 se cachean; una lista vacía se cachea con TTL negativo.
+    Lanza httpx.RequestError si ST no responde.
+    Sin un número de 10 dígitos no se consulta ST: "customers?phone=" sin
+    filtro devuelve clientes de cualquiera."""
+    key = _phone_key(phone)
+    if len(key) != 10:
+        print(f"[customers] Teléfono inválido ({phone!r}): sin búsqueda en ST")
+        return 200, []
+
+    return await _customers_cache.get_or_fetch(
+        key, lambda: _fetch_customers_by_phone(key, "customers"),
+        cache_if=lambda result: result[0] == 200,
+        is_negative=lambda result: not result[1],
+    )
+
+
+async def _find_customers_by_phone_bulk(phone):
+    """Como _find_customers_by_phone pero para listas de campaña: ruta
+    "customers_bulk" (breaker, reintentos y concurrencia propios) y sin pasar
+    por _customers_cache, para no desalojar las entradas de llamadas en vivo."""
+    key = _phone_key(phone)
+    if len(key) != 10:
+        return 200, []
+    return await _fetch_customers_by_phone(key, "customers_bulk")
+
+
+# Ubicaciones por customerId. El agente las pide antes de cada createJob;
+# las altas propias (createCustomer / createLocation) se escriben acá directo.
+_locations_cache = ttl_cache.TTLCache("customer_locations", ttl=config.LOCATIONS_CACHE_TTL)
+
+
+async def _customer_locations(customer_id):
+    """(status_code, lista de ubicaciones de ST) del cliente. Solo las
+    respuestas 200 se cachean. Lanza httpx.RequestError si ST no responde."""
+
+    async def fetch():
         access_token = await get_access_token()
         headers = {
             "Authorization": access_token,
             "ST-App-Key": APP_ID,
             "Content-Type": "application/json",
         }
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response_customers = await client.get(url_customers, headers=headers)
+        url_location = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/locations?customerId={customer_id}"
+        response = await st_gateway.get(url_location, route="locations", headers=headers, timeout=15.0)
+        if response.status_code != 200:
+            print(f"Failed to get locations: {response.status_code} - {response.text}")
+            return response.status_code, None
+        return 200, response.json().get("data", [])
+
+    return await _locations_cache.get_or_fetch(
+        int(customer_id), fetch, cache_if=lambda result: result[0] == 200)
 
-        if response_customers.status_code == 200:
-            customers_data_json = response_customers.json()
 
-            if not customers_data_json.get("data"):
+def _remember_location(customer_id, location: dict, replace: bool = False):
+    """Write-through de una ubicación recién creada. Con replace=True (cliente
+    nuevo) pasa a ser la lista completa; si no, se agrega a la lista cacheada
+    (si no había lista, la próxima lectura va a ST y ya la trae)."""
+    customer_id = int(customer_id)
+    cached = None if replace else _locations_cache.get(customer_id)
+    # Descartar fetches en vuelo: podrían ser anteriores al alta.
+    _locations_cache.invalidate(customer_id)
+    if replace:
+        _locations_cache.set(customer_id, (200, [location]))
+    elif cached is not None:
+        locations = [loc for loc in cached[1] if loc.get("id") != location.get("id")]
+        _locations_cache.set(customer_id, (200, locations + [location]))
+
+
+async def get_customer_by_phone(phone):
+    print("Getting customer by phone...")
+    try:
+        status_code, customers = await _find_customers_by_phone(phone)
+
+        if status_code == 200:
+            if not customers:
                 print("Error: No customers found by phone.")
                 return {"error": "Customer not found by phone."}
 
-            customer_data = customers_data_json["data"][0]
+            customer_data = customers[0]
             customer = {
                 "id": customer_data.get("id"),
                 "name": customer_data.get("name")
@@ -318,14 +688,68 @@ async def get_customer_by_phone(phone):
             print("Customer found by phone ✅")
             return customer
 
-        print(f"Error: Unexpected response {response_customers.status_code} - {response_customers.text}")
-        return {"error": f"Unexpected response status: {response_customers.status_code}"}
+        return {"error": f"Unexpected response status: {status_code}"}
 
     except httpx.RequestError as e:
         print(f"Error getting client: {e}")
         return {"error": "Error when making external request."}
 
 
+def _contacts_url(customer_id) -> str:
+    return f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/customers/{customer_id}/contacts"
+
+
+async def _add_contact(customer_id, headers, label, payload):
+    """POST de un contacto. No lanza: un 4xx (dato rechazado) se loguea y se
+    descarta; un 5xx / 429 / error de red se reintenta de fondo."""
+    try:
+        response = await st_gateway.post(_contacts_url(customer_id), route="contacts", headers=headers, json=payload)
+    except Exception as e:
+        print(f"⚠️ Error agregando {label} (no fatal, se reintenta de fondo): {e}")
+        _spawn_background(_retry_contact(customer_id, label, payload))
+        return
+    if response.status_code == 200:
+        print(f"Contacto {label} agregado ✅")
+    elif response.status_code == 429 or response.status_code >= 500:
+        print(f"⚠️ No se pudo agregar el {label} (no fatal, se reintenta de fondo): {response.status_code}")
+        _spawn_background(_retry_contact(customer_id, label, payload))
+    else:
+        print(f"⚠️ No se pudo agregar el {label} (no fatal): {response.status_code} - {response.text}")
+
+
+async def _retry_contact(customer_id, label, payload):
+    """Reintentos de fondo con backoff. Antes de cada POST se mira si el
+    contacto ya existe (el POST que "falló" pudo haber llegado a ST)."""
+    delay = config.CONTACT_RETRY_DELAY
+    for attempt in range(1, config.CONTACT_RETRY_ATTEMPTS + 1):
+        await asyncio.sleep(delay)
+        delay *= 2
+        try:
+            access_token = await get_access_token()
+            headers = {
+                "Authorization": access_token,
+                "ST-App-Key": APP_ID,
+                "Content-Type": "application/json",
+            }
+            existing = await st_gateway.get(_contacts_url(customer_id), route="contacts_read", headers=headers, timeout=15.0)
+            if existing.status_code == 200 and any(
+                    c.get("type") == payload["type"] and c.get("value") == payload["value"]
+                    for c in existing.json().get("data", [])):
+                print(f"[contactRetry] customerId={customer_id}: {label} ya estaba en ST ✅")
+                return
+            response = await st_gateway.post(_contacts_url(customer_id), route="contacts", headers=headers, json=payload)
+            if response.status_code == 200:
+                print(f"[contactRetry] customerId={customer_id}: {label} agregado en el intento {attempt} ✅")
+                return
+            if response.status_code != 429 and response.status_code < 500:
+                print(f"[contactRetry] customerId={customer_id}: {label} rechazado ({response.status_code}), se descarta")
+                return
+        except Exception as e:
+            print(f"[contactRetry] customerId={customer_id}: intento {attempt} falló: {e}")
+    print(f"[contactRetry] ❌ customerId={customer_id}: no se pudo agregar el {label} tras "
+          f"{config.CONTACT_RETRY_ATTEMPTS} intentos")
+
+
 async def create_customer(customer: utils.CustomerCreateRequest):
     print("Creating customer ...")
 
@@ -389,70 +813,63 @@ async def create_customer(customer: utils.CustomerCreateRequest):
             ]
         }
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
-            print("Response Status Code:", response.status_code)
+        response = await st_gateway.post(url, route="customer_create", headers=headers, json=payload, timeout=15.0)
+        print("Response Status Code:", response.status_code)
 
-            if response.status_code != 200:
-                print(f"Error creating customer: {response.text}")
-                return {"error": f"Failed to create customer: {response.text}"}
-
-            data = response.json()
-            customer_id = data.get("id")
-            location_id = data.get("locations", [{}])[0].get("id")
-
-            if not customer_id or not location_id:
-                print("Error: Customer or Location ID missing in API response.")
-                return {"error": "Customer or Location ID missing in API response."}
-
-            print("Created customer successfully ✅")
-            print({"customer_id": customer_id, "location_id": location_id})
-
-            contact_url = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/customers/{customer_id}/contacts"
-
-            # Agregar teléfono/email es NO FATAL. El cliente y la ubicación YA
-            # existen en ServiceTitan a esta altura, así que pase lo que pase con
-            # los contactos devolvemos el customerId para que el booking siga.
-            # Antes un fallo acá lanzaba HTTPException -> el endpoint devolvía
-            # {"error": ""} y quedaba un cliente huérfano; el agente reintentaba
-            # y creaba un duplicado. (Ver docs/2026-07-18-plan-implementacion-qa.md)
-            if customer.number:
-                try:
-                    clean_number = re.sub(r"\D", "", customer.number)
-                    mobile_payload = {
-                        "type": "MobilePhone",
-                        "value": clean_number,
-                        "memo": "Customer phone number"
-                    }
-                    response_mobile = await client.post(contact_url, headers=headers, json=mobile_payload)
-                    if response_mobile.status_code == 200:
-                        print("Mobile contact data added successfully ✅")
-                    else:
-                        print(f"⚠️ No se pudo agregar el teléfono (no fatal): "
-                              f"{response_mobile.status_code} - {response_mobile.text}")
-                except Exception as e:
-                    print(f"⚠️ Error agregando teléfono (no fatal): {e}")
-
-            # Solo intentar el email si quedó en formato válido tras normalizar.
-            # Un email dictado que normalize_email no pudo rearmar (p.ej.
-            # "m p a n t a z i s ...") haría fallar el POST sin aportar nada.
-            if customer.email and re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", customer.email):
-                try:
-                    email_payload = {
-                        "type": "Email",
-                        "value": customer.email,
-                        "memo": "Customer email"
-                    }
-                    response_email = await client.post(contact_url, headers=headers, json=email_payload)
-                    if response_email.status_code == 200:
-                        print("Email contact data added successfully ✅")
-                    else:
-                        print(f"⚠️ No se pudo agregar el email (no fatal): "
-                              f"{response_email.status_code} - {response_email.text}")
-                except Exception as e:
-                    print(f"⚠️ Error agregando email (no fatal): {e}")
-            elif customer.email:
-                print(f"⚠️ Email en formato no válido tras normalizar, se omite el contacto: {customer.email!r}")
+        if response.status_code != 200:
+            print(f"Error creating customer: {response.text}")
+            return {"error": f"Failed to create customer: {response.text}"}
+
+        data = response.json()
+        customer_id = data.get("id")
+        location_id = data.get("locations", [{}])[0].get("id")
+
+        if not customer_id or not location_id:
+            print("Error: Customer or Location ID missing in API response.")
+            return {"error": "Customer or Location ID missing in API response."}
+
+        print("Created customer successfully ✅")
+        print({"customer_id": customer_id, "location_id": location_id})
+        # El "no encontrado" cacheado para este número ya no es cierto.
+        _customers_cache.invalidate(_phone_key(customer.number))
+        _remember_location(customer_id, {
+            "id": location_id,
+            "name": location.name,
+            "address": payload["locations"][0]["address"],
+            **data["locations"][0],
+        }, replace=True)
+
+        # Agregar teléfono/email es NO FATAL. El cliente y la ubicación YA
+        # existen en ServiceTitan a esta altura, así que pase lo que pase con
+        # los contactos devolvemos el customerId para que el booking siga.
+        # Antes un fallo acá lanzaba HTTPException -> el endpoint devolvía
+        # {"error": ""} y quedaba un cliente huérfano; el agente reintentaba
+        # y creaba un duplicado. (Ver docs/2026-07-18-plan-implementacion-qa.md)
+        contacts = []
+        if customer.number:
+            contacts.append(("teléfono", {
+                "type": "MobilePhone",
+                "value": re.sub(r"\D", "", customer.number),
+                "memo": "Customer phone number"
+            }))
+
+        # Solo intentar el email si quedó en formato válido tras normalizar.
+        # Un email dictado que normalize_email no pudo rearmar (p.ej.
+        # "m p a n t a z i s ...") haría fallar el POST sin aportar nada.
+        if customer.email and re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", customer.email):
+            contacts.append(("email", {
+                "type": "Email",
+                "value": customer.email,
+                "memo": "Customer email"
+            }))
+        elif customer.email:
+            print(f"⚠️ Email en formato no válido tras normalizar, se omite el contacto: {customer.email!r}")
+
+        # Los dos contactos en paralelo; los que fallan por algo transitorio
+        # se reintentan de fondo sin demorar la respuesta.
+        await asyncio.gather(*[
+            _add_contact(customer_id, headers, label, payload) for label, payload in contacts
+        ])
 
         print("Customer created successfully ✅")
         return {"customerId": customer_id, "locationId": location_id}
@@ -461,12 +878,147 @@ async def create_customer(customer: utils.CustomerCreateRequest):
         return {"error": "Failed to create customer due to invalid data."}
 
 
-async def check_availability_time(time, business_units, job_type, access_token=None):
+def _capacity_windows(start_time: datetime) -> list:
+    """Parte el rango de búsqueda en ventanas contiguas y SIN solapamiento.
+
+    Antes eran 5 ventanas de 13 días que avanzaban de a 7: la mitad del rango
+    se pedía dos veces. Ahora la 1ra ventana arranca en la hora pedida y las
+    siguientes a medianoche, cada una de CAPACITY_WINDOW_DAYS días.
+    Devuelve [(startsOnOrAfter, endsOnOrBefore), ...] en formato ST."""
+    day0 = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_days = max(1, config.CAPACITY_WINDOW_DAYS)
+    windows = []
+    for offset in range(0, config.CAPACITY_SEARCH_DAYS, window_days):
+        w_start = start_time if offset == 0 else day0 + timedelta(days=offset)
+        last_day = min(offset + window_days, config.CAPACITY_SEARCH_DAYS) - 1
+        w_end = (day0 + timedelta(days=last_day)).replace(hour=23, minute=59)
+        windows.append((
+            w_start.replace(tzinfo=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            w_end.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        ))
+    return windows
+
+
+# Cache corto de capacidad: clave (jobTypeId, BUs, inicio, fin de ventana).
+# Callers concurrentes con el mismo jobType, y checkAvailability seguido de
+# rescheduleAppointmentTimeAvailability en la misma llamada, comparten un solo
+# POST a ST. Las fallas (None) no se cachean. createJob / rescheduleAppointment
+# / cancelAppointment invalidan el rango afectado (ver _invalidate_capacity).
+_capacity_cache = ttl_cache.TTLCache("capacity", ttl=config.CAPACITY_CACHE_TTL)
+_NOT_CACHED = object()
+
+
+def _capacity_key(job_type, business_units, starts_on_or_after, ends_on_or_before) -> tuple:
+    return (job_type, tuple(sorted(business_units)), starts_on_or_after, ends_on_or_before)
+
+
+def _invalidate_capacity(start_raw: "str | None" = None, end_raw: "str | None" = None,
+                         job_type=None, business_unit=None):
+    """Invalida las ventanas cacheadas que se solapan con [start, end] (hora
+    Eastern del agente, mismo formato que las ventanas). Sin rango conocido
+    (cancelaciones, el horario viejo de un reschedule) se invalida todo. En el
+    índice de fondo solo se toca el jobType / BU y el rango del booking."""
+    try:
+        start = _parse_agent_datetime(start_raw).strftime('%Y-%m-%dT%H:%M:%SZ') if start_raw else None
+        end = _parse_agent_datetime(end_raw).strftime('%Y-%m-%dT%H:%M:%SZ') if end_raw else start
+    except ValueError:
+        start = end = None
+
+    if start is None:
+        dropped = _capacity_cache.invalidate_where(lambda key: True)
+    else:
+        # key = (jobTypeId, BUs, startsOnOrAfter, endsOnOrBefore)
+        dropped = _capacity_cache.invalidate_where(lambda key: key[2] <= end and start <= key[3])
+    print(f"[capacityCache] {dropped} ventana(s) invalidada(s) ({start or 'todo'} → {end or ''})")
+    availability_index.invalidate(job_type, business_unit, start, end)
+
+
+async def _fetch_capacity_window(headers, business_units, job_type, starts_on_or_after, ends_on_or_before):
+    """Un POST a /capacity (vía cache + single-flight). list de slots (puede
+    ser []) si ST respondió 200, None si no respondió (red, 5xx, circuito...)."""
+    return await _capacity_cache.get_or_fetch(
+        _capacity_key(job_type, business_units, starts_on_or_after, ends_on_or_before),
+        lambda: _fetch_capacity_window_uncached(
+            headers, business_units, job_type, starts_on_or_after, ends_on_or_before),
+        cache_if=lambda slots: slots is not None,
+    )
+
+
+async def _availability_index_targets() -> list:
+    """(jobTypeId, BUs) que mantiene el índice de fondo: todo el mapping de
+    job types más la combinación fija de la ruta outbound."""
+    access_token = await get_access_token()
+    headers = {
+        "Authorization": access_token,
+        "ST-App-Key": APP_ID,
+        "Content-Type": "application/json",
+    }
+    job_types = await _get_job_types(headers)
+    targets = [(jt, [int(bu) for bu in bus]) for jt, bus in job_types.items() if bus]
+    targets.append((config.OUTBOUND_JOB_TYPE_ID, [config.OUTBOUND_BUSINESS_UNIT_ID]))
+    return targets
+
+
+async def _availability_index_fetch(job_type, business_units, starts_on_or_after, ends_on_or_before):
+    access_token = await get_access_token()
+    headers = {
+        "Authorization": access_token,
+        "ST-App-Key": APP_ID,
+        "Content-Type": "application/json",
+    }
+    return await _fetch_capacity_window(headers, business_units, job_type, starts_on_or_after, ends_on_or_before)
+
+
+async def _fetch_capacity_window_uncached(headers, business_units, job_type, starts_on_or_after, ends_on_or_before):
+    payload = {
+        "startsOnOrAfter": starts_on_or_after,
+        "endsOnOrBefore": ends_on_or_before,
+        "businessUnitIds": business_units,
+        "jobTypeId": job_type,
+        "skillBasedAvailability": False
+    }
+    try:
+        # timeout corto: el caller está esperando en línea.
+        response = await st_gateway.post(
+            f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}/capacity",
+            route="capacity",
+            headers=headers,
+            json=payload,
+            timeout=8.0,
+        )
+    except httpx.RequestError as e:
+        print(f"[check_availability_time] ❌ Error de red ({starts_on_or_after}): {str(e)}")
+        return None
+
+    if response.status_code != 200:
+        print(f"[check_availability_time] ❌ ST respondió {response.status_code}: {response.text[:300]}")
+        return None
+
+    # businessUnitIds se guarda para el ledger de slots; no se le muestra al agente.
+    return [
+        {"start": slot["start"], "end": slot["end"], "businessUnitIds": slot.get("businessUnitIds") or []}
+        for slot in response.json().get("availabilities", []) if slot.get("isAvailable")
+    ]
+
+
+def _public_slots(slots):
+    return [{"start": slot["start"], "end": slot["end"]} for slot in slots]
+
+
+async def check_availability_time(time, business_units, job_type, access_token=None,
+                                  with_business_units=False):
     """
     Devuelve:
-      - list[dict]  si encontró slots disponibles
+      - list[dict]  si encontró slots disponibles ({"start", "end"}, más
+                    "businessUnitIds" si with_business_units=True)
       - []          si la API respondió OK pero no hay turnos (capacidad real vacía)
       - None        si la API de ST no pudo responder (error de red, auth, 5xx, etc.)
+
+    Busca en ventanas semanales sin solapamiento, con hasta
+    CAPACITY_SEARCH_FANOUT ventanas en vuelo a la vez. Los resultados se leen en
+    orden: apenas la ventana más temprana con slots está resuelta (y todas las
+    anteriores vinieron vacías o fallaron) se devuelve y se cancela el resto.
+    Un calendario lleno cuesta ~2 round trips en paralelo en vez de 5 en serie.
     """
     print(f"[check_availability_time] jobType={job_type} BUs={business_units} desde={time}")
 
@@ -481,6 +1033,14 @@ async def check_availability_time(time, business_units, job_type, access_token=N
         print(f"[check_availability_time] ❌ Formato de tiempo inválido: {time}")
         raise ValueError("Invalid date/time format. Expected ISO 8601 like YYYY-MM-DDTHH:MM[:SS].") from exc
 
+    windows = _capacity_windows(start_time)
+
+    # Índice precalculado en memoria (si está habilitado y cubre el pedido).
+    indexed = availability_index.lookup(job_type, business_units, windows)
+    if indexed is not None:
+        print(f"[check_availability_time] ✅ Respondido desde el índice en memoria ({len(indexed)} slot(s))")
+        return indexed if with_business_units else _public_slots(indexed)
+
     if not access_token:
         access_token = await get_access_token()
     headers = {
@@ -489,71 +1049,118 @@ async def check_availability_time(time, business_units, job_type, access_token=N
         "Content-Type": "application/json",
     }
 
-    got_valid_response = False  # True si al menos un intento recibió HTTP 200
+    fanout = max(1, config.CAPACITY_SEARCH_FANOUT)
+    tasks = {}  # índice de ventana -> Task
 
-    for attempt in range(5):
-        current_start = start_time + timedelta(days=attempt * 7)
-        current_end = current_start + timedelta(days=13)
-        current_end = current_end.replace(hour=23, minute=59, second=0, microsecond=0)
+    def cached(i):
+        starts, ends = windows[i]
+        return _capacity_cache.get(_capacity_key(job_type, business_units, starts, ends), _NOT_CACHED)
 
-        starts_on_or_after = current_start.replace(tzinfo=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
-        ends_on_or_before = current_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+    def launch_up_to(n):
+        for j in range(min(n, len(windows))):
+            if j not in tasks and cached(j) is _NOT_CACHED:
+                starts, ends = windows[j]
+                tasks[j] = asyncio.create_task(
+                    _fetch_capacity_window(headers, business_units, job_type, starts, ends))
 
-        print(f"[check_availability_time] Intento {attempt + 1}/5 → {starts_on_or_after} a {ends_on_or_before}")
+    got_valid_response = False  # True si al menos una ventana recibió HTTP 200
+    try:
+        for i, (starts, ends) in enumerate(windows):
+            slots = cached(i) if i not in tasks else _NOT_CACHED
+            if slots is _NOT_CACHED:
+                # Mantener `fanout` ventanas en vuelo por delante de la que se lee.
+                launch_up_to(i + fanout)
+                slots = await tasks[i]
+            if slots is None:
+                if deadline.expired():
+                    # No queda tiempo para esperar el resto: la mejor respuesta
+                    # parcial es la ventana posterior más temprana que ya llegó con slots.
+                    for j in range(i + 1, len(windows)):
+                        later = cached(j)
+                        if later is not _NOT_CACHED and later:
+                            print(f"[check_availability_time] ⏱ Deadline: respuesta parcial desde ventana {j + 1}/{len(windows)}")
+                            return later if with_business_units else _public_slots(later)
+                    print(f"[check_availability_time] ⏱ Deadline agotado en ventana {i + 1}/{len(windows)}")
+                    break
+                continue
+            got_valid_response = True
+            if slots:
+                print(f"[check_availability_time] ✅ {len(slots)} slot(s) en ventana {i + 1}/{len(windows)} "
+                      f"({starts} a {ends}). Primero: {slots[0]['start']}")
+                return slots if with_business_units else _public_slots(slots)
+            print(f"[check_availability_time] 200 OK pero sin slots en ventana {i + 1}/{len(windows)}")
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
 
-        payload = {
-            "startsOnOrAfter": starts_on_or_after,
-            "endsOnOrBefore": ends_on_or_before,
-            "businessUnitIds": business_units,
-            "jobTypeId": job_type,
-            "skillBasedAvailability": False
-        }
+    if not got_valid_response:
+        print("[check_availability_time] ❌ ST no respondió con 200 en ninguna ventana (API no disponible).")
+        return None  # distinto de [] — señal de falla de API, no de falta de capacidad
 
-        try:
-            # timeout corto: hasta 5 intentos secuenciales. Con 15s c/u podían
-            # sumar 75s y colgar la llamada de voz. 8s mantiene el total acotado.
-            async with httpx.AsyncClient(timeout=8.0) as client:
-                response = await client.post(
-                    f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}/capacity",
-                    headers=headers,
-                    json=payload
-                )
+    print(f"[check_availability_time] Sin slots disponibles en {len(windows)} ventanas (API OK, capacidad vacía).")
+    return []
 
-            if response.status_code == 200:
-                got_valid_response = True
-                slots = [
-                    {"start": slot["start"], "end": slot["end"]}
-                    for slot in response.json().get("availabilities", []) if slot.get("isAvailable")
-                ]
-                if slots:
-                    print(f"[check_availability_time] ✅ {len(slots)} slot(s). Primero: {slots[0]['start']}")
-                    return slots
-                else:
-                    print(f"[check_availability_time] 200 OK pero sin slots en intento {attempt + 1}, reintentando...")
-            else:
-                print(f"[check_availability_time] ❌ ST respondió {response.status_code}: {response.text[:300]}")
 
-        except httpx.RequestError as e:
-            print(f"[check_availability_time] ❌ Error de red: {str(e)}")
+def _slot_key(job_type_id, start_raw, end_raw) -> tuple:
+    """Clave del ledger: el horario normalizado tal como lo vio el agente."""
+    start = _parse_agent_datetime(start_raw).strftime('%Y-%m-%dT%H:%M:%SZ')
+    end = _parse_agent_datetime(end_raw).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return (int(job_type_id), start, end)
 
-    if not got_valid_response:
-        print("[check_availability_time] ❌ ST no respondió con 200 en ningún intento (API no disponible).")
-        return None  # distinto de [] — señal de falla de API, no de falta de capacidad
 
-    print("[check_availability_time] Sin slots disponibles tras 5 intentos (API OK, capacidad vacía).")
-    return []
+def _record_slots(call_id, job_type_id, slots):
+    """Anota en la sesión de la llamada qué BU(s) tiene cada slot ofrecido,
+    para que createJob no tenga que volver a preguntarle a ST."""
+    if not call_id:
+        return
+    session = call_sessions.setdefault(call_id, {"_ts": time.time()})
+    ledger = session.setdefault("_slots", {})
+    now = time.time()
+    for slot in slots:
+        try:
+            key = _slot_key(job_type_id, slot["start"], slot["end"])
+        except ValueError:
+            continue
+        ledger[key] = {"businessUnitIds": slot.get("businessUnitIds") or [], "ts": now}
+
+
+def _ledger_business_units(call_id, job_type_id, start_raw, end_raw):
+    """BUs dueñas del slot según el último checkAvailability de esta llamada,
+    o None si no está anotado o el dato ya es viejo."""
+    ledger = call_sessions.get(call_id, {}).get("_slots") if call_id else None
+    if not ledger:
+        return None
+    try:
+        entry = ledger.get(_slot_key(job_type_id, start_raw, end_raw))
+    except ValueError:
+        return None
+    if not entry or not entry["businessUnitIds"] or time.time() - entry["ts"] > config.SLOT_LEDGER_TTL:
+        return None
+    return entry["businessUnitIds"]
 
 
-async def _resolve_business_unit(headers, job_type_id, start_raw, end_raw, requested_bu):
-    """Re-verifica contra ServiceTitan cual business unit tiene realmente el
-    hueco para este horario exacto, en vez de confiar en la que arrastro el
-    agente desde check_availability (que mezcla los slots de todas las BUs
-    de un jobType en una sola lista sin indicar de cual era cada una)."""
+async def _resolve_business_unit(headers, job_type_id, start_raw, end_raw, requested_bu, call_id=None):
+    """Determina cual business unit tiene realmente el hueco para este horario
+    exacto, en vez de confiar en la que arrastro el agente desde
+    check_availability (que le muestra los slots de todas las BUs de un
+    jobType en una sola lista sin indicar de cual era cada una).
+
+    Primero mira el ledger de slots de la llamada; solo si el slot no está
+    anotado (o es viejo) re-verifica contra ServiceTitan."""
     job_types = await _get_job_types(headers)
     business_units = job_types.get(job_type_id) or []
     if len(business_units) <= 1:
         return requested_bu  # una sola BU posible, nada que resolver
 
+    owners = _ledger_business_units(call_id, job_type_id, start_raw, end_raw)
+    if owners is not None:
+        if requested_bu in owners:
+            return requested_bu
+        print(f"[resolveBusinessUnit] ⚠️ BU corregida desde el ledger: agente mandó {requested_bu}, "
+              f"la que tiene el hueco es {owners[0]} (jobType {job_type_id})")
+        return owners[0]
+
     try:
         start_dt = _parse_agent_datetime(start_raw)
         end_dt = _parse_agent_datetime(end_raw)
@@ -571,10 +1178,9 @@ async def _resolve_business_unit(headers, job_type_id, start_raw, end_raw, reque
         "skillBasedAvailability": False,
     }
     try:
-        async with httpx.AsyncClient(timeout=8.0) as client:
-            resp = await client.post(
-                f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}/capacity",
-                headers=headers, json=payload)
+        resp = await st_gateway.post(
+            f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}/capacity",
+            route="capacity", headers=headers, json=payload, timeout=8.0)
     except httpx.RequestError as e:
         print(f"[resolveBusinessUnit] ❌ Error de red: {e}")
         return requested_bu
@@ -603,35 +1209,34 @@ async def _resolve_business_unit(headers, job_type_id, start_raw, end_raw, reque
     return corrected
 
 
+async def _fetch_technicians() -> "list | None":
+    """Lista completa de técnicos de ST (todas las páginas), o None si falla."""
+    access_token = await get_access_token()
+    headers = {
+        "Authorization": access_token,
+        "ST-App-Key": APP_ID,
+        "Content-Type": "application/json",
+    }
+    return await st_gateway.list_all(
+        f"https://api.servicetitan.io/settings/v2/tenant/{TENANT_ID}/technicians",
+        route="technicians", headers=headers)
+
+
 async def get_technicians_by_businessUnitId(businessUnitId):
     print(f"Getting technicians for Business Unit ID: {businessUnitId}...")
 
     try:
-        url_technicians = f"https://api.servicetitan.io/settings/v2/tenant/{TENANT_ID}/technicians"
-        access_token = await get_access_token()
-        headers = {
-            "Authorization": access_token,
-            "ST-App-Key": APP_ID,
-            "Content-Type": "application/json",
-        }
-
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response_technicians = await client.get(url_technicians, headers=headers)
+        roster = await technicians.roster(_fetch_technicians)
+        if roster is None:
+            print("Error fetching technicians.")
+            return {"error": "Failed to retrieve technicians."}
 
-        if response_technicians.status_code == 200:
-            print("Technicians fetched successfully.")
-            response_data = response_technicians.json()
-            technicians = [
-                tech for tech in response_data.get("data", []) if tech.get("businessUnitId") == businessUnitId
-            ]
-            if technicians:
-                print(f"Found {len(technicians)} technicians for Business Unit ID {businessUnitId}.")
-            else:
-                print(f"No technicians found for Business Unit ID {businessUnitId}.")
-            return technicians
+        found = roster.for_business_unit(businessUnitId)
+        if found:
+            print(f"Found {len(found)} technicians for Business Unit ID {businessUnitId}.")
         else:
-            print(f"Error fetching technicians. Status Code: {response_technicians.status_code}")
-            return {"error": "Failed to retrieve technicians."}
+            print(f"No technicians found for Business Unit ID {businessUnitId}.")
+        return found
 
     except httpx.RequestError as e:
         print(f"Error occurred: {str(e)}")
@@ -645,6 +1250,19 @@ def read_root():
     return {"status": "Service is up"}
 
 
+@app.get("/cacheStats")
+def cache_stats():
+    """Contadores de los caches en memoria (diagnóstico)."""
+    return {
+        "jobTypes": {**_job_types_stats, "size": len(_job_types_cache["data"] or {}),
+                     "ageSeconds": round(time.time() - _job_types_cache["ts"]) if _job_types_cache["data"] else None},
+        "caches": ttl_cache.all_stats(),
+        "stHedging": dict(st_gateway.hedge_stats),
+        "geocode": {**geocode.stats, "size": geocode.size()},
+        "normalize": normalize.cache_stats(),
+    }
+
+
 @app.post("/getTime")
 async def get_current_boston_time():
     print("Processing getTime request... 🔄")
@@ -683,7 +1301,6 @@ async def check_work_area(data: utils.AddressCheckToolRequest):
         return {"error": f"Missing required address fields: {missing_fields}"}
 
     PO_BOX_SALEM = config.SALEM_PO_BOX
-    R = config.EARTH_RADIUS_MILES
 
     city = data.city.strip().lower()
     state = data.state.strip().lower()
@@ -698,16 +1315,32 @@ async def check_work_area(data: utils.AddressCheckToolRequest):
         print("Coordinates Checked In List ✅")
         return {"message": "City is in the working area (matched from predefined list)."}
 
+    # Variantes de transcripción de una ciudad de la lista ("Methune", "Newbury
+    # Port"). Los pueblos reales (North Hampton NH ≠ Northampton MA) no se
+    # corrigen: los decide el gazetteer.
+    if state in VALID_STATES and not gazetteer.has_town(data.city, data.state):
+        match = city_match.match_city(data.city)
+        if match is not None:
+            print(f"[checkWorkArea] '{data.city}' → {match['city']} ({match['method']}, score {match['score']}) ✅")
+            return {"message": "City is in the working area (matched from predefined list)."}
+
+    # Gazetteer local (ZIPs / pueblos de MA-NH con el área precalculada): la
+    # respuesta sale de un lookup en memoria. El geocode por dirección solo
+    # refina los "boundary", donde el error de usar un centroide puede cambiarla.
+    local = gazetteer.locate(data.zip, data.city, data.state)
+    if local is not None:
+        if local["status"] != "boundary":
+            return _work_area_verdict(local["status"] == "in", local["miles"], f"gazetteer {local['place']}")
+        if not config.GAZETTEER_GEOCODE_REFINE:
+            return _local_work_area_verdict(local)
+        print(f"[checkWorkArea] {local['place']} a {local['miles']:.1f} mi, en el borde: refinando con geocode")
+
     # Fallback: geocodificación + cálculo de distancia (50 mi desde Salem MA)
     # Política: si geocode falla pero el estado es MA o NH, se permite el booking
     # (el dispatcher verifica en persona). Solo bloqueamos si la dirección queda
     # fuera de los 50 mi y lo podemos confirmar con coordenadas reales.
-    # SSRF/inyección: la dirección (input de usuario) NO debe interpolarse cruda
-    # en el path. Se URL-encodea y el auth va por params; sin seguir redirects
-    # para que nunca se filtre MAPS_AUTH a otro host.
-    address = quote(f"{data.street}, {data.city}, {data.state}", safe="")
-    url_geocode = f"https://geocode.xyz/{address}"
-
+    # El request sale por geocode.py: pool async + cache persistente de
+    # direcciones (también de las que no existen).
     _GEOCODE_FAIL_OPEN = {
         "message": "Address is in the working area.",
         "geocode_validation": "pending",
@@ -715,73 +1348,50 @@ async def check_work_area(data: utils.AddressCheckToolRequest):
     }
 
     try:
-        resp = await asyncio.to_thread(
-            lambda: requests.get(
-                url_geocode,
-                params={"json": "1", "auth": MAPS_AUTH},
-                timeout=8,
-                allow_redirects=False,
-            )
-        )
-    except Exception as e:
+        location = await geocode.lookup(data.street, data.city, data.state)
+    except geocode.GeocodeUnavailable as e:
         print(f"[checkWorkArea] Geocode no disponible: {e}")
+        if local is not None:
+            return _local_work_area_verdict(local)
         if state in VALID_STATES:
             return _GEOCODE_FAIL_OPEN
+        if e.status_code is not None:
+            return {"error": "Failed to fetch geolocation data."}
         return {"error": "Could not validate the address location. Please try again."}
 
-    if resp.status_code != 200:
-        print(f"[checkWorkArea] Geocode respondió {resp.status_code}")
-        if state in VALID_STATES:
-            return _GEOCODE_FAIL_OPEN
-        return {"error": "Failed to fetch geolocation data."}
-
-    try:
-        json_data = resp.json()
-    except ValueError:
-        print("[checkWorkArea] Geocode devolvió un body no-JSON.")
-        if state in VALID_STATES:
-            return _GEOCODE_FAIL_OPEN
-        return {"error": "Could not validate the address location. Please try again."}
-
-    if json_data.get("error") or json_data.get("longt") == "0.00000" or json_data.get("latt") == "0.00000":
-        print(f"[checkWorkArea] Geocode no encontró la dirección: {address}")
+    if location is None:
+        print(f"[checkWorkArea] Geocode no encontró la dirección: {data.street}, {data.city}, {data.state}")
+        if local is not None:
+            return _local_work_area_verdict(local)
         if state in VALID_STATES:
             return _GEOCODE_FAIL_OPEN
         return {"error": "The address could not be located. Please verify the address and try again."}
 
     # ZIP mismatch: solo loggear, NO bloquear. La autoridad es la distancia.
-    expected_zip = (json_data.get("standard", {}) or {}).get("postal")
-    if expected_zip:
-        expected_zip_clean = expected_zip.split('-')[0]
-        if expected_zip_clean != data.zip:
-            print(f"[checkWorkArea] ZIP mismatch: geocode={expected_zip_clean}, cliente={data.zip} — continuando con check de distancia.")
+    if location["postal"] and location["postal"] != data.zip:
+        print(f"[checkWorkArea] ZIP mismatch: geocode={location['postal']}, cliente={data.zip} — continuando con check de distancia.")
 
-    try:
-        lat = float(json_data.get("latt"))
-        lon = float(json_data.get("longt"))
-    except (TypeError, ValueError):
-        print("[checkWorkArea] No se pudieron parsear las coordenadas de geocode.")
-        if state in VALID_STATES:
-            return _GEOCODE_FAIL_OPEN
-        return {"error": "The provided coordinates are not valid."}
-
-    lat1, lon1 = math.radians(PO_BOX_SALEM[0]), math.radians(PO_BOX_SALEM[1])
-    lat2, lon2 = math.radians(lat), math.radians(lon)
-    delta_lat = lat2 - lat1
-    delta_lon = lon2 - lon1
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = round(R * c, 2)
-
-    if distance > config.SERVICE_RADIUS_MILES:
-        print(f"[checkWorkArea] Fuera del área: {distance} mi desde Salem MA.")
+    distance = gazetteer.haversine_miles(PO_BOX_SALEM[0], PO_BOX_SALEM[1], location["lat"], location["lon"])
+    return _work_area_verdict(distance <= config.SERVICE_RADIUS_MILES, distance, "geocode")
+
+
+def _local_work_area_verdict(local):
+    """Decisión por distancia al centroide (pueblos del borde sin refinar)."""
+    return _work_area_verdict(local["miles"] <= config.SERVICE_RADIUS_MILES, local["miles"],
+                              f"gazetteer {local['place']}")
+
+
+def _work_area_verdict(in_area, distance, source):
+    distance = round(distance, 2)
+    if not in_area:
+        print(f"[checkWorkArea] Fuera del área: {distance} mi desde Salem MA ({source}).")
         return {"error": "There are no services available in the area."}
 
-    print(f"[checkWorkArea] ✅ En área: {distance} mi desde Salem MA.")
+    print(f"[checkWorkArea] ✅ En área: {distance} mi desde Salem MA ({source}).")
     return {"message": "Address is in the working area."}
 
 
-@app.post("/findCustomer")
+@app.post("/findCustomer", dependencies=[Depends(_prefetch_on_first_tool_call)])
 async def find_customer(data: utils.FindCustomerToolRequest):
     print("Processing findCustomer request... 🔄")
 
@@ -794,20 +1404,12 @@ async def find_customer(data: utils.FindCustomerToolRequest):
     if not isinstance(phone, str) or not phone.strip():
         return {"error": "A phone number is required to search for a customer."}
     phone = normalize.normalize_phone(phone)
+    if len(_phone_key(phone)) != 10:
+        return {"error": "A valid 10-digit phone number is required to search for a customer."}
 
     try:
-        url_customers = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/customers?phone={phone}"
-        access_token = await get_access_token()
-        headers = {
-            "Authorization": access_token,
-            "ST-App-Key": APP_ID,
-            "Content-Type": "application/json",
-        }
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response_customers = await client.get(url_customers, headers=headers)
-        if response_customers.status_code == 200:
-            customers_data_json = response_customers.json()
-            customers_list = customers_data_json.get("data", [])
+        status_code, customers_list = await _find_customers_by_phone(phone)
+        if status_code == 200:
             if not customers_list:
                 print("No customers found by phone.")
                 return {
@@ -820,14 +1422,13 @@ async def find_customer(data: utils.FindCustomerToolRequest):
             ]
             print(f"Found {len(customers)} customers by phone ✅")
             return customers
-        print(f"Error: Unexpected response {response_customers.status_code} - {response_customers.text}")
-        return {"error": f"Unexpected response status: {response_customers.status_code}"}
+        return {"error": f"Unexpected response status: {status_code}"}
     except httpx.RequestError as e:
         print(f"Error getting customers: {e}")
         return {"error": "Error when making external request."}
 
 
-@app.post("/getCustomerLocations")
+@app.post("/getCustomerLocations", dependencies=[Depends(_prefetch_on_first_tool_call)])
 async def get_customer_locations(data: utils.FindAppointmentToolRequest):
 
     if isinstance(data.args, dict):
@@ -840,18 +1441,9 @@ async def get_customer_locations(data: utils.FindAppointmentToolRequest):
     print(f"Getting locations for customer ID: {customer_id}... 🔄")
 
     try:
-        access_token = await get_access_token()
-        headers = {
-            "Authorization": access_token,
-            "ST-App-Key": APP_ID,
-            "Content-Type": "application/json",
-        }
-        url_location = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/locations?customerId={customer_id}"
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response_location = await client.get(url_location, headers=headers)
+        status_code, locations_data = await _customer_locations(customer_id)
 
-        if response_location.status_code == 200:
-            locations_data = response_location.json().get("data", [])
+        if status_code == 200:
             if not locations_data:
                 return {"error": "No locations found for this customer."}
 
@@ -871,8 +1463,6 @@ async def get_customer_locations(data: utils.FindAppointmentToolRequest):
                 "locations": locations
             }
         else:
-            print(
-                f"Failed to get locations: {response_location.status_code} - {response_location.text}")
             return {"error": "Failed to retrieve locations."}
 
     except Exception as e:
@@ -913,8 +1503,7 @@ async def create_location(data: utils.CreateLocationToolRequest, request: Reques
         }
 
         url = f"https://api.servicetitan.io/crm/v2/tenant/{TENANT_ID}/locations"
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(url, headers=headers, json=payload)
+        response = await st_gateway.post(url, route="location_create", headers=headers, json=payload, timeout=15.0)
 
         if response.status_code != 200:
             print(f"Error creating location: {response.text}")
@@ -924,6 +1513,12 @@ async def create_location(data: utils.CreateLocationToolRequest, request: Reques
         # Suponiendo que response es lo que devuelve el POST al crear la location:
         response_data = response.json()
         location_id = response_data.get("id")
+        _remember_location(data.customerId, {
+            "id": location_id,
+            "name": data.location.name,
+            "address": payload["address"],
+            **response_data,
+        })
 
         return {
             "message": "Location created successfully.",
@@ -972,7 +1567,7 @@ async def create_customer_endpoint(data: utils.CreateCustomerToolRequest, reques
 
 @app.post("/checkAvailability")
 @app.post("/checkAvailability/")
-async def check_availability(data: utils.BookingRequest):
+async def check_availability(data: utils.BookingRequest, request: Request):
     print("Processing checkAvailability request... 🔄")
 
     if isinstance(data.args, dict):
@@ -1002,7 +1597,8 @@ async def check_availability(data: utils.BookingRequest):
     print(f"[checkAvailability] jobTypeId={data.jobTypeId} → BUs={business_units} ✅")
 
     try:
-        available_slots = await check_availability_time(data.time, business_units, data.jobTypeId, access_token)
+        available_slots = await check_availability_time(
+            data.time, business_units, data.jobTypeId, access_token, with_business_units=True)
     except ValueError:
         return {"error": "Invalid date/time format received. Please confirm the requested appointment time."}
 
@@ -1014,13 +1610,14 @@ async def check_availability(data: utils.BookingRequest):
     if not available_slots:
         print("[checkAvailability] Sin turnos disponibles.")
         start_date = _parse_agent_datetime(data.time)
-        end_date = start_date + timedelta(days=42)
+        end_date = start_date + timedelta(days=config.CAPACITY_SEARCH_DAYS)
         return {"message": f"No availability found when checking up to {end_date.strftime('%Y-%m-%d')}"}
 
     print(f"[checkAvailability] ✅ {len(available_slots)} slot(s) encontrados.")
+    _record_slots(await _resolve_call_id(request, data), data.jobTypeId, available_slots)
     return {
         "businessUnitId": business_units[0],
-        "available_slots": available_slots
+        "available_slots": _public_slots(available_slots)
     }
 
 
@@ -1055,14 +1652,18 @@ async def create_job(data: utils.JobCreateToolRequest, request: Request):
                 data.jobEndTime += "Z"
 
             # Si el jobType tiene mas de una business unit, check_availability
-            # ya mezclo los slots de todas en una sola lista sin decir de cual
-            # era cada uno. Re-verificar contra ST cual BU tiene realmente el
-            # hueco a esta hora exacta, en vez de confiar en la que arrastro
-            # el agente desde la conversacion.
+            # le mostró al agente los slots de todas en una sola lista sin decir
+            # de cual era cada uno. Resolver la BU que tiene realmente el hueco
+            # (ledger de la llamada, o ST si no está anotado), en vez de confiar
+            # en la que arrastro el agente desde la conversacion.
             data.businessUnitId = await _resolve_business_unit(
-                headers, data.jobTypeId, data.jobStartTime, data.jobEndTime, data.businessUnitId
+                headers, data.jobTypeId, data.jobStartTime, data.jobEndTime, data.businessUnitId,
+                call_id=await _resolve_call_id(request, data),
             )
 
+            # Horario tal como lo vio el agente (Eastern), para invalidar el cache de capacidad.
+            slot_start, slot_end = data.jobStartTime, data.jobEndTime
+
             # Trazar conversión de timezone para debugging
             print(f"[createJob] 🕐 Recibido del agente → start: {data.jobStartTime} | end: {data.jobEndTime}")
             # massachusetts_to_utc asume que el agente envía hora Eastern (como la recibió
@@ -1102,8 +1703,12 @@ async def create_job(data: utils.JobCreateToolRequest, request: Request):
             url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs"
             print(f"[createJob] Payload enviado a ServiceTitan: {json.dumps(payload, indent=2)}")
 
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
+            response = await st_gateway.post(url, route="job_create", headers=headers, json=payload, timeout=15.0)
+            # Booking hecho o rechazado por "horario ocupado": en ambos casos la
+            # capacidad cacheada para ese rango ya no es confiable.
+            _invalidate_capacity(slot_start, slot_end, job_type=data.jobTypeId,
+                                 business_unit=data.businessUnitId)
+            appointments.invalidate(data.customerId)
 
             print(f"[createJob] Status code: {response.status_code}")
             print(f"[createJob] Response body: {response.text}")
@@ -1127,6 +1732,7 @@ async def create_job(data: utils.JobCreateToolRequest, request: Request):
                 return {"error": "The booking could not be confirmed. Please try again."}
 
             print(f"[createJob] ✅ Job creado: jobId={job_id}, appointmentId={appointment_id}")
+            job_summary.remember(job_id, job_data.get("summary"))
             return {
                 "status": "Job booked",
                 "jobId": job_id,
@@ -1140,7 +1746,7 @@ async def create_job(data: utils.JobCreateToolRequest, request: Request):
     return await _run_idempotent(request, "createJob", args_obj, action)
 
 
-@app.post("/findAppointments")
+@app.post("/findAppointments", dependencies=[Depends(_prefetch_on_first_tool_call)])
 async def find_appointments(data: utils.FindAppointmentToolRequest):
     print("Processing findAppointments request... 🔄")
 
@@ -1161,78 +1767,12 @@ async def find_appointments(data: utils.FindAppointmentToolRequest):
         "Content-Type": "application/json",
     }
 
-    def to_eastern(ts: str) -> str:
-        if not ts:
-            return ""
-        if ts.endswith("Z"):
-            ts = ts.replace("Z", "+00:00")
-        dt_utc = datetime.fromisoformat(ts)
-        return dt_utc.astimezone(EASTERN_TIME).isoformat()
-
-    async def fetch_jobs_by_status(job_status: str):
-        url = (
-            f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs"
-            f"?customerId={customer_id}&jobStatus={job_status}"
-        )
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, headers=headers)
-        if resp.status_code == 200:
-            return resp.json().get("data", [])
-        print(f"Error fetching jobs with status {job_status}: {resp.text}")
-        return []
-
-    async def fetch_appointments_for_job(job: dict, appointment_status: str):
-        job_id = job.get("id")
-        url = (
-            f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/appointments"
-            f"?jobId={job_id}&status={appointment_status}"
-        )
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, headers=headers)
-        if resp.status_code != 200:
-            print(f"Error fetching appointments for job {job_id}: {resp.text}")
-            return []
-        appointments = []
-        for a in resp.json().get("data", []):
-            appointments.append({
-                "jobId": job.get("id"),
-                "businessUnitId": job.get("businessUnitId"),
-                "jobTypeId": job.get("jobTypeId"),
-                "summary": job.get("summary", ""),
-                "employeeId": job.get("jobGeneratedLeadSource", {}).get("employeeId"),
-                "appointmentId": a.get("id"),
-                "start": to_eastern(a.get("start")),
-                "end": to_eastern(a.get("end")),
-            })
-        return appointments
-
-    # Fetch los 3 estados en paralelo
-    scheduled_jobs, dispatched_jobs, working_jobs = await asyncio.gather(
-        fetch_jobs_by_status("Scheduled"),
-        fetch_jobs_by_status("Dispatched"),
-        fetch_jobs_by_status("InProgress"),
-    )
-    print(f"Found {len(scheduled_jobs)} Scheduled, {len(dispatched_jobs)} Dispatched, {len(working_jobs)} Working jobs")
-
-    # Fetch appointments en paralelo para todos los jobs
-    all_tasks = (
-        [(job, "Scheduled") for job in scheduled_jobs] +
-        [(job, "Dispatched") for job in dispatched_jobs] +
-        [(job, "Working") for job in working_jobs]
-    )
-    all_results = await asyncio.gather(*[fetch_appointments_for_job(job, status) for job, status in all_tasks])
-
-    scheduled_appointments = []
-    dispatched_appointments = []
-    working_appointments = []
-
-    idx = 0
-    for job in scheduled_jobs:
-        scheduled_appointments.extend(all_results[idx]); idx += 1
-    for job in dispatched_jobs:
-        dispatched_appointments.extend(all_results[idx]); idx += 1
-    for job in working_jobs:
-        working_appointments.extend(all_results[idx]); idx += 1
+    by_status = await appointments.by_job_status(customer_id, TENANT_ID, headers)
+    scheduled_appointments = by_status["Scheduled"]
+    dispatched_appointments = by_status["Dispatched"]
+    working_appointments = by_status["InProgress"]
+    print(f"Found {len(scheduled_appointments)} Scheduled, {len(dispatched_appointments)} Dispatched, "
+          f"{len(working_appointments)} Working appointments")
 
     # Si no hay nada encontrado
     if not any([
@@ -1251,7 +1791,7 @@ async def find_appointments(data: utils.FindAppointmentToolRequest):
     }
 
 
-@app.post("/findPastAppointments")
+@app.post("/findPastAppointments", dependencies=[Depends(_prefetch_on_first_tool_call)])
 async def find_past_appointments(data: utils.FindAppointmentToolRequest):
     print("Processing findPastAppointments request... 🔄")
 
@@ -1272,76 +1812,12 @@ async def find_past_appointments(data: utils.FindAppointmentToolRequest):
         "Content-Type": "application/json",
     }
 
-    def to_eastern_past(ts: str) -> str:
-        if not ts:
-            return ""
-        if ts.endswith("Z"):
-            ts = ts.replace("Z", "+00:00")
-        dt_utc = datetime.fromisoformat(ts)
-        return dt_utc.astimezone(EASTERN_TIME).isoformat()
-
-    async def fetch_jobs_by_status_past(job_status: str):
-        url = (
-            f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs"
-            f"?customerId={customer_id}&jobStatus={job_status}"
-        )
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, headers=headers)
-        if resp.status_code == 200:
-            return resp.json().get("data", [])
-        print(f"Error fetching jobs with status {job_status}: {resp.text}")
-        return []
-
-    async def fetch_appointments_for_job_past(job: dict, appointment_status: str):
-        job_id = job.get("id")
-        url = (
-            f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/appointments"
-            f"?jobId={job_id}&status={appointment_status}"
-        )
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, headers=headers)
-        if resp.status_code != 200:
-            print(f"Error fetching appointments for job {job_id}: {resp.text}")
-            return []
-        appointments = []
-        for a in resp.json().get("data", []):
-            appointments.append({
-                "jobId": job.get("id"),
-                "businessUnitId": job.get("businessUnitId"),
-                "jobTypeId": job.get("jobTypeId"),
-                "summary": job.get("summary", ""),
-                "employeeId": job.get("jobGeneratedLeadSource", {}).get("employeeId"),
-                "appointmentId": a.get("id"),
-                "start": to_eastern_past(a.get("start")),
-                "end": to_eastern_past(a.get("end")),
-            })
-        return appointments
-
-    hold_jobs, done_jobs, canceled_jobs = await asyncio.gather(
-        fetch_jobs_by_status_past("Hold"),
-        fetch_jobs_by_status_past("Completed"),
-        fetch_jobs_by_status_past("Canceled"),
-    )
-    print(f"Found {len(hold_jobs)} Hold, {len(done_jobs)} Done, {len(canceled_jobs)} Canceled jobs")
-
-    all_past_tasks = (
-        [(job, "Hold") for job in hold_jobs] +
-        [(job, "Done") for job in done_jobs] +
-        [(job, "Canceled") for job in canceled_jobs]
-    )
-    all_past_results = await asyncio.gather(*[fetch_appointments_for_job_past(job, status) for job, status in all_past_tasks])
-
-    hold_appointments = []
-    done_appointments = []
-    canceled_appointments = []
-
-    idx = 0
-    for job in hold_jobs:
-        hold_appointments.extend(all_past_results[idx]); idx += 1
-    for job in done_jobs:
-        done_appointments.extend(all_past_results[idx]); idx += 1
-    for job in canceled_jobs:
-        canceled_appointments.extend(all_past_results[idx]); idx += 1
+    by_status = await appointments.by_job_status(customer_id, TENANT_ID, headers)
+    hold_appointments = by_status["Hold"]
+    done_appointments = by_status["Completed"]
+    canceled_appointments = by_status["Canceled"]
+    print(f"Found {len(hold_appointments)} Hold, {len(done_appointments)} Done, "
+          f"{len(canceled_appointments)} Canceled appointments")
 
     if not any([hold_appointments, done_appointments, canceled_appointments]):
         print("No past appointments found.")
@@ -1394,10 +1870,56 @@ async def reschedule_appointment_time_availability(data: utils.ReScheduleToolReq
 
     print("[rescheduleAvailability] Sin turnos disponibles.")
     start_date = _parse_agent_datetime(data.newSchedule)
-    end_date = start_date + timedelta(days=42)
+    end_date = start_date + timedelta(days=config.CAPACITY_SEARCH_DAYS)
     return {"message": f"No availability found when checking up to {end_date.strftime('%Y-%m-%d')}"}
 
 
+async def _assignment_patch(action, appointment_id, tech_ids, headers):
+    """PATCH a appointment-assignments/{action} (assign-technicians / unassign-technicians)."""
+    url = f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}/appointment-assignments/{action}"
+    payload = {"jobAppointmentId": appointment_id, "technicianIds": tech_ids}
+    return await st_gateway.patch(url, route="assignments", json=payload, headers=headers, timeout=15.0)
+
+
+async def _reassign_technicians(appointment_id, tech_ids):
+    """Compensación de fondo: el reschedule falló después de sacar al técnico,
+    así que se lo vuelve a asignar (con reintentos y backoff)."""
+    delay = config.REASSIGN_RETRY_DELAY
+    for attempt in range(1, config.REASSIGN_RETRY_ATTEMPTS + 1):
+        try:
+            access_token = await get_access_token()
+            headers = {
+                "Authorization": access_token,
+                "ST-App-Key": APP_ID,
+                "Content-Type": "application/json",
+            }
+            resp = await _assignment_patch("assign-technicians", appointment_id, tech_ids, headers)
+            if resp.status_code == 200:
+                print(f"[reassign] ✅ Técnico(s) {tech_ids} reasignados al appointment {appointment_id}")
+                return
+            print(f"[reassign] intento {attempt}: ST respondió {resp.status_code} - {resp.text[:200]}")
+        except Exception as e:
+            print(f"[reassign] intento {attempt} falló: {e}")
+        if attempt < config.REASSIGN_RETRY_ATTEMPTS:
+            await asyncio.sleep(delay)
+            delay *= 2
+    logger.error(f"[reassign] ❌ No se pudo reasignar {tech_ids} al appointment {appointment_id}: "
+                 f"quedó sin técnico, revisar en ServiceTitan")
+
+
+def _invalidate_reschedule_capacity(previous: "dict | None", new_schedule: str, new_end_utc: datetime):
+    """Invalida la capacidad del horario nuevo y del que se libera. Si el
+    viejo no está en ningún escaneo cacheado no se sabe qué rango se liberó
+    y se invalida todo, como en las cancelaciones."""
+    if previous is None or not previous.get("start"):
+        _invalidate_capacity()
+        return
+    new_end = new_end_utc.astimezone(EASTERN_TIME).strftime("%Y-%m-%dT%H:%M:%S")
+    for start, end in ((previous["start"], previous.get("end")), (new_schedule, new_end)):
+        _invalidate_capacity(start, end or None, job_type=previous.get("jobTypeId"),
+                             business_unit=previous.get("businessUnitId"))
+
+
 @app.post("/rescheduleAppointment")
 async def reschedule_appointment(data: utils.ReScheduleToolRequest, request: Request):
     print("Processing rescheduleAppointment request... 🔄")
@@ -1421,47 +1943,51 @@ async def reschedule_appointment(data: utils.ReScheduleToolRequest, request: Req
         if not isinstance(new_schedule, str) or not new_schedule.strip():
             return {"error": "Missing newSchedule in request."}
 
-        # 1. Unassign technician if provided
         st_headers = {
             "Authorization": access_token,
             "ST-App-Key": APP_ID,
             "Content-Type": "application/json",
         }
 
-        if technician_id:
-            tech_ids = technician_id if isinstance(technician_id, list) else [technician_id]
-            print(f"Unassigning technician(s) {tech_ids} from appointment {appointment_id}...")
-            url_unassign = (
-                f"https://api.servicetitan.io/dispatch/v2/tenant/{TENANT_ID}"
-                "/appointment-assignments/unassign-technicians"
-            )
-            unassign_payload = {
-                "jobAppointmentId": appointment_id,
-                "technicianIds": tech_ids
-            }
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                resp_unassign = await client.patch(url_unassign, json=unassign_payload, headers=st_headers)
-            if resp_unassign.status_code == 200:
-                print("Technician unassigned successfully ✅")
-            else:
-                print(f"Failed to unassign technician: {resp_unassign.text}")
-
-        # 2. Ensure the new_schedule string ends with "Z"
+        # 1. Ensure the new_schedule string ends with "Z"
         if not new_schedule.endswith("Z"):
             new_schedule += "Z"
 
-        # 3. Convert from Massachusetts local time to UTC
+        # 2. Convert from Massachusetts local time to UTC
         try:
             start_utc = massachusetts_to_utc(new_schedule)
         except ValueError:
             return {"error": "Invalid date/time format received. Please confirm the requested appointment time."}
 
-        # 4. Calculate end_utc = start_utc + 3 hours
+        # 3. Calculate end_utc = start_utc + 3 hours
         start_dt = datetime.fromisoformat(start_utc.replace("Z", "+00:00"))
         end_dt = start_dt + timedelta(hours=3)
         end_utc = end_dt.isoformat().replace("+00:00", "Z")
 
-        # 5. Send the reschedule PATCH
+        # 4. Unassign (si vino técnico) y después el reschedule, en ese orden:
+        # son dos PATCH sobre el mismo appointment y ST no documenta qué pasa
+        # si se cruzan.
+        tech_ids = []
+        unassigned = False
+        if technician_id:
+            tech_ids = technician_id if isinstance(technician_id, list) else [technician_id]
+            roster = technicians.cached()
+            names = [(roster.get(t) or {}).get("name", t) for t in tech_ids] if roster else tech_ids
+            print(f"Unassigning technician(s) {names} (ids {tech_ids}) from appointment {appointment_id}...")
+            try:
+                resp_unassign = await _assignment_patch("unassign-technicians", appointment_id, tech_ids, st_headers)
+            except Exception as e:
+                print(f"Failed to unassign technician: {e}")
+            else:
+                if resp_unassign.status_code == 200:
+                    unassigned = True
+                    print("Technician unassigned successfully ✅")
+                else:
+                    print(f"Failed to unassign technician: {resp_unassign.text}")
+
+        # Horario que se libera, si algún findAppointments de la llamada ya lo trajo.
+        previous = appointments.cached_appointment(appointment_id)
+
         print(f"Rescheduling appointment {appointment_id} to start {start_utc} and end {end_utc}...")
         url_resch = (
             f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}"
@@ -1473,18 +1999,33 @@ async def reschedule_appointment(data: utils.ReScheduleToolRequest, request: Req
             "arrivalWindowStart": start_utc,
             "arrivalWindowEnd": end_utc
         }
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.patch(url_resch, json=resch_payload, headers=st_headers)
+        try:
+            resp = await st_gateway.patch(url_resch, route="reschedule", json=resch_payload,
+                                          headers=st_headers, timeout=15.0)
+        except Exception:
+            # Timeout / deadline: ST pudo haber movido el appointment igual, así
+            # que no se reasigna a ciegas; queda sin técnico para el dispatcher.
+            if unassigned:
+                logger.error(f"[reschedule] ❌ Sin respuesta de ST al reprogramar el appointment {appointment_id}; "
+                             f"quedó sin técnico {tech_ids}, revisar en ServiceTitan")
+            raise
+        finally:
+            _invalidate_reschedule_capacity(previous, new_schedule, end_dt)
+            appointments.invalidate()
 
         if resp.status_code == 200:
             print("rescheduleAppointment request completed ✅")
             return {"status": "rescheduleAppointment request processed successfully"}
-        else:
-            print(f"Failed to reschedule appointment: {resp.text}")
-            return {
-                "error": f"Request error: {resp.status_code}",
-                "details": resp.text
-            }
+
+        if unassigned:
+            # Rechazo definitivo: el appointment sigue en su horario viejo pero
+            # sin técnico, se lo devuelve de fondo.
+            _spawn_background(_reassign_technicians(appointment_id, tech_ids))
+        print(f"Failed to reschedule appointment: {resp.text}")
+        return {
+            "error": f"Request error: {resp.status_code}",
+            "details": resp.text
+        }
 
     return await _run_idempotent(request, "rescheduleAppointment", args_obj, action)
 
@@ -1525,8 +2066,10 @@ async def cancel_appointment(data: utils.CancelJobAppointmentToolRequest, reques
         }
 
         print(f"Cancelling job {job_id} with reason {reason_id}...")
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.put(url, headers=headers, json=payload)
+        resp = await st_gateway.put(url, route="job_cancel", headers=headers, json=payload, timeout=15.0)
+        # La cancelación libera un horario que no conocemos acá: invalidar todo.
+        _invalidate_capacity()
+        appointments.invalidate()
         print(f"External API responded: {resp.status_code}")
 
         if resp.status_code == 200:
@@ -1553,6 +2096,47 @@ async def cancel_appointment(data: utils.CancelJobAppointmentToolRequest, reques
     return await _run_idempotent(request, "cancelAppointment", args_obj, action)
 
 
+async def _job_headers() -> dict:
+    access_token = await get_access_token()
+    return {
+        "Authorization": access_token,
+        "ST-App-Key": APP_ID,
+        "Content-Type": "application/json",
+    }
+
+
+async def _load_job_summary(job_id):
+    """(summary actual, None) o (None, error) — callback de job_summary."""
+    print(f"Fetching current summary for job ID {job_id}...")
+    job_url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs/{job_id}"
+    job_resp = await st_gateway.get(job_url, route="jobs", headers=await _job_headers(), timeout=15.0)
+    if job_resp.status_code != 200:
+        return None, {
+            "error": f"Failed to fetch job data for job ID {job_id}",
+            "status_code": job_resp.status_code,
+            "details": job_resp.text
+        }
+    return job_resp.json().get("summary", ""), None
+
+
+async def _save_job_summary(job_id, summary):
+    """PATCH del summary completo; None si salió bien — callback de job_summary."""
+    print(f"Updating summary for job ID {job_id}...")
+    patch_url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs/{job_id}"
+    patch_resp = await st_gateway.patch(patch_url, route="job_update", headers=await _job_headers(),
+                                        json={"summary": summary}, timeout=15.0)
+    appointments.invalidate()  # el summary se muestra en findAppointments
+    if patch_resp.status_code == 200:
+        print("updateJobSummary completed ✅")
+        return None
+    print(f"Failed to update job summary: {patch_resp.text}")
+    return {
+        "error": "Failed to update job summary.",
+        "status_code": patch_resp.status_code,
+        "details": patch_resp.text
+    }
+
+
 @app.post("/updateJobSummary")
 async def update_job_summary(data: utils.UpdateJobSummaryToolRequest, request: Request):
     print("Processing updateJobSummary request... 🔄")
@@ -1563,6 +2147,7 @@ async def update_job_summary(data: utils.UpdateJobSummaryToolRequest, request: R
         args_obj = data.args
 
     data = args_obj
+    call_id = await _resolve_call_id(request, args_obj)
 
     async def action():
         job_id = data.jobId
@@ -1571,49 +2156,12 @@ async def update_job_summary(data: utils.UpdateJobSummaryToolRequest, request: R
         if not job_id or not info:
             return {"error": "Missing required fields: jobId and info"}
 
-        access_token = await get_access_token()
-        headers = {
-            "Authorization": access_token,
-            "ST-App-Key": APP_ID,
-            "Content-Type": "application/json",
-        }
-
-        print(f"Fetching current summary for job ID {job_id}...")
-
-        job_url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs/{job_id}"
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            job_resp = await client.get(job_url, headers=headers)
-
-        if job_resp.status_code != 200:
-            return {
-                "error": f"Failed to fetch job data for job ID {job_id}",
-                "status_code": job_resp.status_code,
-                "details": job_resp.text
-            }
-
-        job_data = job_resp.json()
-        current_summary = job_data.get("summary", "")
-
         new_summary = f"<p>{escape(info or '')}</p>"
-        updated_summary = f"{current_summary}\n\n{new_summary}".strip() if current_summary else new_summary
-
-        print(f"Updating summary for job ID {job_id}...")
-        patch_url = f"https://api.servicetitan.io/jpm/v2/tenant/{TENANT_ID}/jobs/{job_id}"
-        patch_payload = {"summary": updated_summary}
-
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            patch_resp = await client.patch(patch_url, headers=headers, json=patch_payload)
-
-        if patch_resp.status_code == 200:
-            print("updateJobSummary completed ✅")
-            return {"status": "Job summary updated"}
-        else:
-            print(f"Failed to update job summary: {patch_resp.text}")
-            return {
-                "error": "Failed to update job summary.",
-                "status_code": patch_resp.status_code,
-                "details": patch_resp.text
-            }
+        if call_id:
+            # Para flushear en clearCallData (fin de la llamada) sin esperar el debounce.
+            session = call_sessions.setdefault(call_id, {"_ts": time.time()})
+            session.setdefault("_summaryJobs", set()).add(int(job_id))
+        return await job_summary.append(job_id, new_summary, _load_job_summary, _save_job_summary)
 
     return await _run_idempotent(request, "updateJobSummary", args_obj, action)
 
@@ -1705,7 +2253,7 @@ async def store_call_data(data: utils.StoreCallDataToolRequest, request: Request
     return {"status": "stored", "field": args_obj.field, "value": clean_value}
 
 
-@app.post("/getCallData")
+@app.post("/getCallData", dependencies=[Depends(_prefetch_on_first_tool_call)])
 async def get_call_data(data: utils.GetCallDataToolRequest, request: Request):
     print("Processing getCallData request... 🔄")
 
@@ -1773,7 +2321,10 @@ async def clear_call_data(data: utils.ClearCallDataToolRequest, request: Request
 
     call_id = await _resolve_call_id(request, args_obj)
     if call_id and call_id in call_sessions:
-        del call_sessions[call_id]
+        session = call_sessions.pop(call_id)
+        summary_jobs = session.get("_summaryJobs")
+        if summary_jobs:
+            _spawn_background(job_summary.flush_jobs(summary_jobs, _load_job_summary, _save_job_summary))
         print(f"[clearCallData] callId={call_id} cleared ✅")
         return {"status": "cleared"}
 
@@ -1821,6 +2372,18 @@ async def suggest_zip(data: utils.SuggestZipToolRequest):
         return {"status": "unknown", "message": "Ask the caller for their zip code."}
 
     zips = config.CITY_ZIPS.get(f"{city}|{state}")
+    if not zips and not gazetteer.has_town(city, state):
+        # Variante dictada de una ciudad de la tabla ("marlboro" → marlborough).
+        match = city_match.match_city_zip(city, state)
+        if match is not None:
+            print(f"[suggestZip] '{city}' → {match['key']} ({match['method']}, score {match['score']})")
+            zips = config.CITY_ZIPS[match["key"]]
+    if not zips:
+        # Pueblos fuera de la tabla: sus ZIPs de entrega en el área según el
+        # gazetteer, solo si son pocos (las ciudades multi-zip se preguntan).
+        zips = list(gazetteer.town_zips(city, state))
+        if len(zips) > 2:
+            zips = []
     if not zips:
         print(f"[suggestZip] Sin datos para {city}|{state} → unknown")
         return {"status": "unknown", "message": "No zip data for this city. Ask the caller for their zip code."}
@@ -1837,6 +2400,31 @@ async def suggest_zip(data: utils.SuggestZipToolRequest):
                        "If neither matches, ask the caller directly for their zip code instead."}
 
 
+@app.post("/prescreenOutbound")
+async def prescreen_outbound(data: utils.PrescreenRequest,
+                             x_prescreen_token: str = Header(default="")):
+    """Screening en bloque de una lista de campaña (área, teléfono, cliente
+    existente y disponibilidad outbound del día). Ver prescreen.py.
+    Requiere el secreto compartido PRESCREEN_TOKEN en X-Prescreen-Token."""
+    if not config.PRESCREEN_TOKEN or not hmac.compare_digest(x_prescreen_token, config.PRESCREEN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    print(f"Processing prescreenOutbound request ({len(data.contacts)} contactos)... 🔄")
+
+    if len(data.contacts) > config.PRESCREEN_MAX_CONTACTS:
+        return {"error": f"Too many contacts ({len(data.contacts)}); the limit is {config.PRESCREEN_MAX_CONTACTS} per request."}
+
+    async def fetch_slots():
+        now = datetime.now(EASTERN_TIME).strftime("%Y-%m-%dT%H:%M:%S")
+        return await check_availability_time(now, [config.OUTBOUND_BUSINESS_UNIT_ID], config.OUTBOUND_JOB_TYPE_ID)
+
+    contacts = [_model_to_dict(contact) for contact in data.contacts]
+    return await prescreen.screen(
+        contacts,
+        find_customers=_find_customers_by_phone_bulk if data.matchCustomers else None,
+        fetch_slots=fetch_slots if data.includeAvailability else None,
+    )
+
+
 def _send_gmail(subject: str, body: str, html_body: str = None):
     if not GMAIL_USER or not GMAIL_APP_PASSWORD:
         print("❌ Gmail credentials not configured (GMAIL_USER / GMAIL_APP_PASSWORD missing)")
@@ -1849,7 +2437,7 @@ def _send_gmail(subject: str, body: str, html_body: str = None):
         msg.attach(MIMEText(body, "plain"))
         if html_body:
             msg.attach(MIMEText(html_body, "html"))
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
+        with smtplib.SMTP("smtp.gmail.com", 587, timeout=deadline.timeout(config.SMTP_TIMEOUT)) as server:
             server.starttls()
             server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
             server.send_message(msg)
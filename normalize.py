@@ -13,6 +13,9 @@ Nunca deben romper un valor que ya estaba bien (producción depende de eso).
 """
 
 import re
+from functools import lru_cache
+
+import config
 
 # Palabras que representan dígitos al dictar números (contexto teléfono/zip).
 _DIGIT_WORDS = {
@@ -45,25 +48,112 @@ _EMAIL_DIGIT_WORDS = {
     "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
 }
 
+# Una sola tabla por contexto: token → texto a emitir (str) o multiplicador (int).
+_SPOKEN_TOKENS = {**_DIGIT_WORDS, **_MULTIPLIERS}
+_EMAIL_TOKENS = {**_EMAIL_SYMBOLS, **_EMAIL_DIGIT_WORDS}
 
-def _spoken_to_digits(text: str) -> str:
-    """'six oh three, double five' → '60355'. Ignora tokens que no son dígitos."""
-    tokens = re.split(r"[\s,\-\.]+", text.lower())
-    out = []
+# Tokenizer de números dictados: una coma, o una corrida entre separadores
+# (espacios, "-", "."). Los paréntesis y el "+" quedan dentro del token.
+_NUMBER_TOKEN = re.compile(r",|[^\s,\-\.]+")
+_EMAIL_TOKEN = re.compile(r"\S+")
+_EMAIL_VALID = re.compile(r"[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}")
+_NON_DIGIT = re.compile(r"\D")
+
+
+def _scan_number(text: str) -> tuple:
+    """Una sola pasada sobre un teléfono / zip, clasificando cada token.
+
+    Devuelve (formateado, dígitos, hablado):
+    - formateado: el valor sin ()/espacios/guiones/puntos si eso deja un
+      número ("+1 (603) 555-1234" → "+16035551234"); None si no.
+    - dígitos: todos los dígitos literales del texto, en orden.
+    - hablado: la lectura de las palabras ('six oh three, double five' →
+      '60355'); los tokens que no son dígitos ("my", "number") se ignoran.
+    """
+    formatted, digits, spoken = [], [], []
+    is_number = True        # todo lo visto hasta ahora cabe en "+?dígitos"
+    started = has_digit = False
     repeat = 1
-    for tok in tokens:
-        if not tok:
+    for tok in _NUMBER_TOKEN.findall(text):
+        if tok == ",":
+            is_number = False
             continue
-        if tok in _MULTIPLIERS:
-            repeat = _MULTIPLIERS[tok]
+
+        if tok.isdecimal():             # caso común: "603", "01835"
+            formatted.append(tok)
+            digits.append(tok)
+            spoken.append(tok * repeat if repeat > 1 and len(tok) == 1 else tok)
+            started = has_digit = True
+            repeat = 1
+            continue
+
+        if is_number:
+            bare = tok.replace("(", "").replace(")", "")
+            body = bare[1:] if not started and bare[:1] == "+" else bare
+            if body and not body.isdecimal():
+                is_number = False
+            else:
+                formatted.append(bare)
+                started = started or bool(bare)
+                has_digit = has_digit or bool(body)
+        if not tok.isalpha():
+            digits.append(_NON_DIGIT.sub("", tok))
+
+        word = tok.lower()
+        value = _SPOKEN_TOKENS.get(word)
+        if isinstance(value, int):
+            repeat = value
             continue
-        if tok in _DIGIT_WORDS:
-            out.append(_DIGIT_WORDS[tok] * repeat)
-        elif tok.isdigit():
-            out.append(tok * repeat if repeat > 1 and len(tok) == 1 else tok)
-        # cualquier otro token ("my", "number", "is") se ignora
+        if value is not None:
+            spoken.append(value * repeat)
+        elif word.isdigit():
+            spoken.append(word * repeat if repeat > 1 and len(word) == 1 else word)
         repeat = 1
-    return "".join(out)
+
+    return ("".join(formatted) if is_number and has_digit else None), "".join(digits), "".join(spoken)
+
+
+def _spoken_to_digits(text: str) -> str:
+    """'six oh three, double five' → '60355'. Ignora tokens que no son dígitos."""
+    return _scan_number(text)[2]
+
+
+# Los mismos valores se re-normalizan muchas veces por llamada (storeCallData,
+# updateCallField, createCustomer...): memo LRU por valor crudo. Las funciones
+# son puras sobre str, así que el memo no cambia ningún resultado.
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def _phone(s: str) -> str:
+    formatted, _, spoken = _scan_number(s)
+    # Ya es un número (con o sin +): devolver sin tocar el contenido.
+    if formatted is not None:
+        return formatted
+    return spoken if spoken else s
+
+
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def _email(s: str) -> str:
+    if " " not in s and "@" in s:
+        return s.lower()
+
+    parts = []
+    for tok in _EMAIL_TOKEN.findall(s.lower()):
+        tok = tok.strip(",;:")
+        if tok:
+            parts.append(_EMAIL_TOKENS.get(tok, tok))
+    candidate = "".join(parts)
+    # Solo aceptar el rearmado si parece un email real; si no, devolver original.
+    if _EMAIL_VALID.fullmatch(candidate):
+        return candidate
+    return s
+
+
+@lru_cache(maxsize=config.NORMALIZE_CACHE_SIZE)
+def _zip(s: str) -> str:
+    _, digits, spoken = _scan_number(s)
+    digits = digits or spoken
+    if len(digits) >= 5:
+        return digits[:5]
+    return digits if digits else s
 
 
 def normalize_phone(raw) -> str:
@@ -74,13 +164,7 @@ def normalize_phone(raw) -> str:
     """
     if not isinstance(raw, str) or not raw.strip():
         return raw
-    s = raw.strip()
-    stripped = re.sub(r"[()\s\-\.]", "", s)
-    # Ya es un número (con o sin +): devolver sin tocar el contenido.
-    if re.fullmatch(r"\+?\d+", stripped):
-        return stripped
-    digits = _spoken_to_digits(s)
-    return digits if digits else s
+    return _phone(raw.strip())
 
 
 def normalize_email(raw) -> str:
@@ -91,27 +175,7 @@ def normalize_email(raw) -> str:
     """
     if not isinstance(raw, str) or not raw.strip():
         return raw
-    s = raw.strip()
-    if " " not in s and "@" in s:
-        return s.lower()
-
-    tokens = re.split(r"\s+", s.lower())
-    parts = []
-    for tok in tokens:
-        tok = tok.strip(",;:")
-        if not tok:
-            continue
-        if tok in _EMAIL_SYMBOLS:
-            parts.append(_EMAIL_SYMBOLS[tok])
-        elif tok in _EMAIL_DIGIT_WORDS:
-            parts.append(_EMAIL_DIGIT_WORDS[tok])
-        else:
-            parts.append(tok)
-    candidate = "".join(parts)
-    # Solo aceptar el rearmado si parece un email real; si no, devolver original.
-    if re.fullmatch(r"[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}", candidate):
-        return candidate
-    return s
+    return _email(raw.strip())
 
 
 def normalize_zip(raw) -> str:
@@ -121,13 +185,22 @@ def normalize_zip(raw) -> str:
     """
     if not isinstance(raw, str) or not raw.strip():
         return raw
-    s = raw.strip()
-    digits = re.sub(r"\D", "", s)
-    if not digits:
-        digits = _spoken_to_digits(s)
-    if len(digits) >= 5:
-        return digits[:5]
-    return digits if digits else s
+    return _zip(raw.strip())
+
+
+def phone_key(phone) -> str:
+    """Solo los dígitos, sin el +1: "+1 (603) 555-1234" y "6035551234" dan la
+    misma clave. Un número usable tiene exactamente 10."""
+    digits = _NON_DIGIT.sub("", str(phone or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits
+
+
+def cache_stats() -> dict:
+    """Hits / misses del memo por campo (para /cacheStats)."""
+    return {name: fn.cache_info()._asdict() for name, fn in
+            (("phone", _phone), ("email", _email), ("zip", _zip))}
 
 
 def has_full_name(raw) -> bool:
@@ -144,10 +217,12 @@ def normalize_call_field(field: str, value):
     """Normalización por campo para el call-session store."""
     if not isinstance(value, str):
         return value
-    if field == "customerPhone":
-        return normalize_phone(value)
-    if field == "email":
-        return normalize_email(value)
-    if field == "zip":
-        return normalize_zip(value)
-    return value.strip()
+    normalizer = _FIELD_NORMALIZERS.get(field)
+    return normalizer(value) if normalizer is not None else value.strip()
+
+
+_FIELD_NORMALIZERS = {
+    "customerPhone": normalize_phone,
+    "email": normalize_email,
+    "zip": normalize_zip,
+}
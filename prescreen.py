@@ -0,0 +1,214 @@
+"""
+prescreen.py — Pre-screening en bloque de listas de campañas outbound.
+
+El flujo outbound (/checkAvailabilityOutbound, OUTBOUND_JOB_TYPE_ID) llama a
+los contactos de una campaña de a uno, y recién en la llamada nos enteramos de
+que el contacto está fuera del área o de que no hay capacidad: minutos pagos
+en contactos que no podemos atender. Esto los revisa antes, en bloque:
+
+- Área: cada contacto se ubica por lat/lon (si la lista las trae) o por el
+  centroide de su ZIP / pueblo (gazetteer.py), y la distancia al centro
+  (SALEM_PO_BOX) se calcula vectorizada con NumPy para toda la lista. NumPy es
+  opcional: sin él se usa el mismo haversine en Python puro.
+- Teléfono normalizado a 10 dígitos y marcado inválido si no da.
+- Cliente existente en ServiceTitan por teléfono (main._find_customers_by_phone_bulk:
+  ruta "customers_bulk" del gateway, aparte de la de llamadas en vivo y sin
+  su cache), con concurrencia acotada y sin repetir teléfonos; los contactos
+  fuera del área no se consultan.
+- Disponibilidad del job type outbound: una sola vez por día (cacheada) y
+  adjunta al resultado, no por contacto.
+
+El módulo no importa main: el endpoint /prescreenOutbound y el CLI le pasan las
+funciones de ST.
+
+CLI:
+    python -m prescreen contactos.csv > screened.csv
+    (columnas: phone, street, city, state, zip, lat, lon; todas opcionales salvo phone)
+"""
+
+import asyncio
+import csv
+import logging
+import math
+import sys
+from datetime import datetime
+
+import pytz
+
+import config
+import gazetteer
+import normalize
+
+try:
+    import numpy as np
+except ImportError:  # opcional: el cálculo por contacto da lo mismo, más lento
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EASTERN_TIME = pytz.timezone("America/New_York")
+
+# fecha (America/New_York) -> primeros slots outbound del día
+_daily_availability: dict = {}
+
+
+def _phone(raw) -> "str | None":
+    """Clave de 10 dígitos de normalize.phone_key (también para números
+    dictados), o None si el número no da para discarlo."""
+    key = normalize.phone_key(normalize.normalize_phone(raw))
+    return key if len(key) == 10 else None
+
+
+def distances_miles(lats, lons, center: tuple) -> list:
+    """Haversine de cada (lat, lon) al centro, en millas."""
+    if not lats:
+        return []
+    if np is None:
+        return [gazetteer.haversine_miles(center[0], center[1], lat, lon) for lat, lon in zip(lats, lons)]
+    lat1, lon1 = math.radians(center[0]), math.radians(center[1])
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return (config.EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).tolist()
+
+
+def _coordinates(contact: dict):
+    """(lat, lon, fuente) del contacto, o None si no hay con qué ubicarlo."""
+    try:
+        lat, lon = float(contact["lat"]), float(contact["lon"])
+        if math.isfinite(lat) and math.isfinite(lon):
+            return lat, lon, "coordinates"
+    except (KeyError, TypeError, ValueError):
+        pass
+    place = gazetteer.locate(contact.get("zip"), contact.get("city"), contact.get("state"))
+    if place is None:
+        return None
+    return place["lat"], place["lon"], place["place"]
+
+
+def screen_area(contacts: list) -> list:
+    """[{"area", "miles", "place"}] por contacto, en el mismo orden.
+    area: "in" / "boundary" (a GAZETTEER_REFINE_MARGIN del radio: verificar la
+    dirección en la llamada) / "out" / "unknown" (sin dirección ubicable)."""
+    located = [_coordinates(contact) for contact in contacts]
+    found = [i for i, coords in enumerate(located) if coords is not None]
+    miles = distances_miles([located[i][0] for i in found], [located[i][1] for i in found], config.SALEM_PO_BOX)
+
+    radius, margin = config.SERVICE_RADIUS_MILES, config.GAZETTEER_REFINE_MARGIN
+    results = [{"area": "unknown", "miles": None, "place": None} for _ in contacts]
+    for i, distance in zip(found, miles):
+        if abs(distance - radius) <= margin:
+            area = "boundary"
+        else:
+            area = "in" if distance <= radius else "out"
+        results[i] = {"area": area, "miles": round(distance, 2), "place": located[i][2]}
+    return results
+
+
+async def _match_customers(phones, find_customers) -> dict:
+    """phone -> [customerId, ...] (None si ST no contestó para ese teléfono)."""
+    semaphore = asyncio.Semaphore(max(1, config.PRESCREEN_CONCURRENCY))
+
+    async def one(phone):
+        async with semaphore:
+            try:
+                status, customers = await find_customers(phone)
+            except Exception as e:
+                logger.warning(f"[prescreen] Búsqueda de cliente {phone} falló: {e}")
+                return phone, None
+        if status != 200:
+            return phone, None
+        return phone, [c.get("id") for c in customers or [] if c.get("id")]
+
+    return dict(await asyncio.gather(*[one(phone) for phone in phones]))
+
+
+async def daily_availability(fetch_slots) -> dict:
+    """Primeros slots del job type outbound, pedidos una vez por día.
+    fetch_slots() -> list (puede ser []) o None si ST no respondió (no se cachea)."""
+    today = datetime.now(EASTERN_TIME).date().isoformat()
+    cached = _daily_availability.get(today)
+    if cached is not None:
+        return cached
+    slots = await fetch_slots()
+    if slots is None:
+        return {"date": today, "slots": None, "error": "Availability could not be checked right now."}
+    result = {"date": today, "slots": slots[:max(0, config.PRESCREEN_AVAILABILITY_SLOTS)]}
+    _daily_availability.clear()
+    _daily_availability[today] = result
+    return result
+
+
+async def screen(contacts: list, *, find_customers=None, fetch_slots=None) -> dict:
+    """Screening de toda la lista. `find_customers(phone) -> (status, [clientes])`
+    y `fetch_slots() -> list | None` son opcionales (sin ellos no se consulta ST)."""
+    areas = screen_area(contacts)
+    phones = [_phone(contact.get("phone")) for contact in contacts]
+
+    lookup = sorted({phone for phone, area in zip(phones, areas) if phone and area["area"] != "out"})
+    matches = await _match_customers(lookup, find_customers) if find_customers and lookup else {}
+
+    results = []
+    for i, (phone, area) in enumerate(zip(phones, areas)):
+        results.append({
+            "index": i,
+            "phone": phone,
+            "phoneValid": phone is not None,
+            **area,
+            "customerIds": matches.get(phone),
+            # Se disca salvo que sepamos que no sirve (fuera del área o sin número).
+            "dial": phone is not None and area["area"] != "out",
+        })
+
+    summary = {
+        "total": len(results),
+        "dial": sum(r["dial"] for r in results),
+        "outOfArea": sum(r["area"] == "out" for r in results),
+        "boundary": sum(r["area"] == "boundary" for r in results),
+        "unknownArea": sum(r["area"] == "unknown" for r in results),
+        "invalidPhone": sum(not r["phoneValid"] for r in results),
+        "existingCustomers": sum(bool(r["customerIds"]) for r in results),
+    }
+    availability = await daily_availability(fetch_slots) if fetch_slots else None
+    logger.info(f"[prescreen] {summary}")
+    return {"summary": summary, "availability": availability, "contacts": results}
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+_CSV_COLUMNS = ["phone", "area", "miles", "place", "customerIds", "dial"]
+
+
+async def _cli(path: str, out=sys.stdout):
+    import main  # solo el CLI: credenciales de ST y el cache de clientes
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        contacts = [{k.strip().lower(): (v or "").strip() for k, v in row.items() if k} for row in csv.DictReader(f)]
+
+    async def fetch_slots():
+        now = datetime.now(EASTERN_TIME).strftime("%Y-%m-%dT%H:%M:%S")
+        return await main.check_availability_time(now, [config.OUTBOUND_BUSINESS_UNIT_ID], config.OUTBOUND_JOB_TYPE_ID)
+
+    credentials = main._has_st_credentials()
+    try:
+        result = await screen(contacts,
+                              find_customers=main._find_customers_by_phone_bulk if credentials else None,
+                              fetch_slots=fetch_slots if credentials else None)
+    finally:
+        await main.st_client.shutdown()
+
+    writer = csv.DictWriter(out, fieldnames=["name"] + _CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for contact, row in zip(contacts, result["contacts"]):
+        writer.writerow({**row, "name": contact.get("name", ""),
+                         "customerIds": " ".join(str(c) for c in row["customerIds"] or [])})
+    print(f"{result['summary']} availability={result['availability']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python -m prescreen contactos.csv > screened.csv", file=sys.stderr)
+        sys.exit(2)
+    asyncio.run(_cli(sys.argv[1]))
@@ -0,0 +1,76 @@
+"""
+Benchmark de normalize.py sobre el corpus de valores dictados.
+
+    python -m scripts.bench_normalize                 # µs por valor: anterior / en frío / memo
+    python -m scripts.bench_normalize --max-us 20     # exit 1 si el costo en frío supera el límite
+
+Fuera de la suite a propósito: los tiempos dependen de la máquina. El corpus
+y la implementación anterior (REFERENCE) son los de tests/test_normalize.py,
+que cubre la equivalencia.
+
+"en frío" vacía el memo LRU antes de cada pasada: es el costo de un valor
+nuevo. "memo" es el de un valor repetido en la misma llamada.
+"""
+
+import argparse
+import sys
+import time
+
+import normalize
+from tests.test_normalize import CORPUS, REFERENCE
+
+_FIELDS = {"customerPhone": "phone", "email": "email", "zip": "zip"}
+
+
+def _per_value_us(fn, values, rounds, before_round=None) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        started = time.perf_counter()
+        for value in values:
+            fn(value)
+        best = min(best, time.perf_counter() - started)
+    return best / len(values) * 1e6
+
+
+def _clear_memo():
+    for fn in (normalize._phone, normalize._email, normalize._zip):
+        fn.cache_clear()
+
+
+def run(rounds: int = 200) -> dict:
+    results = {}
+    for field, name in _FIELDS.items():
+        values = [case["input"] for case in CORPUS if case["field"] == field]
+        engine, reference = REFERENCE[name]
+        results[field] = {
+            "values": len(values),
+            "reference_us": _per_value_us(reference, values, rounds),
+            "cold_us": _per_value_us(engine, values, rounds, before_round=_clear_memo),
+            "memo_us": _per_value_us(engine, values, rounds),
+        }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--max-us", type=float, default=None, help="límite de µs por valor en frío")
+    args = parser.parse_args(argv)
+
+    results = run(args.rounds)
+    print(f"{'campo':<14}{'valores':>8}{'anterior':>11}{'en frío':>11}{'memo':>9}   (µs por valor)")
+    for field, r in results.items():
+        print(f"{field:<14}{r['values']:>8}{r['reference_us']:>11.2f}{r['cold_us']:>11.2f}{r['memo_us']:>9.2f}")
+
+    if args.max_us is not None:
+        slow = [field for field, r in results.items() if r["cold_us"] > args.max_us]
+        if slow:
+            print(f"❌ Regresión: {slow} superan {args.max_us} µs por valor", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
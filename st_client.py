@@ -0,0 +1,74 @@
+"""
+st_client.py — Cliente HTTP compartido para todo el tráfico a ServiceTitan.
+
+Antes cada tool call abría su propio httpx.AsyncClient y pagaba un handshake
+TCP+TLS nuevo (100–300 ms en producción) que el caller escuchaba como silencio.
+Ahora hay UN cliente por proceso, con keep-alive y HTTP/2, creado y cerrado en
+el lifespan de FastAPI (ver main.lifespan).
+
+Uso:
+    import st_client
+    client = st_client.get_client()
+    resp = await client.get(url, headers=headers, timeout=15.0)
+
+No usar `async with` sobre el cliente devuelto: lo cerraría para todos.
+"""
+
+import importlib.util
+import logging
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_client: "httpx.AsyncClient | None" = None
+
+
+def _http2_available() -> bool:
+    """httpx necesita el paquete h2 para HTTP/2. Si falta (venv viejo), se cae a
+    HTTP/1.1 con keep-alive en vez de romper el arranque."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.ST_MAX_CONNECTIONS,
+        max_keepalive_connections=config.ST_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.ST_KEEPALIVE_EXPIRY,
+    )
+    http2 = config.ST_HTTP2 and _http2_available()
+    if config.ST_HTTP2 and not http2:
+        logger.warning("[st_client] h2 no instalado, usando HTTP/1.1 con keep-alive")
+    return httpx.AsyncClient(
+        timeout=config.ST_DEFAULT_TIMEOUT,
+        limits=limits,
+        http2=http2,
+    )
+
+
+async def startup():
+    """Crea el cliente compartido. Llamado desde el lifespan de la app."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+        logger.info(f"[st_client] Pool listo (max={config.ST_MAX_CONNECTIONS}, "
+                    f"keepalive={config.ST_MAX_KEEPALIVE_CONNECTIONS})")
+
+
+async def shutdown():
+    """Cierra el pool (conexiones keep-alive abiertas) al apagar la app."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """Devuelve el cliente compartido. Fuera del lifespan (scripts como
+    `python -m dashboard_sync.reconcile`) se crea a demanda la primera vez."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
@@ -0,0 +1,504 @@
+"""
+st_gateway.py — Punto único de salida hacia ServiceTitan.
+
+Todo el tráfico a ST pasa por acá (sobre el pool compartido de st_client) para
+que las fallas se manejen igual en todos los endpoints:
+
+- Reintentos por ruta con backoff exponencial + jitter, limitados por un
+  presupuesto de reintentos (token bucket) para no multiplicar la carga cuando
+  ST ya está degradado.
+- 429: se respeta Retry-After. Mientras dure la ventana, los requests nuevos a
+  esa ruta esperan (si es corta) o fallan rápido (si es larga).
+- Circuit breaker por ruta: tras N fallas seguidas se abre y falla rápido,
+  devolviendo la última respuesta buena de ese GET si existe (respuesta
+  degradada) o CircuitOpenError.
+- Hedging opcional (ST_HEDGE_ENABLED) para lecturas de rutas marcadas: si el
+  request pasa el p95 aprendido de la ruta se manda uno igual, gana el primero
+  que contesta y el otro se cancela. Un presupuesto global (token bucket) acota
+  los hedges para no amplificar una caída de ST.
+- Deadline del tool call (deadline.py): cada intento usa como timeout lo que
+  queda del presupuesto, no se reintenta ni se espera un Retry-After que no
+  entra, y al agotarse se corta con DeadlineExceeded (no cuenta como falla de
+  ST para el breaker).
+
+CircuitOpenError hereda de httpx.RequestError a propósito: los endpoints que ya
+manejaban errores de red ("ST no disponible") lo cubren sin cambios, en vez de
+apilar timeouts de 8–15 s mientras ST está caído.
+
+Uso:
+    resp = await st_gateway.get(url, route="customers", headers=headers, timeout=15.0)
+    resp = await st_gateway.post(url, route="job_create", headers=headers, json=payload)
+    items = await st_gateway.list_all(url, route="jobs", headers=headers, params={...})
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+import config
+import deadline
+import st_client
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(httpx.RequestError):
+    """ServiceTitan marcado como caído para esta ruta: se falla rápido."""
+
+
+class RoutePolicy:
+    """Cómo tratar las fallas de una ruta.
+
+    idempotent: se puede reintentar ante timeouts de lectura y 5xx sin riesgo
+    de duplicar un side effect. Las escrituras solo se reintentan cuando ST no
+    llegó a procesar el request (error de conexión o 429).
+    hedge: lectura sensible a latencia (el caller espera en línea); con
+    ST_HEDGE_ENABLED se le puede mandar un segundo request si el primero tarda.
+    max_concurrency: tope de requests en vuelo para la ruta (0 = sin tope).
+    """
+
+    def __init__(self, max_attempts: int, idempotent: bool, serve_stale: bool = False,
+                 hedge: bool = False, max_concurrency: int = 0):
+        self.max_attempts = max_attempts
+        self.idempotent = idempotent
+        self.serve_stale = serve_stale
+        self.hedge = hedge and idempotent
+        self.max_concurrency = max_concurrency
+
+
+_READ = RoutePolicy(max_attempts=3, idempotent=True, serve_stale=True)
+_HEDGED_READ = RoutePolicy(max_attempts=3, idempotent=True, serve_stale=True, hedge=True)
+_WRITE = RoutePolicy(max_attempts=2, idempotent=False)
+
+ROUTE_POLICIES: dict = {
+    "auth":         RoutePolicy(max_attempts=2, idempotent=True),
+    "job_types":    _READ,
+    # capacity es un POST pero de solo lectura. Pocos intentos: el caller está
+    # esperando en línea y check_availability_time ya cubre varias ventanas.
+    "capacity":     RoutePolicy(max_attempts=2, idempotent=True, serve_stale=True, hedge=True),
+    "customers":    _HEDGED_READ,
+    # Búsquedas en bloque (prescreen de campañas outbound): ruta aparte para que
+    # su breaker, su presupuesto de reintentos y sus 429 no degraden las
+    # llamadas en vivo, y con un tope de concurrencia propio.
+    "customers_bulk": RoutePolicy(max_attempts=2, idempotent=True,
+                                  max_concurrency=config.ST_BULK_CONCURRENCY),
+    "locations":    _HEDGED_READ,
+    "jobs":         _HEDGED_READ,
+    "appointments": _READ,
+    "technicians":  _READ,
+    "customer_create": _WRITE,
+    "location_create": _WRITE,
+    "contacts":     _WRITE,
+    "contacts_read": _READ,
+    "job_create":   _WRITE,
+    "job_cancel":   _WRITE,
+    "job_update":   _WRITE,
+    "reschedule":   _WRITE,
+    "assignments":  _WRITE,
+}
+_DEFAULT_POLICY = _WRITE
+
+_RETRYABLE_STATUS = {500, 502, 503, 504}
+
+
+# =============================================================================
+# RETRY BUDGET
+# =============================================================================
+
+class RetryBudget:
+    """Token bucket: cada request deposita `ratio` tokens y cada reintento
+    consume uno. Con ST sano sobran tokens; con ST degradado se agotan y los
+    reintentos se cortan solos (máx ~ratio reintentos por request)."""
+
+    def __init__(self, ratio: float, initial: float, cap: float):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = initial
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+class CircuitBreaker:
+    """closed → (N fallas seguidas) → open → (cooldown) → half_open (un solo
+    request de prueba) → closed si sale bien / open si falla."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "closed"
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probe_started = 0.0
+        # Un probe que nunca volvió (cancelado) no bloquea el half_open para siempre.
+        if self.state == "half_open" and now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"[st_gateway] Circuito abierto tras {self.failures} falla(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+# =============================================================================
+# LATENCIA (para el umbral de hedging)
+# =============================================================================
+
+class LatencyTracker:
+    """Últimas N latencias de una ruta; el p95 sale de esa ventana."""
+
+    def __init__(self, window: int):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> "float | None":
+        """None hasta juntar ST_HEDGE_MIN_SAMPLES: sin datos no se hedgea."""
+        if len(self.samples) < max(1, config.ST_HEDGE_MIN_SAMPLES):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# =============================================================================
+# ESTADO POR RUTA
+# =============================================================================
+
+_breakers: dict = {}
+_budgets: dict = {}
+_latencies: dict = {}
+# Global (no por ruta): el tope es sobre la carga extra total que mandamos a ST.
+_hedge_budget: "RetryBudget | None" = None
+hedge_stats = {"sent": 0, "won": 0, "throttled": 0}
+_throttled_until: dict = {}   # route -> monotonic hasta donde ST pidió esperar (429)
+_semaphores: dict = {}        # route -> (event loop, Semaphore) de las rutas con max_concurrency
+_stale: "OrderedDict[tuple, httpx.Response]" = OrderedDict()
+
+
+def _breaker(route: str) -> CircuitBreaker:
+    if route not in _breakers:
+        _breakers[route] = CircuitBreaker(config.ST_BREAKER_FAILURES, config.ST_BREAKER_RESET)
+    return _breakers[route]
+
+
+def _budget(route: str) -> RetryBudget:
+    if route not in _budgets:
+        _budgets[route] = RetryBudget(
+            ratio=config.ST_RETRY_BUDGET_RATIO,
+            initial=config.ST_RETRY_BUDGET_MIN,
+            cap=config.ST_RETRY_BUDGET_MIN * 2,
+        )
+    return _budgets[route]
+
+
+def _latency(route: str) -> LatencyTracker:
+    if route not in _latencies:
+        _latencies[route] = LatencyTracker(config.ST_HEDGE_WINDOW)
+    return _latencies[route]
+
+
+def _semaphore(route: str, policy: RoutePolicy) -> "asyncio.Semaphore | None":
+    if policy.max_concurrency <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    current = _semaphores.get(route)
+    if current is None or current[0] is not loop:
+        current = _semaphores[route] = (loop, asyncio.Semaphore(policy.max_concurrency))
+    return current[1]
+
+
+def _hedges() -> RetryBudget:
+    global _hedge_budget
+    if _hedge_budget is None:
+        _hedge_budget = RetryBudget(
+            ratio=config.ST_HEDGE_BUDGET_RATIO,
+            initial=config.ST_HEDGE_BUDGET_BURST,
+            cap=config.ST_HEDGE_BUDGET_BURST,
+        )
+    return _hedge_budget
+
+
+def reset():
+    """Vuelve todo el estado a cero (tests / diagnóstico)."""
+    global _hedge_budget
+    _breakers.clear()
+    _budgets.clear()
+    _latencies.clear()
+    _hedge_budget = None
+    for k in hedge_stats:
+        hedge_stats[k] = 0
+    _throttled_until.clear()
+    _semaphores.clear()
+    _stale.clear()
+
+
+def _stale_key(method: str, url: str, params, json) -> tuple:
+    return (method, url, repr(params), repr(json))
+
+
+def _remember(key: tuple, response: httpx.Response):
+    _stale[key] = response
+    _stale.move_to_end(key)
+    while len(_stale) > config.ST_STALE_MAX_ENTRIES:
+        _stale.popitem(last=False)
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    raw = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if not raw:
+        return config.ST_BACKOFF_BASE
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(raw).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return config.ST_BACKOFF_BASE
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: uniforme entre 0 y base·2^attempt (con tope)."""
+    return random.uniform(0, min(config.ST_BACKOFF_MAX, config.ST_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _check_deadline(route: str, error: Exception):
+    """Un timeout después de agotado el deadline es nuestro corte, no ST caído."""
+    if isinstance(error, httpx.TimeoutException) and deadline.expired():
+        raise deadline.DeadlineExceeded(f"ServiceTitan {route}: tool call deadline exceeded") from error
+
+
+def _fail_fast(route: str, key: tuple, policy: RoutePolicy, reason: str):
+    stale = _stale.get(key) if policy.serve_stale else None
+    if stale is not None:
+        logger.warning(f"[st_gateway] {route}: {reason}, sirviendo última respuesta buena")
+        return stale
+    raise CircuitOpenError(f"ServiceTitan {route} unavailable ({reason})")
+
+
+# =============================================================================
+# REQUEST
+# =============================================================================
+
+async def _timed(route: str, send):
+    started = time.monotonic()
+    response = await send()
+    _latency(route).record(time.monotonic() - started)
+    return response
+
+
+async def _send(client, method: str, url: str, kwargs: dict, route: str, hedge: bool) -> httpx.Response:
+    """Un intento contra ST. Con hedge, si no contestó dentro del p95 de la
+    ruta (y hay presupuesto) sale un segundo request idéntico; se devuelve la
+    primera respuesta y el otro se cancela. Si uno falla con error de red se
+    espera al otro."""
+    def send():
+        return client.request(method, url, **kwargs)
+
+    threshold = _latency(route).percentile(0.95) if hedge else None
+    if threshold is None:
+        return await _timed(route, send)
+
+    budget = _hedges()
+    budget.deposit()
+    primary = asyncio.ensure_future(_timed(route, send))
+    in_flight = {primary}
+    try:
+        done, _ = await asyncio.wait(in_flight, timeout=max(threshold, config.ST_HEDGE_MIN_DELAY))
+        if not done:
+            if budget.try_withdraw():
+                hedge_stats["sent"] += 1
+                logger.info(f"[st_gateway] {route}: sin respuesta en {threshold:.2f}s (p95), hedge")
+                in_flight.add(asyncio.ensure_future(_timed(route, send)))
+            else:
+                hedge_stats["throttled"] += 1
+        while True:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if winners:
+                if winners[0] is not primary:
+                    hedge_stats["won"] += 1
+                return winners[0].result()
+            if not in_flight:
+                # Fallaron todos: se propaga el error como sin hedging.
+                return done.pop().result()
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+async def request(method: str, url: str, *, route: str, headers=None, json=None,
+                  data=None, params=None, timeout=None) -> httpx.Response:
+    method = method.upper()
+    policy = ROUTE_POLICIES.get(route, _DEFAULT_POLICY)
+    semaphore = _semaphore(route, policy)
+    if semaphore is None:
+        return await _request(method, url, route, policy, headers, json, data, params, timeout)
+    async with semaphore:
+        return await _request(method, url, route, policy, headers, json, data, params, timeout)
+
+
+async def _request(method: str, url: str, route: str, policy: RoutePolicy, headers, json,
+                   data, params, timeout) -> httpx.Response:
+    breaker = _breaker(route)
+    budget = _budget(route)
+    key = _stale_key(method, url, params, json)
+
+    wait = _throttled_until.get(route, 0.0) - time.monotonic()
+    if wait > 0:
+        if wait > config.ST_RETRY_AFTER_MAX or not deadline.allows(wait):
+            return _fail_fast(route, key, policy, f"rate limited {wait:.1f}s")
+        await asyncio.sleep(wait)
+
+    if not breaker.allow():
+        return _fail_fast(route, key, policy, "circuit open")
+
+    budget.deposit()
+    # Con el circuito en prueba (half_open) o ST ya fallando no se hedgea.
+    hedge = config.ST_HEDGE_ENABLED and policy.hedge and breaker.state == "closed"
+    client = st_client.get_client()
+    kwargs = {"headers": headers, "json": json, "data": data, "params": params}
+    base_timeout = timeout if timeout is not None else config.ST_DEFAULT_TIMEOUT
+
+    attempt = 0
+    while True:
+        attempt += 1
+        last_attempt = attempt >= policy.max_attempts
+        delay = _backoff(attempt)
+        kwargs["timeout"] = deadline.timeout(base_timeout)
+        try:
+            response = await _send(client, method, url, kwargs, route, hedge)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            _check_deadline(route, e)
+            # ST nunca recibió el request: reintentar es seguro incluso en escrituras.
+            if last_attempt or not deadline.allows(delay) or not budget.try_withdraw():
+                breaker.record_failure()
+                raise
+            logger.warning(f"[st_gateway] {route}: {type(e).__name__}, reintento {attempt}")
+            await asyncio.sleep(delay)
+            continue
+        except httpx.RequestError as e:
+            _check_deadline(route, e)
+            if last_attempt or not policy.idempotent or not deadline.allows(delay) or not budget.try_withdraw():
+                breaker.record_failure()
+                raise
+            logger.warning(f"[st_gateway] {route}: {type(e).__name__}, reintento {attempt}")
+            await asyncio.sleep(delay)
+            continue
+
+        status = response.status_code
+        if status == 429:
+            delay = _retry_after_seconds(response)
+            _throttled_until[route] = time.monotonic() + delay
+            # Un 429 no es una caída de ST: no cuenta para el breaker.
+            if last_attempt or delay > config.ST_RETRY_AFTER_MAX or not deadline.allows(delay) \
+                    or not budget.try_withdraw():
+                logger.warning(f"[st_gateway] {route}: 429, Retry-After {delay:.1f}s, sin reintento")
+                return response
+            logger.warning(f"[st_gateway] {route}: 429, esperando {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if status in _RETRYABLE_STATUS:
+            if last_attempt or not policy.idempotent or not deadline.allows(delay) or not budget.try_withdraw():
+                breaker.record_failure()
+                return response
+            logger.warning(f"[st_gateway] {route}: {status}, reintento {attempt}")
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        if policy.serve_stale and status == 200:
+            _remember(key, response)
+        return response
+
+
+async def get(url: str, *, route: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, route=route, **kwargs)
+
+
+async def post(url: str, *, route: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, route=route, **kwargs)
+
+
+async def patch(url: str, *, route: str, **kwargs) -> httpx.Response:
+    return await request("PATCH", url, route=route, **kwargs)
+
+
+async def put(url: str, *, route: str, **kwargs) -> httpx.Response:
+    return await request("PUT", url, route=route, **kwargs)
+
+
+async def list_all(url: str, *, route: str, headers=None, params=None,
+                   semaphore: "asyncio.Semaphore | None" = None) -> "list | None":
+    """Todas las páginas de un listado de ST (page/pageSize/includeTotal).
+
+    La primera página trae totalCount y el resto se pide en paralelo;
+    `semaphore` (opcional) limita los requests en vuelo. Devuelve None si
+    alguna página no vino 200.
+    """
+    page_size = config.ST_PAGE_SIZE
+    params = params or {}
+
+    async def fetch_page(page):
+        page_params = {**params, "page": page, "pageSize": page_size, "includeTotal": "true"}
+        if semaphore is None:
+            resp = await get(url, route=route, headers=headers, params=page_params, timeout=15.0)
+        else:
+            async with semaphore:
+                resp = await get(url, route=route, headers=headers, params=page_params, timeout=15.0)
+        if resp.status_code != 200:
+            logger.warning(f"[st_gateway] {route}: página {page} respondió {resp.status_code}")
+            return None
+        return resp.json()
+
+    first = await fetch_page(1)
+    if first is None:
+        return None
+    bodies = [first]
+    total = first.get("totalCount")
+    if total is not None:
+        pages = -(-total // page_size)
+        bodies += await asyncio.gather(*[fetch_page(p) for p in range(2, pages + 1)])
+    else:
+        # Sin totalCount: seguir hasMore de a una página.
+        page = 1
+        while bodies[-1] is not None and bodies[-1].get("hasMore"):
+            page += 1
+            bodies.append(await fetch_page(page))
+    if any(body is None for body in bodies):
+        return None
+    return [item for body in bodies for item in body.get("data", [])]
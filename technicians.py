@@ -0,0 +1,59 @@
+"""
+technicians.py — Roster de técnicos de ServiceTitan en memoria.
+
+Antes cada consulta bajaba /settings/v2/technicians completo y filtraba en
+Python. Ahora el roster se baja recién la primera vez que alguien lo pide
+(todas las páginas), se indexa por businessUnitId y por id, y se reusa
+TECHNICIAN_ROSTER_MAX_AGE segundos. Las lecturas son O(1). No hay tarea de
+fondo: con tan pocos usos no vale la pena bajar el roster si nadie lo lee.
+
+Como availability_index, no importa main: main pasa la función que baja la
+lista cruda de técnicos (o None si ST falla).
+
+Uso:
+    r = await technicians.roster(fetch_all)   # baja el roster solo si no hay uno vigente
+    r.for_business_unit(5878155)
+    technicians.cached()                       # sin red; None si no hay roster
+"""
+
+import config
+import ttl_cache
+
+_KEY = "roster"
+_cache = ttl_cache.TTLCache("technician_roster", ttl=config.TECHNICIAN_ROSTER_MAX_AGE, max_entries=1)
+
+
+class Roster:
+    def __init__(self, technicians: list):
+        self.by_id: dict = {}
+        self.by_business_unit: dict = {}
+        for tech in technicians:
+            self.by_id[tech.get("id")] = tech
+            self.by_business_unit.setdefault(tech.get("businessUnitId"), []).append(tech)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def for_business_unit(self, business_unit_id) -> list:
+        return self.by_business_unit.get(business_unit_id, [])
+
+    def get(self, technician_id) -> "dict | None":
+        return self.by_id.get(technician_id)
+
+
+async def _load(fetch_all) -> "Roster | None":
+    technicians = await fetch_all()
+    if technicians is None:
+        return None
+    return Roster(technicians)
+
+
+async def roster(fetch_all) -> "Roster | None":
+    """Roster vigente, o lo baja de ST (una sola vez aunque haya varios
+    callers concurrentes). None si ST no respondió."""
+    return await _cache.get_or_fetch(_KEY, lambda: _load(fetch_all), cache_if=lambda r: r is not None)
+
+
+def cached() -> "Roster | None":
+    """Roster en memoria sin tocar la red (None si no hay uno vigente)."""
+    return _cache.get(_KEY)
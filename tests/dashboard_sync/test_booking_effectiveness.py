@@ -51,8 +51,7 @@ class NoTrackedToolsTests(unittest.IsolatedAsyncioTestCase):
 
 class CreateJobConfirmedTests(unittest.IsolatedAsyncioTestCase):
     @patch("dashboard_sync.booking_effectiveness.main")
-    @patch("dashboard_sync.booking_effectiveness.httpx.AsyncClient")
-    async def test_confirmed_when_job_exists_with_expected_status(self, mock_client_cls, mock_main):
+    async def test_confirmed_when_job_exists_with_expected_status(self, mock_main):
         from dashboard_sync import booking_effectiveness
 
         mock_main.get_access_token = AsyncMock(return_value="fake-token")
@@ -61,9 +60,7 @@ class CreateJobConfirmedTests(unittest.IsolatedAsyncioTestCase):
 
         fake_response = MagicMock(status_code=200)
         fake_response.json.return_value = {"data": [{"id": 171326336, "jobStatus": "Scheduled"}]}
-        mock_client = AsyncMock()
-        mock_client.get.return_value = fake_response
-        mock_client_cls.return_value.__aenter__.return_value = mock_client
+        mock_main.st_gateway.get = AsyncMock(return_value=fake_response)
 
         call = {
             "transcript_with_tool_calls": _twc_pair(
@@ -79,8 +76,7 @@ class CreateJobConfirmedTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, "confirmed")
 
     @patch("dashboard_sync.booking_effectiveness.main")
-    @patch("dashboard_sync.booking_effectiveness.httpx.AsyncClient")
-    async def test_mismatch_when_job_not_found_in_servicetitan(self, mock_client_cls, mock_main):
+    async def test_mismatch_when_job_not_found_in_servicetitan(self, mock_main):
         from dashboard_sync import booking_effectiveness
 
         mock_main.get_access_token = AsyncMock(return_value="fake-token")
@@ -89,9 +85,7 @@ class CreateJobConfirmedTests(unittest.IsolatedAsyncioTestCase):
 
         fake_response = MagicMock(status_code=200)
         fake_response.json.return_value = {"data": []}
-        mock_client = AsyncMock()
-        mock_client.get.return_value = fake_response
-        mock_client_cls.return_value.__aenter__.return_value = mock_client
+        mock_main.st_gateway.get = AsyncMock(return_value=fake_response)
 
         call = {
             "transcript_with_tool_calls": _twc_pair(
@@ -180,8 +174,7 @@ class RescheduleAppointmentTests(unittest.IsolatedAsyncioTestCase):
 
 class CancelAppointmentTests(unittest.IsolatedAsyncioTestCase):
     @patch("dashboard_sync.booking_effectiveness.main")
-    @patch("dashboard_sync.booking_effectiveness.httpx.AsyncClient")
-    async def test_confirmed_when_job_is_canceled(self, mock_client_cls, mock_main):
+    async def test_confirmed_when_job_is_canceled(self, mock_main):
         from dashboard_sync import booking_effectiveness
 
         mock_main.get_access_token = AsyncMock(return_value="fake-token")
@@ -190,9 +183,7 @@ class CancelAppointmentTests(unittest.IsolatedAsyncioTestCase):
 
         fake_response = MagicMock(status_code=200)
         fake_response.json.return_value = {"data": [{"id": 171361806, "jobStatus": "Canceled"}]}
-        mock_client = AsyncMock()
-        mock_client.get.return_value = fake_response
-        mock_client_cls.return_value.__aenter__.return_value = mock_client
+        mock_main.st_gateway.get = AsyncMock(return_value=fake_response)
 
         call = {
             "transcript_with_tool_calls": _twc_pair(
@@ -210,17 +201,16 @@ class CancelAppointmentTests(unittest.IsolatedAsyncioTestCase):
 
 class ServiceTitanUnreachableTests(unittest.IsolatedAsyncioTestCase):
     @patch("dashboard_sync.booking_effectiveness.main")
-    @patch("dashboard_sync.booking_effectiveness.httpx.AsyncClient")
-    async def test_pending_when_servicetitan_request_fails(self, mock_client_cls, mock_main):
+    async def test_pending_when_servicetitan_request_fails(self, mock_main):
         from dashboard_sync import booking_effectiveness
 
         mock_main.get_access_token = AsyncMock(return_value="fake-token")
         mock_main.TENANT_ID = "tenant-1"
         mock_main.APP_ID = "app-1"
 
-        mock_client = AsyncMock()
-        mock_client.get.side_effect = booking_effectiveness.httpx.RequestError("timeout")
-        mock_client_cls.return_value.__aenter__.return_value = mock_client
+        mock_main.st_gateway.get = AsyncMock(
+            side_effect=booking_effectiveness.httpx.RequestError("timeout")
+        )
 
         call = {
             "transcript_with_tool_calls": _twc_pair(
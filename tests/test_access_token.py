@@ -0,0 +1,114 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi import HTTPException
+
+import main
+
+
+def _token_response(token, expires_in=900):
+    return httpx.Response(200, json={"access_token": token, "expires_in": expires_in})
+
+
+class AccessTokenTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._token_cache.update(token=None, exp=0.0)
+        main._token_fetch = None
+        self.addCleanup(main._token_cache.update, token=None, exp=0.0)
+        self.calls = 0
+        self.responses = []
+
+        async def fake_post(url, route=None, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            outcome = self.responses.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        patcher = patch.object(main.st_gateway, "post", side_effect=fake_post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_valid_token_is_returned_without_calling_auth(self):
+        main._token_cache.update(token="Bearer cached", exp=time.time() + 600)
+
+        self.assertEqual(await main.get_access_token(), "Bearer cached")
+        self.assertEqual(self.calls, 0)
+
+    async def test_concurrent_cold_requests_share_one_auth_call(self):
+        self.responses = [_token_response("Bearer fresh")]
+
+        tokens = await asyncio.gather(*[main.get_access_token() for _ in range(5)])
+
+        self.assertEqual(set(tokens), {"Bearer fresh"})
+        self.assertEqual(self.calls, 1)
+
+    async def test_token_inside_margin_is_used_while_renewing_in_background(self):
+        main._token_cache.update(token="Bearer old", exp=time.time() + main.config.TOKEN_REFRESH_MARGIN - 1)
+        self.responses = [_token_response("Bearer new")]
+
+        self.assertEqual(await main.get_access_token(), "Bearer old")
+        await main._token_fetch
+
+        self.assertEqual(await main.get_access_token(), "Bearer new")
+        self.assertEqual(self.calls, 1)
+
+    async def test_failed_refresh_is_shared_then_retried_on_next_call(self):
+        self.responses = [httpx.ConnectError("down"), _token_response("Bearer fresh")]
+
+        results = await asyncio.gather(main.get_access_token(), main.get_access_token(), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, HTTPException) and r.status_code == 503 for r in results))
+        self.assertEqual(await main.get_access_token(), "Bearer fresh")
+        self.assertEqual(self.calls, 2)
+
+    async def test_background_refresher_renews_before_expiry(self):
+        self.responses = [_token_response("Bearer first"), _token_response("Bearer second")]
+
+        with patch.object(main.config, "TOKEN_PROACTIVE_REFRESH", 900), \
+                patch.object(main.config, "TOKEN_REFRESH_RETRY", 0.01):
+            task = asyncio.create_task(main._refresh_token_forever())
+            try:
+                while main._token_cache["token"] != "Bearer second":
+                    await asyncio.sleep(0.01)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(main._token_cache["token"], "Bearer second")
+
+
+    async def test_refresher_backs_off_exponentially_on_bad_credentials(self):
+        self.responses = [httpx.Response(401, text="invalid_client")] * 6 + [_token_response("Bearer ok")]
+        sleeps = []
+        real_sleep = asyncio.sleep
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            await real_sleep(0)
+
+        with patch.object(main.config, "TOKEN_REFRESH_RETRY", 5.0), \
+                patch.object(main.config, "TOKEN_REFRESH_MAX_BACKOFF", 40.0), \
+                patch.object(main.asyncio, "sleep", fake_sleep), \
+                patch("builtins.print") as log:
+            task = asyncio.create_task(main._refresh_token_forever())
+            try:
+                while main._token_cache["token"] != "Bearer ok":
+                    await real_sleep(0.01)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        backoff = [s for s in sleeps if s >= 1]  # the fake auth call sleeps 0.01
+        self.assertEqual(backoff[:6], [5.0, 10.0, 20.0, 40.0, 40.0, 40.0])
+        failures = [c for c in log.call_args_list
+                    if "No se pudo renovar" in str(c) and "401" in str(c)]
+        self.assertEqual(len(failures), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
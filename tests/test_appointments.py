@@ -0,0 +1,145 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import appointments
+import main
+
+
+class FakeJpm:
+    """Paginated /jobs and /appointments listings filtered like ServiceTitan."""
+
+    def __init__(self, jobs, appointments):
+        self.jobs = jobs
+        self.appointments = appointments
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get(self, url, route=None, headers=None, timeout=None, params=None):
+        self.requests.append((route, dict(params)))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.001)
+        finally:
+            self.in_flight -= 1
+        rows = self.jobs if route == "jobs" else self.appointments
+        rows = [r for r in rows if r["customerId"] == params["customerId"]]
+        page, size = params["page"], params["pageSize"]
+        return httpx.Response(200, json={
+            "data": rows[(page - 1) * size:page * size],
+            "totalCount": len(rows),
+            "hasMore": page * size < len(rows),
+        })
+
+
+def _job(job_id, status):
+    return {"id": job_id, "customerId": 10, "jobStatus": status, "businessUnitId": 40, "jobTypeId": 30,
+            "summary": f"job {job_id}"}
+
+
+def _appointment(appointment_id, job_id, status, start="2026-07-15T13:00:00Z"):
+    return {"id": appointment_id, "customerId": 10, "jobId": job_id, "status": status,
+            "start": start, "end": "2026-07-15T16:00:00Z"}
+
+
+class FindAppointmentsTests(unittest.TestCase):
+    def setUp(self):
+        appointments.invalidate()
+        self.addCleanup(appointments.invalidate)
+        self.client = TestClient(main.app)
+        patcher = patch.object(main, "get_access_token", AsyncMock(return_value="Bearer t"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _find(self, st, endpoint="/findAppointments"):
+        with patch.object(main.st_gateway, "get", side_effect=st.get):
+            return self.client.post(endpoint, json={"args": {"customerId": 10}}).json()
+
+    def test_appointments_are_fetched_in_one_scan_not_per_job(self):
+        jobs = [_job(i, "Scheduled") for i in range(1, 41)] + [_job(100, "InProgress")]
+        appointments = [_appointment(1000 + i, i, "Scheduled") for i in range(1, 41)]
+        appointments += [_appointment(2000, 100, "Working"), _appointment(2001, 999, "Working")]
+        st = FakeJpm(jobs, appointments)
+
+        resp = self._find(st)
+
+        self.assertEqual(len(st.requests), 2)
+        self.assertEqual(len(resp["scheduledAppointments"]), 40)
+        self.assertEqual(resp["dispatchedAppointments"], [])
+        self.assertEqual(resp["workingAppointments"], [{
+            "jobId": 100, "businessUnitId": 40, "jobTypeId": 30, "summary": "job 100", "employeeId": None,
+            "appointmentId": 2000, "start": "2026-07-15T09:00:00-04:00", "end": "2026-07-15T12:00:00-04:00",
+        }])
+
+    def test_long_histories_are_paginated_with_bounded_concurrency(self):
+        jobs = [_job(i, "Scheduled") for i in range(1, 26)]
+        appointments = [_appointment(1000 + i, i, "Scheduled") for i in range(1, 26)]
+        st = FakeJpm(jobs, appointments)
+
+        with patch.object(main.config, "ST_PAGE_SIZE", 5), patch.object(main.config, "ST_LIST_CONCURRENCY", 2):
+            resp = self._find(st)
+
+        self.assertEqual(sorted(a["appointmentId"] for a in resp["scheduledAppointments"]),
+                         [1000 + i for i in range(1, 26)])
+        self.assertLessEqual(st.max_in_flight, 2)
+
+    def test_no_appointments_message(self):
+        resp = self._find(FakeJpm([], []))
+
+        self.assertIn("No scheduled", resp["message"])
+
+    def test_upcoming_and_past_share_one_scan(self):
+        st = FakeJpm([_job(1, "Scheduled"), _job(2, "Completed"), _job(3, "Canceled")],
+                     [_appointment(11, 1, "Scheduled"), _appointment(12, 2, "Done"),
+                      _appointment(13, 3, "Canceled"), _appointment(14, 2, "Canceled")])
+
+        upcoming = self._find(st)
+        past = self._find(st, "/findPastAppointments")
+
+        self.assertEqual([a["appointmentId"] for a in upcoming["scheduledAppointments"]], [11])
+        self.assertEqual([a["appointmentId"] for a in past["doneAppointments"]], [12])
+        self.assertEqual([a["appointmentId"] for a in past["canceledAppointments"]], [13])
+        self.assertEqual(past["holdAppointments"], [])
+        self.assertEqual(len(st.requests), 2)
+
+    def test_cancel_invalidates_the_cached_scan(self):
+        st = FakeJpm([_job(1, "Scheduled")], [_appointment(11, 1, "Scheduled")])
+        self._find(st)
+
+        with patch.object(main.st_gateway, "put", AsyncMock(return_value=httpx.Response(200, text=""))):
+            self.client.post("/cancelAppointment", json={
+                "args": {"jobId": 1, "reasonId": 1, "memo": "no longer needed"},
+                "call": {"call_id": "call-cancel-appointments-1"},
+            })
+        st.jobs[0]["jobStatus"] = "Canceled"
+        st.appointments[0]["status"] = "Canceled"
+
+        self.assertIn("No scheduled", self._find(st)["message"])
+        self.assertEqual(len(st.requests), 4)
+
+    def test_cached_appointment_is_read_from_the_scan(self):
+        st = FakeJpm([_job(1, "Scheduled")], [_appointment(11, 1, "Scheduled")])
+        self._find(st)
+
+        self.assertEqual(appointments.cached_appointment(11)["start"], "2026-07-15T09:00:00-04:00")
+        self.assertIsNone(appointments.cached_appointment(99))
+        self.assertEqual(len(st.requests), 2)
+
+    def test_failed_scan_is_not_cached(self):
+        st = FakeJpm([_job(1, "Scheduled")], [_appointment(11, 1, "Scheduled")])
+        failing = AsyncMock(return_value=httpx.Response(503, text="down"))
+
+        with patch.object(main.st_gateway, "get", failing):
+            first = self.client.post("/findAppointments", json={"args": {"customerId": 10}}).json()
+
+        self.assertIn("No scheduled", first["message"])
+        self.assertEqual(len(self._find(st)["scheduledAppointments"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
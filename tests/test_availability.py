@@ -0,0 +1,354 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import availability_index
+import main
+
+
+def _capacity_response(slots):
+    return httpx.Response(200, json={"availabilities": slots})
+
+
+def _slot(start, end, available=True, business_units=(40,)):
+    return {"start": start, "end": end, "isAvailable": available,
+            "businessUnitIds": list(business_units)}
+
+
+class CapacityWindowTests(unittest.TestCase):
+    def test_windows_are_contiguous_and_do_not_overlap(self):
+        windows = main._capacity_windows(datetime(2026, 7, 15, 10, 0))
+
+        self.assertEqual(windows[0], ("2026-07-15T10:00:00Z", "2026-07-21T23:59:00Z"))
+        self.assertEqual(windows[1], ("2026-07-22T00:00:00Z", "2026-07-28T23:59:00Z"))
+        self.assertEqual(windows[-1][1], "2026-08-25T23:59:00Z")
+        for (_, prev_end), (next_start, _) in zip(windows, windows[1:]):
+            self.assertLess(prev_end, next_start)
+
+
+class CheckAvailabilityTimeTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._capacity_cache.clear()
+        availability_index._index.clear()
+
+    async def _run(self, fake_post):
+        with patch.object(main.st_gateway, "post", side_effect=fake_post):
+            return await main.check_availability_time(
+                "2026-07-15T10:00:00Z", [40], 30, access_token="Bearer t")
+
+    async def test_returns_earliest_window_with_slots_even_if_a_later_one_answers_first(self):
+        requested = []
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            requested.append(json["startsOnOrAfter"])
+            if json["startsOnOrAfter"] == "2026-07-15T10:00:00Z":
+                await asyncio.sleep(0.02)
+                return _capacity_response([])
+            if json["startsOnOrAfter"] == "2026-07-22T00:00:00Z":
+                await asyncio.sleep(0.01)
+                return _capacity_response([_slot("2026-07-23T08:00:00Z", "2026-07-23T11:00:00Z")])
+            return _capacity_response([_slot("2026-07-30T08:00:00Z", "2026-07-30T11:00:00Z")])
+
+        slots = await self._run(fake_post)
+
+        self.assertEqual(slots, [{"start": "2026-07-23T08:00:00Z", "end": "2026-07-23T11:00:00Z"}])
+        # Only the in-flight horizon was requested, not the whole six weeks.
+        self.assertLessEqual(len(requested), main.config.CAPACITY_SEARCH_FANOUT + 1)
+
+    async def test_pending_later_windows_are_cancelled_once_answer_is_known(self):
+        cancelled = []
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            if json["startsOnOrAfter"] == "2026-07-15T10:00:00Z":
+                return _capacity_response([_slot("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z")])
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(json["startsOnOrAfter"])
+                raise
+
+        slots = await self._run(fake_post)
+        await asyncio.sleep(0)
+
+        self.assertEqual(len(slots), 1)
+        self.assertEqual(len(cancelled), main.config.CAPACITY_SEARCH_FANOUT - 1)
+
+    async def test_unavailable_slots_are_filtered_out(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            return _capacity_response([
+                _slot("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z", available=False),
+                _slot("2026-07-16T11:00:00Z", "2026-07-16T14:00:00Z"),
+            ])
+
+        slots = await self._run(fake_post)
+
+        self.assertEqual(slots, [{"start": "2026-07-16T11:00:00Z", "end": "2026-07-16T14:00:00Z"}])
+
+    async def test_empty_list_when_st_answers_but_calendar_is_full(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            return _capacity_response([])
+
+        self.assertEqual(await self._run(fake_post), [])
+
+    async def test_none_when_st_never_answers(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            raise httpx.ConnectError("down")
+
+        self.assertIsNone(await self._run(fake_post))
+
+    async def test_failed_window_does_not_hide_slots_in_a_later_one(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            if json["startsOnOrAfter"] == "2026-07-15T10:00:00Z":
+                return httpx.Response(503, text="unavailable")
+            return _capacity_response([_slot("2026-07-23T08:00:00Z", "2026-07-23T11:00:00Z")])
+
+        slots = await self._run(fake_post)
+
+        self.assertEqual(slots[0]["start"], "2026-07-23T08:00:00Z")
+
+
+class CapacityCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._capacity_cache.clear()
+        availability_index._index.clear()
+        self.calls = []
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            self.calls.append(json["startsOnOrAfter"])
+            await asyncio.sleep(0.01)
+            return _capacity_response([_slot("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z")])
+
+        patcher = patch.object(main.st_gateway, "post", side_effect=fake_post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(main._capacity_cache.clear)
+
+    async def _check(self):
+        return await main.check_availability_time("2026-07-15T10:00:00Z", [40], 30, access_token="Bearer t")
+
+    async def test_concurrent_identical_searches_share_one_request_per_window(self):
+        first, second = await asyncio.gather(self._check(), self._check())
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls.count("2026-07-15T10:00:00Z"), 1)
+
+    async def test_repeat_search_is_served_from_cache(self):
+        await self._check()
+        before = len(self.calls)
+
+        await self._check()
+
+        self.assertEqual(len(self.calls), before)
+
+    async def test_booking_invalidates_only_overlapping_windows(self):
+        await self._check()
+        main._capacity_cache.set((30, (40,), "2026-08-01T00:00:00Z", "2026-08-07T23:59:00Z"), [])
+
+        main._invalidate_capacity("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z")
+
+        self.assertIsNone(main._capacity_cache.get((30, (40,), "2026-07-15T10:00:00Z", "2026-07-21T23:59:00Z")))
+        self.assertEqual(main._capacity_cache.get((30, (40,), "2026-08-01T00:00:00Z", "2026-08-07T23:59:00Z")), [])
+
+    async def test_invalidation_without_range_drops_everything(self):
+        await self._check()
+
+        main._invalidate_capacity()
+
+        self.assertEqual(len(main._capacity_cache), 0)
+
+
+WINDOWS = [
+    ("2026-07-15T00:00:00Z", "2026-07-21T23:59:00Z"),
+    ("2026-07-22T00:00:00Z", "2026-07-28T23:59:00Z"),
+]
+
+
+class AvailabilityIndexTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        availability_index._index.clear()
+        availability_index._dirty.clear()
+        self.addCleanup(availability_index._index.clear)
+        self.addCleanup(availability_index._dirty.clear)
+
+    def _index(self, slots, ts=None):
+        availability_index._index[(30, (40,))] = {
+            "ts": availability_index.time.monotonic() if ts is None else ts,
+            "from": WINDOWS[0][0],
+            "to": WINDOWS[-1][1],
+            "slots": slots,
+        }
+
+    def test_lookup_returns_first_window_with_slots(self):
+        self._index([{"start": "2026-07-23T08:00:00Z", "end": "2026-07-23T11:00:00Z"},
+                     {"start": "2026-07-24T08:00:00Z", "end": "2026-07-24T11:00:00Z"}])
+
+        slots = availability_index.lookup(30, [40], [("2026-07-15T10:00:00Z", WINDOWS[0][1]), WINDOWS[1]])
+
+        self.assertEqual(len(slots), 2)
+        self.assertEqual(slots[0]["start"], "2026-07-23T08:00:00Z")
+
+    def test_lookup_returns_empty_list_when_covered_range_is_full(self):
+        self._index([])
+
+        self.assertEqual(availability_index.lookup(30, [40], WINDOWS), [])
+
+    def test_lookup_misses_when_entry_is_stale_or_range_not_covered(self):
+        self._index([], ts=availability_index.time.monotonic() - main.config.AVAILABILITY_INDEX_MAX_AGE - 1)
+        self.assertIsNone(availability_index.lookup(30, [40], WINDOWS))
+
+        self._index([])
+        self.assertIsNone(availability_index.lookup(30, [40], WINDOWS + [("2026-07-29T00:00:00Z", "2026-08-04T23:59:00Z")]))
+        self.assertIsNone(availability_index.lookup(31, [40], WINDOWS))
+
+    def test_booking_drops_only_the_affected_entry_and_the_taken_slot(self):
+        taken = {"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z"}
+        free = {"start": "2026-07-17T08:00:00Z", "end": "2026-07-17T11:00:00Z"}
+        self._index([taken, free])
+        availability_index._index[(31, (41,))] = dict(availability_index._index[(30, (40,))], slots=[taken, free])
+
+        availability_index.invalidate(31, 41, taken["start"], taken["end"])
+
+        self.assertNotIn((31, (41,)), availability_index._index)
+        self.assertEqual(availability_index.lookup(30, [40], WINDOWS), [free])
+        self.assertEqual(availability_index._dirty, {31})
+
+    def test_cancellation_keeps_answering_and_schedules_a_full_refresh(self):
+        self._index([])
+
+        availability_index.invalidate()
+
+        self.assertEqual(availability_index.lookup(30, [40], WINDOWS), [])
+        self.assertEqual(availability_index._dirty, {availability_index.ALL})
+
+    async def test_refresh_can_be_limited_to_invalidated_job_types(self):
+        fetched = []
+
+        async def load_targets():
+            return [(30, [40]), (31, [41])]
+
+        async def fetch_window(job_type, business_units, starts, ends):
+            fetched.append(job_type)
+            return []
+
+        built = await availability_index.refresh_once(load_targets, fetch_window, lambda today: WINDOWS,
+                                                      job_types={31})
+
+        self.assertEqual(built, 1)
+        self.assertEqual(set(fetched), {31})
+
+    async def test_bursts_of_bookings_force_one_rate_limited_refresh(self):
+        refreshes = []
+
+        async def load_targets():
+            refreshes.append(availability_index.time.monotonic())
+            return [(30, [40]), (31, [41])]
+
+        async def fetch_window(job_type, business_units, starts, ends):
+            return []
+
+        with patch.object(main.config, "AVAILABILITY_INDEX_ENABLED", True), \
+                patch.object(main.config, "AVAILABILITY_INDEX_INTERVAL", 60), \
+                patch.object(main.config, "AVAILABILITY_INDEX_MIN_REFRESH", 0.2):
+            availability_index.start(load_targets, fetch_window, lambda today: WINDOWS)
+            self.addAsyncCleanup(availability_index.stop)
+            await asyncio.sleep(0.05)
+            for _ in range(5):
+                availability_index.invalidate(30, 40)
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(refreshes), 1)
+            await asyncio.sleep(0.2)
+
+        self.assertEqual(len(refreshes), 2)
+        self.assertGreaterEqual(refreshes[1] - refreshes[0], 0.2)
+        self.assertIn((30, (40,)), availability_index._index)
+
+    async def test_refresh_skips_targets_with_a_failed_window(self):
+        async def load_targets():
+            return [(30, [40]), (31, [41])]
+
+        async def fetch_window(job_type, business_units, starts, ends):
+            if job_type == 31 and starts == WINDOWS[1][0]:
+                return None
+            return [{"start": starts, "end": ends}]
+
+        built = await availability_index.refresh_once(load_targets, fetch_window, lambda today: WINDOWS)
+
+        self.assertEqual(built, 1)
+        self.assertIn((30, (40,)), availability_index._index)
+        self.assertNotIn((31, (41,)), availability_index._index)
+
+    async def test_check_availability_answers_from_index_without_calling_st(self):
+        self._index([{"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z"}])
+        start = datetime(2026, 7, 15, 10, 0)
+        with patch.object(main, "_capacity_windows", return_value=WINDOWS), \
+                patch.object(main.st_gateway, "post") as post:
+            slots = await main.check_availability_time(start.strftime("%Y-%m-%dT%H:%M:%SZ"), [40], 30,
+                                                        access_token="Bearer t")
+
+        self.assertEqual(slots, [{"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z"}])
+        post.assert_not_called()
+
+
+class SlotLedgerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._capacity_cache.clear()
+        availability_index._index.clear()
+        main.call_sessions.clear()
+        self.addCleanup(main.call_sessions.clear)
+        for target, value in (("_get_job_types", AsyncMock(return_value={30: [40, 41]})),
+                              ("get_access_token", AsyncMock(return_value="Bearer t"))):
+            patcher = patch.object(main, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_check_availability_records_owner_and_hides_it_from_the_agent(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            return _capacity_response([_slot("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z", business_units=(41,))])
+
+        with patch.object(main.st_gateway, "post", side_effect=fake_post):
+            resp = TestClient(main.app).post("/checkAvailability", json={
+                "args": {"time": "2026-07-15T10:00:00Z", "jobTypeId": 30},
+                "call": {"call_id": "call-ledger-1"},
+            })
+
+        self.assertEqual(resp.json()["available_slots"],
+                         [{"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z"}])
+        self.assertEqual(main._ledger_business_units("call-ledger-1", 30, "2026-07-16T08:00:00Z",
+                                                     "2026-07-16T11:00:00Z"), [41])
+
+    async def test_create_job_resolves_bu_from_ledger_without_calling_st(self):
+        main._record_slots("call-ledger-2", 30, [
+            {"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z", "businessUnitIds": [41]}])
+
+        with patch.object(main.st_gateway, "post") as post:
+            bu = await main._resolve_business_unit({}, 30, "2026-07-16T08:00:00", "2026-07-16T11:00:00Z", 40,
+                                                   call_id="call-ledger-2")
+
+        self.assertEqual(bu, 41)
+        post.assert_not_called()
+
+    async def test_stale_or_missing_ledger_entry_falls_back_to_st(self):
+        main._record_slots("call-ledger-3", 30, [
+            {"start": "2026-07-16T08:00:00Z", "end": "2026-07-16T11:00:00Z", "businessUnitIds": [41]}])
+        for entry in main.call_sessions["call-ledger-3"]["_slots"].values():
+            entry["ts"] -= main.config.SLOT_LEDGER_TTL + 1
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            return _capacity_response([_slot("2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z", business_units=(40,))])
+
+        with patch.object(main.st_gateway, "post", side_effect=fake_post) as post:
+            stale = await main._resolve_business_unit({}, 30, "2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z", 41,
+                                                      call_id="call-ledger-3")
+            missing = await main._resolve_business_unit({}, 30, "2026-07-16T08:00:00Z", "2026-07-16T11:00:00Z", 41,
+                                                        call_id="call-unknown")
+
+        self.assertEqual((stale, missing), (40, 40))
+        self.assertEqual(post.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,18 +18,10 @@ class FakeResponse:
 
 
 class FakeAsyncClient:
+    """Stand-in for the shared ServiceTitan client (st_client._client)."""
     post_calls = []
 
-    def __init__(self, *args, **kwargs):
-        pass
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc, tb):
-        return False
-
-    async def get(self, url, headers=None):
+    async def get(self, url, headers=None, **kwargs):
         return FakeResponse(
             payload={
                 "data": [
@@ -41,16 +33,20 @@ class FakeAsyncClient:
             }
         )
 
-    async def post(self, url, headers=None, json=None):
+    async def post(self, url, headers=None, json=None, **kwargs):
         self.__class__.post_calls.append({"url": url, "headers": headers, "json": json})
         return FakeResponse(payload={"id": 123, "lastAppointmentId": 456})
 
+    async def request(self, method, url, **kwargs):
+        return await getattr(self, method.lower())(url, **kwargs)
+
 
 class BackendRuntimeTests(unittest.TestCase):
     def setUp(self):
         main.idempotency_cache.clear()
         main.idempotency_locks.clear()
         main.call_sessions.clear()
+        main.st_gateway.reset()
         FakeAsyncClient.post_calls = []
         self.client = TestClient(main.app)
 
@@ -110,7 +106,7 @@ class BackendRuntimeTests(unittest.TestCase):
             return "Bearer test-token"
 
         with patch.object(main, "get_access_token", side_effect=fake_token):
-            with patch.object(main.httpx, "AsyncClient", FakeAsyncClient):
+            with patch.object(main.st_client, "_client", FakeAsyncClient()):
                 first = self.client.post("/createJob", json=payload)
                 second = self.client.post("/createJob", json=payload)
 
@@ -123,6 +119,25 @@ class BackendRuntimeTests(unittest.TestCase):
         self.assertEqual(sent_payload["appointments"][0]["start"], "2026-07-15T13:00:00Z")
         self.assertEqual(sent_payload["appointments"][0]["end"], "2026-07-15T16:00:00Z")
 
+    def test_servicetitan_outage_returns_readable_error_instead_of_500(self):
+        payload = {
+            "args": {"jobId": 99, "reasonId": 1, "memo": "no longer needed"},
+            "call": {"call_id": "call-cancel-outage-1"},
+        }
+
+        async def fake_token():
+            return "Bearer test-token"
+
+        async def circuit_open(*args, **kwargs):
+            raise main.st_gateway.CircuitOpenError("ServiceTitan job_cancel unavailable")
+
+        with patch.object(main, "get_access_token", side_effect=fake_token):
+            with patch.object(main.st_gateway, "put", side_effect=circuit_open):
+                resp = self.client.post("/cancelAppointment", json=payload)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("temporarily unavailable", resp.json()["error"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import appointments
+import main
+
+
+class CallerPrefetchTests(unittest.TestCase):
+    def setUp(self):
+        main.call_sessions.clear()
+        main._prefetched_calls.clear()
+        main._customers_cache.clear()
+        main._locations_cache.clear()
+        appointments.invalidate()
+        for cleanup in (main.call_sessions.clear, main._prefetched_calls.clear, main._customers_cache.clear,
+                        main._locations_cache.clear, appointments.invalidate):
+            self.addCleanup(cleanup)
+        # Entered like `with TestClient(...)`: one event loop for the whole test, as in
+        # production, so prefetch tasks survive between requests.
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        self.gets = []
+
+        async def fake_get(url, route=None, headers=None, timeout=None, params=None):
+            self.gets.append(route)
+            await asyncio.sleep(0.01)
+            if route == "customers":
+                return httpx.Response(200, json={"data": [{"id": 10, "name": "Jane Caller"}]})
+            if route == "locations":
+                return httpx.Response(200, json={"data": [{"id": 20, "address": {"street": "1 Main St"}}]})
+            return httpx.Response(200, json={"data": [], "totalCount": 0})
+
+        for target, name, value in ((main.st_gateway, "get", AsyncMock(side_effect=fake_get)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t"))):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _tool_call(self, path, args, call):
+        return self.client.post(path, json={"args": args, "call": call}).json()
+
+    def test_first_tool_call_prefetches_customer_locations_and_appointments(self):
+        call = {"call_id": "call-prefetch-1", "direction": "inbound", "from_number": "+16035551234"}
+
+        self._tool_call("/getCallData", {}, call)
+        customers = self._tool_call("/findCustomer", {"number": "6035551234"}, call)
+        locations = self._tool_call("/getCustomerLocations", {"customerId": 10}, call)
+        self._tool_call("/findAppointments", {"customerId": 10}, call)
+
+        self.assertEqual(customers[0]["customerId"], 10)
+        self.assertEqual(locations["locations"][0]["locationId"], 20)
+        # customer + locations + jobs + appointments: each fetched once, by the prefetch.
+        self.assertEqual(sorted(self.gets), ["appointments", "customers", "jobs", "locations"])
+
+    def test_prefetch_runs_once_per_call(self):
+        call = {"call_id": "call-prefetch-2", "from_number": "+16035551234"}
+
+        self._tool_call("/getCallData", {}, call)
+        self._tool_call("/getCallData", {}, call)
+        self._tool_call("/findCustomer", {"number": "6035551234"}, call)
+
+        self.assertEqual(self.gets.count("customers"), 1)
+
+    def test_prefetch_does_not_create_a_call_session(self):
+        call = {"call_id": "call-prefetch-4", "from_number": "+16035551234"}
+
+        self._tool_call("/findCustomer", {"number": "6035551234"}, call)
+
+        self.assertNotIn("call-prefetch-4", main.call_sessions)
+        self.assertEqual(self._tool_call("/clearCallData", {}, call)["status"], "not_found")
+
+    def test_clearing_call_data_does_not_prefetch_again(self):
+        call = {"call_id": "call-prefetch-5", "from_number": "+16035551234"}
+
+        self._tool_call("/getCallData", {}, call)
+        self._tool_call("/clearCallData", {}, call)
+        main._customers_cache.clear()
+        self._tool_call("/getCallData", {}, call)
+
+        self.assertEqual(self.gets.count("customers"), 1)
+
+    def test_tools_without_caller_context_do_not_prefetch(self):
+        self._tool_call("/getTime", {}, {"call_id": "call-prefetch-6", "from_number": "+16035551234"})
+
+        self.assertEqual(self.gets, [])
+        self.assertEqual(len(main._prefetched_calls), 0)
+
+    def test_outbound_calls_prefetch_the_dialed_number(self):
+        self.assertEqual(main._caller_number({"direction": "outbound", "from_number": "+19785550000",
+                                              "to_number": "+16035551234"}), "+16035551234")
+
+    def test_no_prefetch_without_caller_id(self):
+        self._tool_call("/getCallData", {}, {"call_id": "call-prefetch-3"})
+
+        self.assertEqual(self.gets, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
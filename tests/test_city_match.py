@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+import city_match
+import config
+import geocode
+import main
+
+
+class CityIndexTests(unittest.TestCase):
+    def test_spoken_variants_resolve_to_the_listed_city(self):
+        for spoken, city in [("Newbury Port", "newburyport"), ("Methune", "methuen"),
+                             ("Marlboro", "marlborough"), ("Haverill", "haverhill"),
+                             ("North Hampton", "northampton"), ("Worchester", "worcester")]:
+            with self.subTest(spoken=spoken):
+                self.assertEqual(city_match.match_city(spoken)["city"], city)
+
+    def test_exact_and_compact_names_score_one(self):
+        self.assertEqual(city_match.match_city("  Newbury-port "), {"city": "newburyport", "score": 1.0, "method": "exact"})
+
+    def test_unrelated_or_ambiguous_names_are_not_guessed(self):
+        for spoken in ["Andover", "Needham", "Bedford", "Reading", "", "xyz"]:
+            with self.subTest(spoken=spoken):
+                self.assertIsNone(city_match.match_city(spoken))
+
+    def test_phonetic_keys_absorb_spelling_variants(self):
+        self.assertEqual(city_match.phonetic_key("marlboro"), city_match.phonetic_key("Marlborough"))
+        self.assertEqual(city_match.phonetic_key("methune"), city_match.phonetic_key("methuen"))
+
+    def test_zip_table_matches_are_limited_to_the_state(self):
+        self.assertEqual(city_match.match_city_zip("marlboro", "ma")["key"], "marlborough|ma")
+        self.assertIsNone(city_match.match_city_zip("marlboro", "nh"))
+
+    def test_index_is_rebuilt_when_the_city_list_changes(self):
+        self.assertIsNone(city_match.match_city("Lexingtun"))
+
+        with patch.object(config, "CITIES", config.CITIES | {"lexington"}):
+            self.assertEqual(city_match.match_city("Lexingtun")["city"], "lexington")
+
+
+class FuzzyEndpointTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(geocode, "lookup", AsyncMock(side_effect=AssertionError("network geocode")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _check(self, city, state, zip_code="00000"):
+        return TestClient(main.app).post("/checkWorkArea", json={
+            "args": {"street": "1 Main St", "city": city, "state": state, "zip": zip_code, "country": "USA"},
+        }).json()
+
+    def test_check_work_area_accepts_spoken_variants_without_the_network(self):
+        self.assertEqual(self._check("Methune", "MA"),
+                         {"message": "City is in the working area (matched from predefined list)."})
+
+    def test_real_towns_are_not_corrected_into_listed_cities(self):
+        # North Hampton NH is its own town, not Northampton MA: the gazetteer decides.
+        result = self._check("North Hampton", "NH", "03862")
+
+        self.assertNotIn("predefined list", result.get("message", ""))
+
+    def test_suggest_zip_resolves_spoken_variants(self):
+        result = TestClient(main.app).post("/suggestZip", json={"args": {"city": "Marlboro", "state": "MA"}}).json()
+
+        self.assertEqual(result["status"], "single")
+        self.assertEqual(result["zip"], "01752")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+
+
+class CustomerTestCase(unittest.TestCase):
+    def setUp(self):
+        main._customers_cache.clear()
+        main._locations_cache.clear()
+        main.idempotency_cache.clear()
+        self.addCleanup(main._customers_cache.clear)
+        self.addCleanup(main._locations_cache.clear)
+        self.addCleanup(main.idempotency_cache.clear)
+        self.client = TestClient(main.app)
+        self.gets = []
+        self.posts = []
+        self.customers = [{"id": 10, "name": "Jane Caller"}]
+        self.locations = [{"id": 20, "address": {"street": "1 Main St", "city": "Salem", "state": "MA"}}]
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            self.gets.append(url)
+            return httpx.Response(200, json={"data": self.locations if route == "locations" else self.customers})
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            self.posts.append((route, json))
+            if route == "customer_create":
+                return httpx.Response(200, json={"id": 11, "locations": [{"id": 21}]})
+            if route == "location_create":
+                return httpx.Response(200, json={"id": 22, "customerId": json["customerId"]})
+            return httpx.Response(200, json={"id": 99})
+
+        for target, name, value in ((main.st_gateway, "get", AsyncMock(side_effect=fake_get)),
+                                    (main.st_gateway, "post", AsyncMock(side_effect=fake_post)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t"))):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _find(self, number):
+        return self.client.post("/findCustomer", json={"args": {"number": number}}).json()
+
+    def _create_customer(self, number):
+        return self.client.post("/createCustomer", json={
+            "args": {
+                "name": "New Caller",
+                "number": number,
+                "email": "new@example.com",
+                "locations": [{"name": "New Caller",
+                               "address": {"street": "1 Main St", "city": "Salem", "state": "MA",
+                                           "zip": "01970", "country": "USA"}}],
+            },
+            "call": {"call_id": "call-create-customer-1"},
+        }).json()
+
+    def _locations(self, customer_id):
+        return self.client.post("/getCustomerLocations", json={"args": {"customerId": customer_id}}).json()
+
+    def _create_location(self, customer_id):
+        return self.client.post("/createLocation", json={
+            "args": {"customerId": customer_id,
+                     "location": {"name": "Jane Caller",
+                                  "address": {"street": "9 Elm St", "city": "Lowell", "state": "MA",
+                                              "zip": "01850", "country": "USA"}}},
+            "call": {"call_id": "call-create-location-1"},
+        }).json()
+
+
+class CustomerByPhoneCacheTests(CustomerTestCase):
+    def test_repeat_lookups_of_the_same_number_hit_st_once(self):
+        first = self._find("+1 (603) 555-1234")
+        second = self._find("6035551234")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, [{"customerId": 10, "customerName": "Jane Caller"}])
+        self.assertEqual(len(self.gets), 1)
+        self.assertTrue(self.gets[0].endswith("phone=6035551234"))
+
+    def test_not_found_is_cached_until_create_customer_for_that_number(self):
+        self.customers = []
+        self.assertFalse(self._find("6035551234")["found"])
+        self.assertFalse(self._find("6035551234")["found"])
+        self.assertEqual(len(self.gets), 1)
+
+        self.assertEqual(self._create_customer("+16035551234")["customerId"], 11)
+        self.customers = [{"id": 11, "name": "New Caller"}]
+
+        self.assertEqual(self._find("6035551234")[0]["customerId"], 11)
+        self.assertEqual(len(self.gets), 2)
+
+    def test_errors_are_not_cached(self):
+        main.st_gateway.get.side_effect = [httpx.Response(503, text="down"),
+                                           httpx.Response(200, json={"data": self.customers})]
+
+        self.assertIn("error", self._find("6035551234"))
+        self.assertEqual(self._find("6035551234")[0]["customerId"], 10)
+
+    def test_numbers_without_ten_digits_never_reach_st(self):
+        for number in ("anonymous", "unknown", "+1", "555-0101"):
+            with self.subTest(number=number):
+                self.assertIn("error", self._find(number))
+
+        self.assertEqual(self.gets, [])
+
+    def test_unusable_caller_ids_do_not_match_anyone(self):
+        for number in ("unknown", "", None, main.normalize.normalize_phone("anonymous")):
+            with self.subTest(number=number):
+                self.assertEqual(asyncio.run(main._find_customers_by_phone(number)), (200, []))
+                self.assertEqual(asyncio.run(main.get_customer_by_phone(number)),
+                                 {"error": "Customer not found by phone."})
+
+        self.assertEqual(self.gets, [])
+        self.assertEqual(len(main._customers_cache), 0)
+
+
+class CustomerLocationsCacheTests(CustomerTestCase):
+    def test_repeat_reads_within_a_call_do_not_leave_the_process(self):
+        first = self._locations(10)
+        second = self._locations(10)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["locations"], [{"locationId": 20, "locationAddress": "1 Main St, Salem, MA"}])
+        self.assertEqual(len(self.gets), 1)
+
+    def test_create_location_writes_through_to_the_cached_list(self):
+        self._locations(10)
+
+        self.assertEqual(self._create_location(10)["locationId"], 22)
+        locations = self._locations(10)["locations"]
+
+        self.assertEqual([loc["locationId"] for loc in locations], [20, 22])
+        self.assertEqual(locations[1]["locationAddress"], "9 Elm St, Lowell, MA")
+        self.assertEqual(len(self.gets), 1)
+
+    def test_create_customer_seeds_the_new_customers_locations(self):
+        self._create_customer("6035559876")
+
+        locations = self._locations(11)["locations"]
+
+        self.assertEqual(locations, [{"locationId": 21, "locationAddress": "1 Main St, Salem, MA"}])
+        self.assertEqual(self.gets, [])
+
+
+class ContactCreationTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.posts = []
+        self.outcomes = {}
+
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            self.posts.append(json["type"])
+            await asyncio.sleep(0.02)
+            outcome = self.outcomes.get(json["type"], httpx.Response(200, json={}))
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        for target, name, value in ((main.st_gateway, "post", AsyncMock(side_effect=fake_post)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t"))):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _contacts(self):
+        return [("teléfono", {"type": "MobilePhone", "value": "6035551234", "memo": ""}),
+                ("email", {"type": "Email", "value": "jane@example.com", "memo": ""})]
+
+    async def test_phone_and_email_are_posted_concurrently(self):
+        started = asyncio.get_running_loop().time()
+
+        await asyncio.gather(*[main._add_contact(10, {}, label, payload) for label, payload in self._contacts()])
+
+        self.assertEqual(sorted(self.posts), ["Email", "MobilePhone"])
+        self.assertLess(asyncio.get_running_loop().time() - started, 0.035)
+
+    async def test_transient_failure_is_retried_in_background(self):
+        self.outcomes["Email"] = httpx.Response(503, text="down")
+
+        with patch.object(main, "_spawn_background") as spawn, patch.object(main, "_retry_contact", MagicMock()) as retry:
+            await asyncio.gather(*[main._add_contact(10, {}, label, payload) for label, payload in self._contacts()])
+
+        spawn.assert_called_once()
+        retry.assert_called_once_with(10, "email", self._contacts()[1][1])
+
+    async def test_rejected_contact_is_not_retried(self):
+        self.outcomes["Email"] = httpx.Response(400, text="invalid email")
+
+        with patch.object(main, "_spawn_background") as spawn:
+            await main._add_contact(10, {}, "email", self._contacts()[1][1])
+
+        spawn.assert_not_called()
+
+    async def test_retry_skips_post_when_contact_already_exists(self):
+        existing = httpx.Response(200, json={"data": [{"type": "Email", "value": "jane@example.com"}]})
+
+        with patch.object(main.config, "CONTACT_RETRY_DELAY", 0), \
+                patch.object(main.st_gateway, "get", AsyncMock(return_value=existing)):
+            await main._retry_contact(10, "email", self._contacts()[1][1])
+
+        self.assertEqual(self.posts, [])
+
+    async def test_retry_posts_until_success(self):
+        self.outcomes["Email"] = httpx.ConnectError("down")
+        lookups = []
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            lookups.append(route)
+            if len(lookups) == 2:
+                self.outcomes.pop("Email")  # ST recovers before the second attempt
+            return httpx.Response(200, json={"data": []})
+
+        with patch.object(main.config, "CONTACT_RETRY_DELAY", 0), \
+                patch.object(main.st_gateway, "get", AsyncMock(side_effect=fake_get)):
+            await main._retry_contact(10, "email", self._contacts()[1][1])
+
+        self.assertEqual(self.posts, ["Email", "Email"])
+        self.assertEqual(lookups, ["contacts_read", "contacts_read"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import availability_index
+import deadline
+import main
+import st_client
+import st_gateway
+
+
+class DeadlineBudgetTests(unittest.TestCase):
+    def test_header_wins_over_configured_budget(self):
+        with patch.object(main.config, "TOOL_DEADLINE_RESERVE", 0.5):
+            self.assertEqual(deadline.budget_for("checkAvailability", "4000"), 3.5)
+
+    def test_falls_back_to_per_tool_then_default_budget(self):
+        with patch.object(main.config, "TOOL_DEADLINES", {"createJob": 20.0}), \
+                patch.object(main.config, "TOOL_DEADLINE_DEFAULT", 8.0), \
+                patch.object(main.config, "TOOL_DEADLINE_RESERVE", 0.5):
+            self.assertEqual(deadline.budget_for("createJob", "garbage"), 19.5)
+            self.assertEqual(deadline.budget_for("getTime"), 7.5)
+
+
+class DeadlineTests(unittest.IsolatedAsyncioTestCase):
+    async def test_timeout_is_clamped_to_what_is_left(self):
+        self.assertEqual(deadline.timeout(15.0), 15.0)
+
+        deadline.start(2.0)
+
+        self.assertLessEqual(deadline.timeout(15.0), 2.0)
+        self.assertEqual(deadline.timeout(1.0), 1.0)
+
+    async def test_expired_deadline_raises_a_request_error(self):
+        deadline.start(0)
+
+        with self.assertRaises(httpx.RequestError):
+            deadline.timeout(15.0)
+
+    async def test_unbounded_tasks_do_not_inherit_the_deadline(self):
+        deadline.start(1.0)
+
+        inner = await asyncio.create_task(deadline.unbounded(asyncio.sleep(0, result="ok")))
+        left = await asyncio.create_task(deadline.unbounded(self._remaining()))
+
+        self.assertEqual(inner, "ok")
+        self.assertIsNone(left)
+        self.assertIsNotNone(deadline.remaining())
+
+    async def _remaining(self):
+        return deadline.remaining()
+
+
+class GatewayDeadlineTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        st_gateway.reset()
+        self.addCleanup(st_gateway.reset)
+        self.timeouts = []
+        self.outcomes = []
+
+        test = self
+
+        class Client:
+            async def request(self, method, url, **kwargs):
+                test.timeouts.append(kwargs["timeout"])
+                outcome = test.outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+        patcher = patch.object(st_client, "_client", Client())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_attempt_timeout_is_the_remaining_budget(self):
+        self.outcomes = [httpx.Response(200)]
+        deadline.start(3.0)
+
+        await st_gateway.get("https://st/customers", route="customers", timeout=15.0)
+
+        self.assertLessEqual(self.timeouts[0], 3.0)
+
+    async def test_no_retry_when_the_backoff_does_not_fit(self):
+        self.outcomes = [httpx.Response(503), httpx.Response(200)]
+        deadline.start(0.01)
+
+        with patch.object(st_gateway, "_backoff", return_value=0.5):
+            resp = await st_gateway.get("https://st/customers", route="customers")
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.timeouts), 1)
+
+    async def test_timeout_past_the_deadline_does_not_trip_the_breaker(self):
+        self.outcomes = [httpx.ReadTimeout("slow")]
+        deadline.start(0.01)
+        await asyncio.sleep(0.02)  # the request "took" longer than the budget
+
+        with patch.object(deadline, "timeout", return_value=0.01), \
+                self.assertRaises(deadline.DeadlineExceeded):
+            await st_gateway.get("https://st/customers", route="customers")
+
+        self.assertEqual(len(self.timeouts), 1)
+        self.assertEqual(st_gateway._breaker("customers").failures, 0)
+
+    async def test_expired_deadline_sends_nothing(self):
+        deadline.start(0)
+
+        with self.assertRaises(deadline.DeadlineExceeded):
+            await st_gateway.get("https://st/customers", route="customers")
+
+        self.assertEqual(self.timeouts, [])
+
+
+class CheckAvailabilityDeadlineTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._capacity_cache.clear()
+        availability_index._index.clear()
+        self.addCleanup(main._capacity_cache.clear)
+
+    async def test_returns_a_later_window_that_arrived_before_the_deadline(self):
+        async def fake_post(url, route=None, headers=None, json=None, timeout=None):
+            if json["startsOnOrAfter"] == "2026-07-15T10:00:00Z":
+                # ST never answers the first window: the gateway gives up at the deadline.
+                await asyncio.sleep(deadline.remaining())
+                raise deadline.DeadlineExceeded()
+            return httpx.Response(200, json={"availabilities": [
+                {"start": "2026-07-23T08:00:00Z", "end": "2026-07-23T11:00:00Z", "isAvailable": True}]})
+
+        deadline.start(0.05)
+        with patch.object(main.st_gateway, "post", side_effect=fake_post):
+            slots = await main.check_availability_time("2026-07-15T10:00:00Z", [40], 30, access_token="Bearer t")
+
+        self.assertEqual(slots, [{"start": "2026-07-23T08:00:00Z", "end": "2026-07-23T11:00:00Z"}])
+
+
+class ToolDeadlineDependencyTests(unittest.TestCase):
+    def test_tool_calls_run_with_the_header_deadline(self):
+        seen = []
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            seen.append(deadline.remaining())
+            return httpx.Response(200, json={"data": []})
+
+        main._customers_cache.clear()
+        self.addCleanup(main._customers_cache.clear)
+        with patch.object(main.st_gateway, "get", AsyncMock(side_effect=fake_get)), \
+                patch.object(main, "get_access_token", AsyncMock(return_value="Bearer t")), \
+                patch.object(main.config, "CALLER_PREFETCH_ENABLED", False):
+            TestClient(main.app).post("/findCustomer", json={"args": {"number": "6035550000"}},
+                                      headers={"X-Tool-Timeout-Ms": "3000"})
+
+        self.assertEqual(len(seen), 1)
+        self.assertTrue(0 < seen[0] <= 2.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+import config
+import gazetteer
+import geocode
+import main
+
+
+class GazetteerTests(unittest.TestCase):
+    def test_zip_centroid_distance_and_status(self):
+        place = gazetteer.locate("01970", "Salem", "MA")
+
+        self.assertEqual(place["source"], "zip")
+        self.assertEqual(place["place"], "01970 Salem MA")
+        self.assertEqual(place["status"], "in")
+        expected = gazetteer.haversine_miles(*config.SALEM_PO_BOX, place["lat"], place["lon"])
+        self.assertAlmostEqual(place["miles"], expected)
+
+    def test_spoken_state_and_zip_plus_four_are_understood(self):
+        self.assertEqual(gazetteer.locate("03079-1234", "salem", "New Hampshire")["place"], "03079 Salem NH")
+
+    def test_zip_from_another_state_falls_back_to_the_town(self):
+        place = gazetteer.locate("01970", "Salem", "NH")
+
+        self.assertEqual(place["source"], "town")
+        self.assertEqual(place["place"], "Salem NH")
+
+    def test_unknown_places_are_not_guessed(self):
+        self.assertIsNone(gazetteer.locate("99999", "Springfield", "VT"))
+        self.assertIsNone(gazetteer.zip_status("05101"))
+
+    def test_missing_data_file_leaves_an_empty_gazetteer(self):
+        self.addCleanup(gazetteer.load)
+        gz = gazetteer.load("/nonexistent/zips.csv")
+
+        self.assertEqual(len(gz), 0)
+        self.assertIsNone(gazetteer.locate("01970", "Salem", "MA"))
+
+
+class ServiceAreaTests(unittest.TestCase):
+    def test_area_is_split_into_inside_boundary_and_outside(self):
+        current = gazetteer.area()
+
+        self.assertIsInstance(current.zips, frozenset)
+        self.assertTrue(current.zips.isdisjoint(current.boundary_zips))
+        self.assertEqual(gazetteer.zip_status("03079"), "in")
+        self.assertEqual(gazetteer.zip_status("01240"), "out")
+        for zip_code in current.boundary_zips:
+            i = gazetteer._loaded().zip_index[zip_code]
+            self.assertLessEqual(abs(current.miles[i] - config.SERVICE_RADIUS_MILES),
+                                 config.GAZETTEER_REFINE_MARGIN)
+
+    def test_area_is_rebuilt_when_the_radius_changes(self):
+        before = gazetteer.area()
+
+        with patch.object(config, "SERVICE_RADIUS_MILES", 5.0):
+            smaller = gazetteer.area()
+            self.assertEqual(gazetteer.zip_status("01970"), "out")
+
+        self.assertLess(len(smaller.zips), len(before.zips))
+        self.assertEqual(gazetteer.zip_status("01970"), "in")
+
+    def test_suggest_zip_falls_back_to_in_area_town_zips(self):
+        self.assertNotIn("pelham|nh", config.CITY_ZIPS)
+
+        result = TestClient(main.app).post("/suggestZip", json={"args": {"city": "Pelham", "state": "NH"}}).json()
+
+        self.assertEqual(result["status"], "single")
+        self.assertEqual(result["zip"], "03076")
+
+
+class CheckWorkAreaGazetteerTests(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(geocode, "lookup", AsyncMock(side_effect=AssertionError("network geocode")))
+        self.lookup = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _check(self, city, state, zip_code):
+        self.assertNotIn(city.lower(), config.CITIES)
+        return TestClient(main.app).post("/checkWorkArea", json={
+            "args": {"street": "1 Main St", "city": city, "state": state, "zip": zip_code, "country": "USA"},
+        }).json()
+
+    def test_nearby_town_is_answered_without_the_network(self):
+        self.assertEqual(self._check("Pelham", "NH", "03076"), {"message": "Address is in the working area."})
+
+    def test_far_town_is_rejected_without_the_network(self):
+        self.assertEqual(self._check("Lenox", "MA", "01240"),
+                         {"error": "There are no services available in the area."})
+
+    def test_edge_cases_use_the_local_answer_when_geocode_is_down(self):
+        self.lookup.side_effect = geocode.GeocodeUnavailable("down")
+
+        with patch.object(config, "GAZETTEER_REFINE_MARGIN", 1000.0):
+            result = self._check("Lenox", "MA", "01240")
+
+        self.lookup.assert_awaited_once()
+        self.assertEqual(result, {"error": "There are no services available in the area."})
+
+
+if __name__ == "__main__":
+    unittest.main()
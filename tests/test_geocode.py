@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import config
+import geocode
+import main
+
+SALEM = {"latt": "42.52", "longt": "-70.90", "standard": {"postal": "01970-1234"}}
+
+
+class GeocodeTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "geocode.sqlite3")
+        self.responses = []
+        self.requested = []
+
+        async def fake_get(url, params=None, timeout=None):
+            self.requested.append(url)
+            outcome = self.responses.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        client = AsyncMock()
+        client.get.side_effect = fake_get
+        for target, name, value in ((config, "GEOCODE_CACHE_PATH", self.path),
+                                    (geocode, "_db", None),
+                                    (geocode, "_client", client)):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self._close)
+        geocode.clear()
+
+    def _close(self):
+        if geocode._db is not None:
+            geocode._db.close()
+
+
+class GeocodeCacheTests(GeocodeTestCase):
+    def test_equivalent_addresses_share_a_cache_key(self):
+        self.assertEqual(geocode.cache_key("12 Main Street, Apt. 4", "Salem", "Massachusetts"),
+                         geocode.cache_key("12 main st apt 4", " salem ", "MA"))
+
+    async def test_repeat_lookups_do_not_leave_the_process(self):
+        self.responses = [httpx.Response(200, json=SALEM)]
+
+        first = await geocode.lookup("12 Main Street", "Salem", "MA")
+        second = await geocode.lookup("12 main st", "salem", "ma")
+
+        self.assertEqual(first, {"lat": 42.52, "lon": -70.90, "postal": "01970"})
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.requested), 1)
+
+    async def test_not_found_is_cached_but_failures_are_not(self):
+        self.responses = [httpx.Response(503), httpx.Response(200, json={"error": {"code": "018"}})]
+
+        with self.assertRaises(geocode.GeocodeUnavailable):
+            await geocode.lookup("1 Nowhere Rd", "Salem", "MA")
+        self.assertIsNone(await geocode.lookup("1 Nowhere Rd", "Salem", "MA"))
+        self.assertIsNone(await geocode.lookup("1 Nowhere Rd", "Salem", "MA"))
+
+        self.assertEqual(len(self.requested), 2)
+        self.assertEqual(geocode.stats["negative_hits"], 1)
+
+    async def test_least_recently_used_entries_are_evicted(self):
+        self.responses = [httpx.Response(200, json=SALEM) for _ in range(4)]
+        with patch.object(config, "GEOCODE_CACHE_MAX_ENTRIES", 2):
+            await geocode.lookup("1 A St", "Salem", "MA")
+            await geocode.lookup("2 B St", "Salem", "MA")
+            await geocode.lookup("1 A St", "Salem", "MA")   # touch: B is now the oldest
+            await geocode.lookup("3 C St", "Salem", "MA")
+            await geocode.lookup("1 A St", "Salem", "MA")
+            await geocode.lookup("2 B St", "Salem", "MA")
+
+        self.assertEqual(len(self.requested), 4)
+        self.assertEqual(geocode.size(), 2)
+
+    async def test_cache_hits_do_not_write_to_disk(self):
+        self.responses = [httpx.Response(200, json=SALEM)]
+        await geocode.lookup("12 Main St", "Salem", "MA")
+        writes = geocode._db.total_changes
+
+        for _ in range(5):
+            await geocode.lookup("12 Main St", "Salem", "MA")
+
+        self.assertEqual(geocode._db.total_changes, writes)
+        self.assertEqual(geocode.stats["hits"], 5)
+        self.assertIn(geocode.cache_key("12 Main St", "Salem", "MA"), geocode._touched)
+
+    async def test_pending_touches_are_written_on_shutdown(self):
+        self.responses = [httpx.Response(200, json=SALEM)]
+        await geocode.lookup("12 Main St", "Salem", "MA")
+        key = geocode.cache_key("12 Main St", "Salem", "MA")
+        await geocode.lookup("12 Main St", "Salem", "MA")
+        touched = geocode._touched[key]
+
+        await geocode.shutdown()
+
+        last_used = geocode._conn().execute("SELECT last_used FROM geocode WHERE key = ?", (key,)).fetchone()[0]
+        self.assertEqual(last_used, touched)
+        self.assertEqual(geocode._rows, 1)
+
+    async def test_cache_survives_a_restart(self):
+        self.responses = [httpx.Response(200, json=SALEM)]
+        await geocode.lookup("12 Main St", "Salem", "MA")
+
+        await geocode.shutdown()
+        geocode._client = AsyncMock(get=AsyncMock(side_effect=AssertionError("should be cached")))
+
+        self.assertEqual((await geocode.lookup("12 Main St", "Salem", "MA"))["postal"], "01970")
+
+
+class CheckWorkAreaTests(GeocodeTestCase):
+    def _check(self, city, state="MA", zip_code="00000"):
+        # Neither the ZIP nor the town is in the local gazetteer: the network geocode decides.
+        return TestClient(main.app).post("/checkWorkArea", json={
+            "args": {"street": "12 Main St", "city": city, "state": state, "zip": zip_code, "country": "USA"},
+        }).json()
+
+    def test_out_of_list_city_is_checked_by_distance_once(self):
+        self.responses = [httpx.Response(200, json=SALEM)]
+
+        self.assertEqual(self._check("Witch Hollow")["message"], "Address is in the working area.")
+        self.assertEqual(self._check("Witch Hollow")["message"], "Address is in the working area.")
+        self.assertEqual(len(self.requested), 1)
+
+    def test_geocode_outage_fails_open_inside_the_service_states(self):
+        self.responses = [httpx.ConnectError("down")]
+
+        self.assertEqual(self._check("Witch Hollow")["geocode_validation"], "pending")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+import deadline
+import job_summary
+import main
+import utils
+
+
+class JobSummaryBufferTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        job_summary._known.clear()
+        job_summary._pending.clear()
+        self.addCleanup(job_summary._known.clear)
+        self.gets = 0
+        self.patches = []
+        self.patch_deadlines = []
+        self.patch_status = 200
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            self.gets += 1
+            return httpx.Response(200, json={"id": 7, "summary": "<p>booked</p>"})
+
+        async def fake_patch(url, route=None, headers=None, json=None, timeout=None):
+            self.patches.append(json["summary"])
+            self.patch_deadlines.append(deadline.remaining())
+            await asyncio.sleep(0.02)
+            return httpx.Response(self.patch_status, text="" if self.patch_status == 200 else "boom")
+
+        for target, name, value in ((main.st_gateway, "get", AsyncMock(side_effect=fake_get)),
+                                    (main.st_gateway, "patch", AsyncMock(side_effect=fake_patch)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t")),
+                                    (main.config, "SUMMARY_DEBOUNCE", 0.01)):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _append(self, note, job_id=7):
+        return job_summary.append(job_id, f"<p>{note}</p>", main._load_job_summary, main._save_job_summary)
+
+    async def test_concurrent_notes_are_coalesced_into_one_patch(self):
+        results = await asyncio.gather(self._append("a"), self._append("b"), self._append("c"))
+
+        self.assertEqual(results, [{"status": "Job summary updated"}] * 3)
+        self.assertEqual(self.patches, ["<p>booked</p>\n\n<p>a</p>\n\n<p>b</p>\n\n<p>c</p>"])
+        self.assertEqual(self.gets, 1)
+
+    async def test_known_summary_skips_the_get(self):
+        job_summary.remember(7, "<p>from createJob</p>")
+
+        await self._append("a")
+        await self._append("b")
+
+        self.assertEqual(self.gets, 0)
+        self.assertEqual(self.patches[-1], "<p>from createJob</p>\n\n<p>a</p>\n\n<p>b</p>")
+
+    async def test_note_arriving_during_a_flush_builds_on_the_new_summary(self):
+        first = asyncio.create_task(self._append("a"))
+        await asyncio.sleep(0.015)  # first flush is now waiting on its PATCH
+        second = await self._append("b")
+        await first
+
+        self.assertEqual(second, {"status": "Job summary updated"})
+        self.assertEqual(self.patches, ["<p>booked</p>\n\n<p>a</p>",
+                                        "<p>booked</p>\n\n<p>a</p>\n\n<p>b</p>"])
+
+    async def test_failed_patch_is_reported_to_every_waiter_and_summary_is_reread(self):
+        self.patch_status = 500
+
+        results = await asyncio.gather(self._append("a"), self._append("b"))
+        self.patch_status = 200
+        await self._append("c")
+
+        self.assertTrue(all(r["error"] == "Failed to update job summary." for r in results))
+        self.assertEqual(self.gets, 2)
+        self.assertEqual(self.patches[-1], "<p>booked</p>\n\n<p>c</p>")
+
+
+    async def test_shared_patch_does_not_run_under_the_first_callers_deadline(self):
+        async def first_caller():
+            deadline.start(0.001)
+            return await self._append("a")
+
+        results = await asyncio.gather(asyncio.create_task(first_caller()), self._append("b"))
+
+        self.assertEqual(results, [{"status": "Job summary updated"}] * 2)
+        self.assertEqual(self.patch_deadlines, [None])
+
+    async def test_cancelled_flush_still_answers_every_waiter(self):
+        job_summary.remember(7, "<p>from createJob</p>")
+        waiters = [asyncio.create_task(self._append(n)) for n in ("a", "b")]
+        await asyncio.sleep(0)
+        flushing = asyncio.create_task(job_summary.flush_all(main._load_job_summary, main._save_job_summary))
+        await asyncio.sleep(0.005)  # flush is now waiting on its PATCH
+        flushing.cancel()
+
+        results = await asyncio.wait_for(asyncio.gather(*waiters), timeout=1)
+
+        self.assertTrue(all(r["error"] == "Failed to update job summary." for r in results))
+        self.assertIsNone(job_summary._known.get(7))
+
+    async def test_stale_known_summary_is_reread_before_composing(self):
+        job_summary.remember(7, "<p>from createJob</p>")
+        expires_at, value = job_summary._known._data[7]
+        job_summary._known._data[7] = (expires_at - main.config.SUMMARY_BASE_TTL - 1, value)
+
+        await self._append("a")
+
+        self.assertEqual(self.gets, 1)
+        self.assertEqual(self.patches, ["<p>booked</p>\n\n<p>a</p>"])
+
+    async def test_clear_call_data_flushes_the_calls_pending_notes(self):
+        main.call_sessions["call-summary-1"] = {"_ts": 0, "_summaryJobs": {7}}
+        self.addCleanup(main.call_sessions.pop, "call-summary-1", None)
+
+        with patch.object(main.config, "SUMMARY_DEBOUNCE", 60), \
+                patch.object(main, "_resolve_call_id", AsyncMock(return_value="call-summary-1")):
+            note = asyncio.create_task(self._append("a"))
+            await asyncio.sleep(0)
+            cleared = await main.clear_call_data(utils.ClearCallDataToolRequest(args={}), None)
+            result = await asyncio.wait_for(note, 1)
+
+        self.assertEqual(cleared, {"status": "cleared"})
+        self.assertEqual(result, {"status": "Job summary updated"})
+        self.assertEqual(self.patches, ["<p>booked</p>\n\n<p>a</p>"])
+
+if __name__ == "__main__":
+    unittest.main()
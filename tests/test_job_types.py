@@ -0,0 +1,88 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _job_types(*pairs):
+    return httpx.Response(200, json={"data": [{"id": jt, "businessUnitIds": bus} for jt, bus in pairs]})
+
+
+class JobTypesCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._reset()
+        self.addCleanup(self._reset)
+        self.responses = []
+        self.calls = 0
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            outcome = self.responses.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        patcher = patch.object(main.st_gateway, "get", side_effect=fake_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _reset():
+        main._job_types_cache.update(data=None, ts=0.0)
+        main._job_types_refresh = None
+        for counter in main._job_types_stats:
+            main._job_types_stats[counter] = 0
+
+    async def test_concurrent_cold_lookups_share_one_fetch(self):
+        self.responses = [_job_types((30, [40]))]
+
+        results = await asyncio.gather(*[main._get_job_types({}) for _ in range(5)])
+
+        self.assertEqual(results, [{30: [40]}] * 5)
+        self.assertEqual(self.calls, 1)
+
+    async def test_expired_mapping_is_served_while_one_background_refresh_runs(self):
+        main._job_types_cache.update(data={30: [40]}, ts=time.time() - main._JOB_TYPES_TTL - 1)
+        self.responses = [_job_types((30, [40, 41]))]
+
+        first, second = await asyncio.gather(main._get_job_types({}), main._get_job_types({}))
+        self.assertEqual((first, second), ({30: [40]}, {30: [40]}))
+
+        await main._job_types_refresh
+        self.assertEqual(await main._get_job_types({}), {30: [40, 41]})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(main._job_types_stats["stale_hits"], 2)
+
+    async def test_failed_refresh_keeps_last_good_mapping(self):
+        main._job_types_cache.update(data={30: [40]}, ts=time.time() - main._JOB_TYPES_TTL - 1)
+        self.responses = [httpx.Response(503, text="down"), httpx.ConnectError("down")]
+
+        for _ in range(2):
+            await main._get_job_types({})
+            await main._job_types_refresh
+
+        self.assertEqual(main._job_types_cache["data"], {30: [40]})
+        self.assertEqual(main._job_types_stats["refresh_errors"], 2)
+
+    async def test_cold_failure_returns_empty_mapping(self):
+        self.responses = [httpx.Response(500, text="boom")]
+
+        self.assertEqual(await main._get_job_types({}), {})
+
+    def test_stats_endpoint_exposes_counters(self):
+        main._job_types_cache.update(data={30: [40]}, ts=time.time())
+
+        stats = TestClient(main.app).get("/cacheStats").json()
+
+        self.assertEqual(stats["jobTypes"]["size"], 1)
+        self.assertIn("capacity", stats["caches"])
+
+
+if __name__ == "__main__":
+    unittest.main()
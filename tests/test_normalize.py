@@ -0,0 +1,120 @@
+import json
+import random
+import re
+import unittest
+from pathlib import Path
+
+import normalize
+
+CORPUS = json.loads((Path(__file__).parent / "fixtures" / "normalize_corpus.json").read_text())["cases"]
+
+
+# Implementación anterior (regex por llamada, varias pasadas), congelada como
+# referencia: el tokenizer de una pasada tiene que dar exactamente lo mismo.
+def _reference_spoken_to_digits(text):
+    out, repeat = [], 1
+    for tok in re.split(r"[\s,\-\.]+", text.lower()):
+        if not tok:
+            continue
+        if tok in normalize._MULTIPLIERS:
+            repeat = normalize._MULTIPLIERS[tok]
+            continue
+        if tok in normalize._DIGIT_WORDS:
+            out.append(normalize._DIGIT_WORDS[tok] * repeat)
+        elif tok.isdigit():
+            out.append(tok * repeat if repeat > 1 and len(tok) == 1 else tok)
+        repeat = 1
+    return "".join(out)
+
+
+def _reference_phone(raw):
+    if not isinstance(raw, str) or not raw.strip():
+        return raw
+    s = raw.strip()
+    stripped = re.sub(r"[()\s\-\.]", "", s)
+    if re.fullmatch(r"\+?\d+", stripped):
+        return stripped
+    return _reference_spoken_to_digits(s) or s
+
+
+def _reference_email(raw):
+    if not isinstance(raw, str) or not raw.strip():
+        return raw
+    s = raw.strip()
+    if " " not in s and "@" in s:
+        return s.lower()
+    parts = []
+    for tok in re.split(r"\s+", s.lower()):
+        tok = tok.strip(",;:")
+        if not tok:
+            continue
+        if tok in normalize._EMAIL_SYMBOLS:
+            parts.append(normalize._EMAIL_SYMBOLS[tok])
+        elif tok in normalize._EMAIL_DIGIT_WORDS:
+            parts.append(normalize._EMAIL_DIGIT_WORDS[tok])
+        else:
+            parts.append(tok)
+    candidate = "".join(parts)
+    return candidate if re.fullmatch(r"[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}", candidate) else s
+
+
+def _reference_zip(raw):
+    if not isinstance(raw, str) or not raw.strip():
+        return raw
+    s = raw.strip()
+    digits = re.sub(r"\D", "", s) or _reference_spoken_to_digits(s)
+    if len(digits) >= 5:
+        return digits[:5]
+    return digits if digits else s
+
+
+REFERENCE = {
+    "phone": (normalize.normalize_phone, _reference_phone),
+    "email": (normalize.normalize_email, _reference_email),
+    "zip": (normalize.normalize_zip, _reference_zip),
+}
+
+
+class NormalizeCorpusTests(unittest.TestCase):
+    def test_corpus_values_normalize_as_recorded(self):
+        for case in CORPUS:
+            with self.subTest(**case):
+                self.assertEqual(normalize.normalize_call_field(case["field"], case["input"]), case["expected"])
+
+    def test_memoized_results_are_identical_to_cold_ones(self):
+        for case in CORPUS:
+            first = normalize.normalize_call_field(case["field"], case["input"])
+            self.assertEqual(normalize.normalize_call_field(case["field"], case["input"]), first)
+        self.assertGreater(normalize.cache_stats()["phone"]["hits"], 0)
+
+    def test_non_strings_and_blanks_pass_through(self):
+        for value in (None, 1234, "", "   "):
+            self.assertIs(normalize.normalize_phone(value), value)
+            self.assertIs(normalize.normalize_email(value), value)
+            self.assertIs(normalize.normalize_zip(value), value)
+
+
+class NormalizeEquivalenceTests(unittest.TestCase):
+    """El tokenizer de una pasada contra la implementación anterior."""
+
+    ALPHABET = (["six", "oh", "o", "double", "triple", "at", "dot", "dash", "to", "for", "one", "my", "is",
+                 "gmail", "com", "@", ".", "-", ",", "(", ")", "+", "603", "5", "01970-1234", "\t", "  ", "²", "٣",
+                 "İ", "(603)", "+1", "a1", "()"])
+
+    def test_corpus_matches_the_reference_implementation(self):
+        for case in CORPUS:
+            for name, (engine, reference) in REFERENCE.items():
+                with self.subTest(normalizer=name, value=case["input"]):
+                    self.assertEqual(engine(case["input"]), reference(case["input"]))
+
+    def test_random_dictations_match_the_reference_implementation(self):
+        rng = random.Random(25)
+        for _ in range(3000):
+            value = "".join(rng.choice(self.ALPHABET) + rng.choice(["", " ", ", "])
+                            for _ in range(rng.randint(1, 12)))
+            for name, (engine, reference) in REFERENCE.items():
+                self.assertEqual(engine(value), reference(value), f"{name}: {value!r}")
+
+
+if __name__ == "__main__":
+    unittest.main()
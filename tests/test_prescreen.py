@@ -0,0 +1,170 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import config
+import gazetteer
+import main
+import prescreen
+
+CONTACTS = [
+    {"phone": "+1 (603) 555-0101", "city": "Pelham", "state": "NH", "zip": "03076"},
+    {"phone": "603-555-0101", "city": "Salem", "state": "NH"},          # same person, listed twice
+    {"phone": "413 555 0102", "city": "Lenox", "state": "MA", "zip": "01240"},
+    {"phone": "555-0103", "lat": 42.7, "lon": -71.2},
+    {"phone": "6035550104", "city": "Nowhere", "state": "VT"},
+]
+
+
+class AreaScreeningTests(unittest.TestCase):
+    def test_vectorized_and_pure_python_distances_agree(self):
+        lats, lons = [42.5147, 42.3665, 43.2], [-70.9075, -73.2711, -71.5]
+
+        vectorized = prescreen.distances_miles(lats, lons, config.SALEM_PO_BOX)
+        with patch.object(prescreen, "np", None):
+            fallback = prescreen.distances_miles(lats, lons, config.SALEM_PO_BOX)
+
+        for a, b in zip(vectorized, fallback):
+            self.assertAlmostEqual(a, b, places=6)
+
+    def test_each_contact_gets_an_area_verdict(self):
+        areas = [r["area"] for r in prescreen.screen_area(CONTACTS)]
+
+        self.assertEqual(areas, ["in", "in", "out", "in", "unknown"])
+
+    def test_boundary_contacts_are_flagged(self):
+        place = gazetteer.locate("03076", "Pelham", "NH")
+        with patch.object(config, "SERVICE_RADIUS_MILES", place["miles"] + 1):
+            self.assertEqual(prescreen.screen_area(CONTACTS[:1])[0]["area"], "boundary")
+
+
+class ScreenTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        prescreen._daily_availability.clear()
+        self.addCleanup(prescreen._daily_availability.clear)
+        self.looked_up = []
+
+    async def find_customers(self, phone):
+        self.looked_up.append(phone)
+        await asyncio.sleep(0)
+        return 200, [{"id": 10}] if phone == "6035550101" else []
+
+    async def test_customers_are_matched_once_per_phone_and_never_for_out_of_area(self):
+        result = await prescreen.screen(CONTACTS, find_customers=self.find_customers)
+
+        self.assertEqual(sorted(self.looked_up), ["6035550101", "6035550104"])
+        rows = result["contacts"]
+        self.assertEqual([r["customerIds"] for r in rows], [[10], [10], None, None, []])
+        self.assertEqual([r["dial"] for r in rows], [True, True, False, False, True])
+        self.assertEqual(result["summary"]["invalidPhone"], 1)
+        self.assertEqual(result["summary"]["existingCustomers"], 2)
+
+    async def test_availability_is_fetched_once_per_day(self):
+        fetch = AsyncMock(return_value=[{"start": f"2026-10-2{i}T12:00:00Z"} for i in range(9)])
+
+        first = await prescreen.screen(CONTACTS, fetch_slots=fetch)
+        second = await prescreen.screen(CONTACTS, fetch_slots=fetch)
+
+        fetch.assert_awaited_once()
+        self.assertEqual(first["availability"], second["availability"])
+        self.assertEqual(len(first["availability"]["slots"]), config.PRESCREEN_AVAILABILITY_SLOTS)
+
+    async def test_failed_availability_is_not_cached(self):
+        fetch = AsyncMock(side_effect=[None, []])
+
+        self.assertIn("error", (await prescreen.screen([], fetch_slots=fetch))["availability"])
+        self.assertEqual((await prescreen.screen([], fetch_slots=fetch))["availability"]["slots"], [])
+
+
+class PrescreenEndpointTests(unittest.TestCase):
+    def setUp(self):
+        prescreen._daily_availability.clear()
+        self.addCleanup(prescreen._daily_availability.clear)
+        patcher = patch.object(config, "PRESCREEN_TOKEN", "s3cret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, token="s3cret"):
+        headers = {"X-Prescreen-Token": token} if token is not None else {}
+        return TestClient(main.app).post("/prescreenOutbound", json={"contacts": CONTACTS}, headers=headers)
+
+    def test_endpoint_screens_the_list(self):
+        with patch.object(main, "_find_customers_by_phone_bulk", AsyncMock(return_value=(200, []))) as find, \
+                patch.object(main, "check_availability_time", AsyncMock(return_value=[])) as slots:
+            result = self._post().json()
+
+        self.assertEqual(result["summary"]["total"], 5)
+        self.assertEqual(find.await_count, 2)
+        slots.assert_awaited_once()
+        self.assertEqual(slots.await_args.args[1:], ([config.OUTBOUND_BUSINESS_UNIT_ID], config.OUTBOUND_JOB_TYPE_ID))
+
+    def test_shared_secret_is_required(self):
+        with patch.object(main, "_find_customers_by_phone_bulk", AsyncMock()) as find:
+            self.assertEqual(self._post(token=None).status_code, 401)
+            self.assertEqual(self._post(token="wrong").status_code, 401)
+            with patch.object(config, "PRESCREEN_TOKEN", ""):
+                self.assertEqual(self._post(token="").status_code, 401)
+
+        find.assert_not_awaited()
+
+    def test_oversized_lists_are_rejected(self):
+        with patch.object(config, "PRESCREEN_MAX_CONTACTS", 2):
+            result = self._post().json()
+
+        self.assertIn("error", result)
+
+
+class BulkCustomerLookupTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        main._customers_cache.clear()
+        self.addCleanup(main._customers_cache.clear)
+        self.routes = []
+
+        async def fake_get(url, route=None, headers=None, timeout=None):
+            self.routes.append(route)
+            return httpx.Response(200, json={"data": [{"id": 10}]})
+
+        for target, name, value in ((main.st_gateway, "get", AsyncMock(side_effect=fake_get)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t"))):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_bulk_lookups_use_their_own_route_and_skip_the_live_call_cache(self):
+        self.assertEqual(await main._find_customers_by_phone_bulk("603-555-0101"), (200, [{"id": 10}]))
+        self.assertEqual(await main._find_customers_by_phone_bulk("unknown"), (200, []))
+
+        self.assertEqual(self.routes, ["customers_bulk"])
+        self.assertEqual(len(main._customers_cache), 0)
+
+    def test_phones_use_the_shared_ten_digit_key(self):
+        self.assertEqual(prescreen._phone("+1 (603) 555-0101"), main._phone_key("6035550101"))
+        self.assertEqual(prescreen._phone("six oh three five five five oh one oh one"), "6035550101")
+        self.assertIsNone(prescreen._phone("anonymous"))
+
+
+class PrescreenCliTests(unittest.IsolatedAsyncioTestCase):
+    async def test_cli_writes_one_row_per_contact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "contacts.csv")
+            with open(path, "w", newline="") as f:
+                f.write("Name,Phone,City,State,Zip\nJane,603-555-0101,Pelham,NH,03076\nBob,413-555-0102,Lenox,MA,01240\n")
+            out = io.StringIO()
+            with patch.object(main, "_has_st_credentials", return_value=False), \
+                    patch("sys.stderr", io.StringIO()):
+                await prescreen._cli(path, out=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "name,phone,area,miles,place,customerIds,dial")
+        self.assertTrue(lines[1].startswith("Jane,6035550101,in,"))
+        self.assertTrue(lines[2].startswith("Bob,4135550102,out,"))
+
+
+if __name__ == "__main__":
+    unittest.main()
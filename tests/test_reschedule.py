@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+
+
+class RescheduleAppointmentTests(unittest.TestCase):
+    def setUp(self):
+        main.idempotency_cache.clear()
+        self.addCleanup(main.idempotency_cache.clear)
+        self.client = TestClient(main.app)
+        self.calls = []
+        self.outcomes = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def fake_patch(url, route=None, json=None, headers=None, timeout=None):
+            self.calls.append(url.rsplit("/", 1)[-1])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            outcome = self.outcomes.get(route, httpx.Response(200, json={}))
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        for target, name, value in ((main.st_gateway, "patch", AsyncMock(side_effect=fake_patch)),
+                                    (main, "get_access_token", AsyncMock(return_value="Bearer t")),
+                                    (main, "_spawn_background", MagicMock()),
+                                    (main, "_reassign_technicians", MagicMock())):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _reschedule(self, call_id, employee_id=55):
+        return self.client.post("/rescheduleAppointment", json={
+            "args": {"newSchedule": "2026-10-20T09:00:00", "jobTypeId": 1, "businessUnitId": 2,
+                     "appointmentId": 700, "employeeId": employee_id},
+            "call": {"call_id": call_id},
+        }).json()
+
+    def test_unassign_runs_before_the_reschedule(self):
+        result = self._reschedule("call-resched-1")
+
+        self.assertEqual(result, {"status": "rescheduleAppointment request processed successfully"})
+        self.assertEqual(self.calls, ["unassign-technicians", "reschedule"])
+        self.assertEqual(self.max_in_flight, 1)
+        main._spawn_background.assert_not_called()
+
+    def test_without_technician_only_reschedules(self):
+        self._reschedule("call-resched-2", employee_id=None)
+
+        self.assertEqual(self.calls, ["reschedule"])
+
+    def test_failed_reschedule_after_unassign_reassigns_in_background(self):
+        self.outcomes["reschedule"] = httpx.Response(409, text="slot taken")
+
+        result = self._reschedule("call-resched-3")
+
+        self.assertEqual(result["error"], "Request error: 409")
+        main._spawn_background.assert_called_once()
+        main._reassign_technicians.assert_called_once_with(700, [55])
+
+    def test_reschedule_timeout_does_not_reassign_blindly(self):
+        self.outcomes["reschedule"] = httpx.ReadTimeout("slow")
+
+        with patch.object(main.logger, "error") as log:
+            result = self._reschedule("call-resched-5")
+
+        self.assertIn("error", result)
+        main._spawn_background.assert_not_called()
+        self.assertTrue(any("quedó sin técnico" in c.args[0] for c in log.call_args_list))
+
+    def test_known_previous_slot_scopes_the_capacity_invalidation(self):
+        previous = {"appointmentId": 700, "start": "2026-10-19T13:00:00-04:00",
+                    "end": "2026-10-19T16:00:00-04:00", "jobTypeId": 1, "businessUnitId": 2}
+        with patch.object(main.appointments, "cached_appointment", return_value=previous), \
+                patch.object(main, "_invalidate_capacity") as invalidate:
+            self._reschedule("call-resched-6")
+
+        self.assertEqual([c.args for c in invalidate.call_args_list], [
+            ("2026-10-19T13:00:00-04:00", "2026-10-19T16:00:00-04:00"),
+            ("2026-10-20T09:00:00Z", "2026-10-20T12:00:00"),
+        ])
+        self.assertEqual(invalidate.call_args.kwargs, {"job_type": 1, "business_unit": 2})
+
+    def test_unknown_previous_slot_invalidates_all_capacity(self):
+        with patch.object(main.appointments, "cached_appointment", return_value=None), \
+                patch.object(main, "_invalidate_capacity") as invalidate:
+            self._reschedule("call-resched-7")
+
+        invalidate.assert_called_once_with()
+
+    def test_failed_unassign_does_not_block_the_reschedule(self):
+        self.outcomes["assignments"] = httpx.Response(500, text="boom")
+        self.outcomes["reschedule"] = httpx.Response(409, text="slot taken")
+
+        self._reschedule("call-resched-4")
+
+        main._spawn_background.assert_not_called()
+
+
+class ReassignTechniciansTests(unittest.IsolatedAsyncioTestCase):
+    async def test_retries_until_st_accepts_the_assignment(self):
+        responses = [httpx.ConnectError("down"), httpx.Response(503, text="busy"), httpx.Response(200, json={})]
+        patcher = patch.object(main.st_gateway, "patch", AsyncMock(side_effect=responses))
+
+        with patcher as st_patch, patch.object(main, "get_access_token", AsyncMock(return_value="Bearer t")), \
+                patch.object(main.config, "REASSIGN_RETRY_DELAY", 0):
+            await main._reassign_technicians(700, [55])
+
+        self.assertEqual(st_patch.await_count, 3)
+        url = st_patch.await_args.args[0]
+        self.assertTrue(url.endswith("/appointment-assignments/assign-technicians"))
+        self.assertEqual(st_patch.await_args.kwargs["json"], {"jobAppointmentId": 700, "technicianIds": [55]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from fastapi.testclient import TestClient
+
+import main
+import st_client
+
+
+class SharedClientTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await st_client.shutdown()
+
+    async def test_get_client_returns_the_same_pooled_instance(self):
+        await st_client.startup()
+
+        first = st_client.get_client()
+        second = st_client.get_client()
+
+        self.assertIs(first, second)
+        self.assertFalse(first.is_closed)
+
+    async def test_shutdown_closes_the_pool_and_next_get_rebuilds_it(self):
+        await st_client.startup()
+        old = st_client.get_client()
+
+        await st_client.shutdown()
+
+        self.assertTrue(old.is_closed)
+        self.assertIsNot(st_client.get_client(), old)
+
+
+class LifespanTests(unittest.TestCase):
+    def test_app_lifespan_opens_and_closes_the_shared_client(self):
+        with TestClient(main.app):
+            client = st_client._client
+            self.assertIsNotNone(client)
+            self.assertFalse(client.is_closed)
+
+        self.assertIsNone(st_client._client)
+        self.assertTrue(client.is_closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
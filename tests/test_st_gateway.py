@@ -0,0 +1,262 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+import config
+import st_client
+import st_gateway
+
+URL = "https://api.servicetitan.io/crm/v2/tenant/t/customers?phone=6035551234"
+
+
+class ScriptedClient:
+    """Returns (or raises) the queued outcomes in order, one per request."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _resp(status, headers=None, payload=None):
+    return httpx.Response(status, headers=headers, json=payload or {})
+
+
+class GatewayTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        st_gateway.reset()
+        self.sleep = AsyncMock()
+        patcher = patch.object(st_gateway.asyncio, "sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(st_gateway.reset)
+
+    def use(self, outcomes):
+        client = ScriptedClient(outcomes)
+        patcher = patch.object(st_client, "_client", client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return client
+
+
+class RetryTests(GatewayTestCase):
+    async def test_read_is_retried_after_5xx(self):
+        client = self.use([_resp(503), _resp(200, payload={"data": []})])
+
+        resp = await st_gateway.get(URL, route="customers")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(client.calls), 2)
+
+    async def test_write_is_not_retried_after_5xx(self):
+        client = self.use([_resp(500), _resp(200)])
+
+        resp = await st_gateway.post(URL, route="job_create", json={})
+
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(len(client.calls), 1)
+
+    async def test_write_is_retried_when_connection_never_happened(self):
+        client = self.use([httpx.ConnectError("refused"), _resp(200)])
+
+        resp = await st_gateway.post(URL, route="job_create", json={})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(client.calls), 2)
+
+    async def test_429_waits_for_retry_after_then_retries(self):
+        client = self.use([_resp(429, headers={"Retry-After": "1"}), _resp(200)])
+
+        resp = await st_gateway.get(URL, route="customers")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(client.calls), 2)
+        self.sleep.assert_any_await(1.0)
+
+    async def test_429_with_long_retry_after_is_returned_without_retry(self):
+        client = self.use([_resp(429, headers={"Retry-After": "60"})])
+
+        resp = await st_gateway.get(URL, route="customers")
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(len(client.calls), 1)
+
+    async def test_retry_budget_stops_retries_when_exhausted(self):
+        budget = st_gateway._budget("customers")
+        budget.tokens = 0
+        budget.ratio = 0
+        client = self.use([_resp(503), _resp(200)])
+
+        resp = await st_gateway.get(URL, route="customers")
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(client.calls), 1)
+
+
+class CircuitBreakerTests(GatewayTestCase):
+    async def _trip(self, route):
+        breaker = st_gateway._breaker(route)
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+    async def test_open_circuit_serves_last_good_response_for_reads(self):
+        client = self.use([_resp(200, payload={"data": [{"id": 1}]})])
+        await st_gateway.get(URL, route="customers")
+        await self._trip("customers")
+
+        resp = await st_gateway.get(URL, route="customers")
+
+        self.assertEqual(resp.json(), {"data": [{"id": 1}]})
+        self.assertEqual(len(client.calls), 1)
+
+    async def test_open_circuit_without_cached_answer_fails_fast(self):
+        client = self.use([])
+        await self._trip("job_create")
+
+        with self.assertRaises(st_gateway.CircuitOpenError):
+            await st_gateway.post(URL, route="job_create", json={})
+
+        self.assertEqual(client.calls, [])
+
+    async def test_circuit_open_error_is_a_request_error(self):
+        self.assertTrue(issubclass(st_gateway.CircuitOpenError, httpx.RequestError))
+
+    async def test_half_open_probe_success_closes_the_circuit(self):
+        self.use([_resp(200)])
+        await self._trip("jobs")
+        breaker = st_gateway._breaker("jobs")
+        breaker.opened_at -= breaker.reset_timeout
+
+        resp = await st_gateway.get(URL, route="jobs")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+
+
+class GatedClient:
+    """Each request waits on its own future, so the test decides who answers first."""
+
+    def __init__(self):
+        self.pending = []
+
+    async def request(self, method, url, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        return await future
+
+
+class HedgingTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        st_gateway.reset()
+        self.addCleanup(st_gateway.reset)
+        self.client = GatedClient()
+        for target, name, value in ((st_client, "_client", self.client),
+                                    (config, "ST_HEDGE_ENABLED", True),
+                                    (config, "ST_HEDGE_MIN_SAMPLES", 5),
+                                    (config, "ST_HEDGE_MIN_DELAY", 0.01)):
+            patcher = patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def learn(self, route, seconds=0.01):
+        for _ in range(config.ST_HEDGE_MIN_SAMPLES):
+            st_gateway._latency(route).record(seconds)
+
+    async def wait_for_requests(self, n):
+        while len(self.client.pending) < n:
+            await asyncio.sleep(0.001)
+
+    async def test_slow_read_is_hedged_and_the_first_answer_wins(self):
+        self.learn("customers")
+        call = asyncio.create_task(st_gateway.get(URL, route="customers"))
+
+        await self.wait_for_requests(2)
+        self.client.pending[1].set_result(_resp(200, payload={"from": "hedge"}))
+        resp = await call
+
+        self.assertEqual(resp.json(), {"from": "hedge"})
+        self.assertTrue(self.client.pending[0].cancelled())
+        self.assertEqual(st_gateway.hedge_stats, {"sent": 1, "won": 1, "throttled": 0})
+
+    async def test_no_hedge_until_latency_is_learned(self):
+        call = asyncio.create_task(st_gateway.get(URL, route="customers"))
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.client.pending), 1)
+        self.client.pending[0].set_result(_resp(200))
+        await call
+
+    async def test_writes_are_never_hedged(self):
+        self.learn("job_create")
+        call = asyncio.create_task(st_gateway.post(URL, route="job_create", json={}))
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.client.pending), 1)
+        self.client.pending[0].set_result(_resp(200))
+        await call
+
+    async def test_hedge_budget_caps_extra_requests(self):
+        self.learn("customers")
+        with patch.object(config, "ST_HEDGE_BUDGET_BURST", 1.0), patch.object(config, "ST_HEDGE_BUDGET_RATIO", 0.0):
+            calls = [asyncio.create_task(st_gateway.get(URL, route="customers")) for _ in range(3)]
+            await asyncio.sleep(0.05)
+
+            self.assertEqual(len(self.client.pending), 4)  # 3 primaries + 1 hedge
+            self.assertEqual(st_gateway.hedge_stats["throttled"], 2)
+            for future in self.client.pending:
+                future.set_result(_resp(200))
+            await asyncio.gather(*calls)
+
+    async def test_failed_primary_falls_back_to_the_hedge(self):
+        self.learn("customers")
+        call = asyncio.create_task(st_gateway.get(URL, route="customers"))
+
+        await self.wait_for_requests(2)
+        self.client.pending[0].set_exception(httpx.ReadError("reset"))
+        await asyncio.sleep(0)
+        self.client.pending[1].set_result(_resp(200))
+
+        self.assertEqual((await call).status_code, 200)
+
+
+class BulkRouteTests(GatewayTestCase):
+    async def test_bulk_lookups_are_capped_in_flight(self):
+        client = GatedClient()
+        patcher = patch.object(st_client, "_client", client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        limit = st_gateway.ROUTE_POLICIES["customers_bulk"].max_concurrency
+
+        tasks = [asyncio.ensure_future(st_gateway.get(URL, route="customers_bulk")) for _ in range(limit + 3)]
+        await asyncio.wait(tasks, timeout=0.05)
+        self.assertEqual(len(client.pending), limit)
+
+        while not all(task.done() for task in tasks):
+            for future in client.pending:
+                if not future.done():
+                    future.set_result(_resp(200))
+            await asyncio.wait(tasks, timeout=0.05)
+        self.assertEqual(len(client.pending), limit + 3)
+
+    async def test_bulk_failures_do_not_open_the_live_call_circuit(self):
+        self.use([_resp(503)] * 10 + [_resp(200)])
+
+        for _ in range(config.ST_BREAKER_FAILURES):
+            await st_gateway.get(URL, route="customers_bulk")
+
+        self.assertEqual(st_gateway._breaker("customers_bulk").state, "open")
+        self.assertEqual((await st_gateway.get(URL, route="customers")).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
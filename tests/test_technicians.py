@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import main
+import technicians
+
+ROSTER = [
+    {"id": 1, "name": "Ana", "businessUnitId": 40},
+    {"id": 2, "name": "Bruno", "businessUnitId": 40},
+    {"id": 3, "name": "Carla", "businessUnitId": 41},
+]
+
+
+class TechnicianRosterTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        technicians._cache.clear()
+        self.addCleanup(technicians._cache.clear)
+
+    async def test_roster_is_indexed_by_business_unit_and_id(self):
+        roster = await technicians.roster(AsyncMock(return_value=ROSTER))
+
+        self.assertEqual([t["id"] for t in roster.for_business_unit(40)], [1, 2])
+        self.assertEqual(roster.for_business_unit(99), [])
+        self.assertEqual(roster.get(3)["name"], "Carla")
+
+    async def test_concurrent_lookups_download_the_roster_once(self):
+        async def slow_fetch():
+            await asyncio.sleep(0.01)
+            return ROSTER
+
+        fetch = AsyncMock(side_effect=slow_fetch)
+
+        await asyncio.gather(*[technicians.roster(fetch) for _ in range(5)])
+        await technicians.roster(fetch)
+
+        self.assertEqual(fetch.await_count, 1)
+
+    async def test_failed_download_is_not_cached(self):
+        self.assertIsNone(await technicians.roster(AsyncMock(return_value=None)))
+        self.assertIsNone(technicians.cached())
+
+        self.assertEqual(len(await technicians.roster(AsyncMock(return_value=ROSTER))), 3)
+
+    async def test_roster_is_not_downloaded_until_first_use(self):
+        with patch.object(main.st_gateway, "list_all", AsyncMock(return_value=ROSTER)) as list_all:
+            async with main.lifespan(main.app):
+                self.assertIsNone(technicians.cached())
+
+        list_all.assert_not_awaited()
+
+    async def test_endpoint_helper_reads_from_the_roster(self):
+        with patch.object(main, "get_access_token", AsyncMock(return_value="Bearer t")), \
+                patch.object(main.st_gateway, "list_all", AsyncMock(return_value=ROSTER)) as list_all:
+            first = await main.get_technicians_by_businessUnitId(41)
+            second = await main.get_technicians_by_businessUnitId(40)
+
+        self.assertEqual([t["id"] for t in first], [3])
+        self.assertEqual(len(second), 2)
+        self.assertEqual(list_all.await_count, 1)
+
+    async def test_endpoint_helper_reports_st_failure(self):
+        with patch.object(main, "get_access_token", AsyncMock(return_value="Bearer t")), \
+                patch.object(main.st_gateway, "list_all", AsyncMock(return_value=None)):
+            self.assertIn("error", await main.get_technicians_by_businessUnitId(40))
+
+
+if __name__ == "__main__":
+    unittest.main()
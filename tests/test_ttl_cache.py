@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import ttl_cache
+
+
+class TTLCacheTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ttl_cache.TTLCache("test", ttl=10, negative_ttl=2)
+        self.addCleanup(ttl_cache.registry.pop, "test", None)
+
+    async def test_concurrent_misses_are_collapsed_into_one_fetch(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*[self.cache.get_or_fetch("k", fetch) for _ in range(5)])
+
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.stats["coalesced"], 4)
+
+    async def test_entries_expire_after_ttl(self):
+        with patch.object(ttl_cache.time, "monotonic", return_value=100.0):
+            self.cache.set("k", "v")
+        with patch.object(ttl_cache.time, "monotonic", return_value=109.0):
+            self.assertEqual(self.cache.get("k"), "v")
+        with patch.object(ttl_cache.time, "monotonic", return_value=110.0):
+            self.assertIsNone(self.cache.get("k"))
+
+    async def test_negative_results_use_the_negative_ttl(self):
+        async def fetch():
+            return []
+
+        with patch.object(ttl_cache.time, "monotonic", return_value=100.0):
+            await self.cache.get_or_fetch("k", fetch, is_negative=lambda v: not v)
+        with patch.object(ttl_cache.time, "monotonic", return_value=103.0):
+            self.assertIsNone(self.cache.get("k"))
+
+    async def test_cache_if_false_is_returned_but_not_stored(self):
+        async def fetch():
+            return None
+
+        self.assertIsNone(await self.cache.get_or_fetch("k", fetch, cache_if=lambda v: v is not None))
+        self.assertEqual(len(self.cache), 0)
+
+    async def test_invalidation_during_fetch_discards_the_in_flight_result(self):
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await release.wait()
+            return "pre-mutation"
+
+        task = asyncio.create_task(self.cache.get_or_fetch("k", fetch))
+        await started.wait()
+        self.cache.invalidate("k")
+        release.set()
+
+        self.assertEqual(await task, "pre-mutation")
+        self.assertIsNone(self.cache.get("k"))
+
+    async def test_fetch_errors_propagate_to_every_waiter_and_are_not_cached(self):
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            self.cache.get_or_fetch("k", fetch), self.cache.get_or_fetch("k", fetch),
+            return_exceptions=True)
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(len(self.cache), 0)
+
+    async def test_waiter_refetches_when_the_leader_is_cancelled(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "value"
+
+        leader = asyncio.create_task(self.cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await waiter, "value")
+        self.assertEqual(len(calls), 2)
+
+    async def test_max_entries_evicts_least_recently_used(self):
+        cache = ttl_cache.TTLCache("test", ttl=10, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
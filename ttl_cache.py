@@ -0,0 +1,136 @@
+"""
+ttl_cache.py — Cache en memoria con TTL y single-flight para respuestas de ST.
+
+Pensado para los lookups que se repiten dentro de una misma llamada o entre
+llamadas concurrentes (capacidad, clientes, ubicaciones...):
+
+- TTL corto por entrada, con TTL distinto opcional para resultados "negativos"
+  (p.ej. "no existe cliente con ese teléfono").
+- Single-flight: N requests concurrentes por la misma clave esperan UN solo
+  fetch a ServiceTitan en vez de disparar N.
+- Invalidación por clave o por predicado. Si se invalida mientras un fetch está
+  en vuelo, ese resultado no se guarda (podría ser anterior a la mutación).
+
+Los contadores (hits / misses / coalesced / invalidations) quedan en `.stats`
+y cada cache se registra por nombre para poder inspeccionarlos todos juntos.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+# nombre -> TTLCache, para exponer stats de todos los caches del proceso.
+registry: dict = {}
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, negative_ttl: "float | None" = None,
+                 max_entries: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict" = OrderedDict()   # key -> (expires_at, value)
+        self._inflight: dict = {}                    # key -> (generation, Future)
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+        registry[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: "float | None" = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def values(self) -> list:
+        """Valores vigentes, sin tocar el orden LRU ni las estadísticas."""
+        now = time.monotonic()
+        return [value for expires_at, value in self._data.values() if now < expires_at]
+
+    def invalidate(self, key):
+        self.invalidate_where(lambda k: k == key)
+
+    def invalidate_where(self, predicate) -> int:
+        """Borra las entradas (y fetches en vuelo) cuya clave cumple `predicate`."""
+        self._generation += 1
+        doomed = [k for k in self._data if predicate(k)]
+        for k in doomed:
+            del self._data[k]
+        for k in [k for k in self._inflight if predicate(k)]:
+            del self._inflight[k]
+        self.stats["invalidations"] += len(doomed)
+        return len(doomed)
+
+    def clear(self):
+        self.invalidate_where(lambda k: True)
+
+    async def get_or_fetch(self, key, fetch, *, cache_if=None, is_negative=None):
+        """Devuelve el valor cacheado o corre `fetch()` (una sola vez aunque
+        haya varios callers concurrentes).
+
+        cache_if(value)    -> False para NO guardar (p.ej. errores de ST).
+        is_negative(value) -> True para guardarlo con negative_ttl.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats["hits"] += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            shared = inflight[1]
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                # Cancelaron al request que hacía el fetch, no a este: reintentar.
+                if shared.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.get_or_fetch(key, fetch, cache_if=cache_if, is_negative=is_negative)
+                raise
+
+        self.stats["misses"] += 1
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (generation, future)
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Si nadie más lo esperaba, evitar el warning de excepción no leída.
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+
+        future.set_result(value)
+        if self._generation == generation and (cache_if is None or cache_if(value)):
+            negative = is_negative is not None and is_negative(value)
+            self.set(key, value, ttl=self.negative_ttl if negative else self.ttl)
+        return value
+
+
+def all_stats() -> dict:
+    return {name: {**cache.stats, "size": len(cache)} for name, cache in registry.items()}
@@ -257,6 +257,28 @@ class OfficeMessageToolRequest(ToolRequestWrapper[OfficeMessageRequest]):
     pass
 
 
+# =============================================================================
+# OUTBOUND PRE-SCREENING
+# =============================================================================
+
+class PrescreenContact(BaseModel):
+    phone: Optional[str] = Field(None, description="Contact phone number, any format")
+    name: Optional[str] = Field(None, description="Contact name, echoed back only")
+    street: Optional[str] = Field(None, description="Street address")
+    city: Optional[str] = Field(None, description="City")
+    state: Optional[str] = Field(None, description="State (MA / NH or spelled out)")
+    zip: Optional[str] = Field(None, description="Zip code")
+    lat: Optional[float] = Field(None, description="Latitude, if the list already has it")
+    lon: Optional[float] = Field(None, description="Longitude, if the list already has it")
+
+    model_config = ConfigDict(extra='allow')
+
+class PrescreenRequest(BaseModel):
+    contacts: List[PrescreenContact] = Field(..., description="Campaign contacts to screen")
+    matchCustomers: bool = Field(True, description="Look up existing ServiceTitan customers by phone")
+    includeAvailability: bool = Field(True, description="Attach today's outbound availability")
+
+
 # =============================================================================
 # LOGGING HELPER
 # =============================================================================